@@ -5,38 +5,55 @@ __email__ = "dzhamshed.khaitov@nu.edu.kz"
 
 import datetime
 import os
-import heapq
-import matplotlib.pyplot as plt
 import misc
+import artifacts
+import circuit_ir
+import qasm_writer
+import realfile
+import architecture_cache
+import mapping_cache
+import backend_catalog
+import shortest_paths
+import qubit_layout
+import ancilla_pool
+import toffoli_templates
+import tracer
 import sys
 from io import StringIO
-from copy import deepcopy
 from typing import List, Optional, Dict
-from qiskit import IBMQ, QuantumCircuit, QuantumRegister, ClassicalRegister, Aer, execute as qiskit_execute
+from qiskit import IBMQ, QuantumCircuit, Aer, execute as qiskit_execute
 from qiskit.compiler import transpile as qiskit_transpile, assemble as Q_assemble
 
 
 class SimpleCTG:
     # The gate class to store information of a gate in the circuit.
-    class Gate:
-        def __init__(self, name: str, variables: List[str]):
-            self.name = name
-            self.variables = variables
-
-        def __repr__(self):
-            return self.name + ' ' + ' '.join(self.variables)
+    Gate = realfile.Gate
 
     # machin_name: specify which IBM server to use, if not specified then one with the biggest coupling map is used
     # builtin_funcs: specify whether use qiskit's swap and/or ccx functions by listing them. Ex: ['swap', 'ccx']
     # debugging: to be more verbose and print information on each steps
-    def __init__(self, machine_name: Optional[str] = None, builtin_funcs: Optional[List[str]] = None, debugging=False, arbitrary_coupling: Optional[List[str]] = None):
+    # use_cache: take coupling maps and shortest paths from the architecture cache (memory and ~/.cache/sp2020quantum)
+    # use_mapping_cache: take mappings of circuits mapped before with the same settings from the mapping cache
+    # (~/.cache/sp2020quantum/mappings), mapping_cache.default_cache().clear() empties it
+    # offline: never contact IBM Q, backends are taken from the backend catalog and transpiled with fake backends
+    # persistent_layout: qubits stay where the last gate left them instead of returning to their initial positions,
+    # the router moves both operands of a gate towards each other as the next lookahead gates suggest
+    # restore_layout: with persistent_layout, return all variables to their initial positions once, at the end
+    def __init__(self, machine_name: Optional[str] = None, builtin_funcs: Optional[List[str]] = None, debugging=False, arbitrary_coupling: Optional[List[str]] = None,
+                 use_cache=True, offline=False, persistent_layout=False, lookahead=8, restore_layout=False,
+                 use_mapping_cache=False):
         # Quantum machine information
         self.machine_name = machine_name
         self.backend = None
         self.couples = None
         self.qubits_num = 0
+        # basis gates of the backend, None if unknown
+        self.basis_gates: Optional[List[str]] = None
+        self.cache = architecture_cache.default_cache() if use_cache else None
+        self.mapping_cache = mapping_cache.default_cache() if use_mapping_cache else None
+        self.offline = offline
         self.connections: Dict[(int, Dict[(int, bool)])] = {}
-        self.paths: Dict[(int, Dict[(int, List[int])])] = {}
+        self.paths: Optional[shortest_paths.ShortestPaths] = None
         self.arbitrary = False
         # if we are using arbitrary coupling, we need some modifications
         if arbitrary_coupling != None:
@@ -50,17 +67,17 @@ class SimpleCTG:
 
         # The circuit information
         # The layout is variable -> logical -> physical
-        self.circuit: Optional[QuantumCircuit] = None
+        # gates are emitted into the compact circuit_ir.CircuitIR, it is converted to a QuantumCircuit when needed
+        self.circuit: Optional[circuit_ir.CircuitIR] = None
         # maps variables to physical qubits. Ex: 'a'->0, 'b'->qr[1]
         self._mapping: Dict[(str, int)] = {}
-        # maps variables to logical qubits. Ex: 'a'->qr[0], 'b'->qr[1]
-        self.variable_to_logical: Dict[(str, int)] = {}
-        # reverse of the variable_to_logical
-        self.logical_to_variable: Dict[(int, str)] = {}
-        # maps logical to physical qubits. Ex: qr[0]->0, qr[1]->1
-        self.logical_to_physical: Dict[(int, int)] = {}
-        # reverse of the logical_to_physical
-        self.physical_to_logical: Dict[(int, str)] = {}
+        # maps variables to logical qubits (Ex: 'a'->qr[0], 'b'->qr[1]) and logical to physical qubits
+        # (Ex: qr[0]->0, qr[1]->1) in both directions, a swap exchanges the variables of two logical qubits
+        self.layout = qubit_layout.QubitLayout()
+        # ancillas of the circuit, the free ones are clean and reused by the next multi-controlled gates
+        self.ancillas: Optional[ancilla_pool.AncillaPool] = None
+        # routed Toffoli gates of the circuit, replayed when the same gate lands on the same physical qubits
+        self.toffoli_templates = toffoli_templates.TemplateCache()
 
         # The input information
         self.mapping: Dict[(str, int)] = {}
@@ -70,10 +87,21 @@ class SimpleCTG:
         self.outputs: List[str] = []
         self.constants: Optional[str] = None
         self.garbage: Optional[str] = None
-        self.gates: List[SimpleCTG.Gate] = []
+        # gates are stored in the compact columnar form, iterating yields SimpleCTG.Gate objects
+        self.gates = realfile.GateArray()
+
+        # Routing
+        self.persistent_layout = persistent_layout
+        self.lookahead = lookahead
+        self.restore_layout = restore_layout
+        # pairs of variables interacting in every gate and the index of the gate being routed, used by the lookahead
+        self._interactions: List[List[tuple]] = []
+        self._gate_index = 0
 
         # Helpers
         self.builtin_funcs = builtin_funcs
+        # collects counters of the routing (e.g. inserted swaps), test() replaces it with its own tracer
+        self.tracer = tracer.Tracer()
         self.debugging = debugging
         self.initialized = False
 
@@ -83,31 +111,15 @@ class SimpleCTG:
         if self.debugging:
             print('[INFO] Started parsing file {}'.format(input_file))
 
-        with open(input_file, 'r') as file:
-            is_gate = False
-            lines = file.readlines()
-            file.close()
-            for line in lines:
-                parts = line.replace('\t', ' ').split(' ')
-                variables = list(filter(lambda item: len(item) > 0, [
-                                 var.strip() for var in parts[1:]]))
-                if line.startswith('.numvars'):
-                    self.variables_num = int(parts[1].strip())
-                elif line.startswith('.variables'):
-                    self.variables = variables
-                elif line.startswith('.inputs'):
-                    self.inputs = variables
-                elif line.startswith('.outputs'):
-                    self.outputs = variables
-                elif line.startswith('.constants'):
-                    self.constants = parts[1].strip()
-                elif line.startswith('.garbage'):
-                    self.garbage = parts[1].strip()
-                elif line.startswith('.begin') or line.startswith('.end'):
-                    is_gate = line.startswith('.begin')
-                elif is_gate:
-                    self.gates.append(SimpleCTG.Gate(
-                        parts[0].strip(), variables))
+        # The file is read line by line and the gates are stored as arrays of interned ids
+        real = realfile.parse(input_file)
+        self.variables_num = real.variables_num
+        self.variables = real.variables
+        self.inputs = real.inputs
+        self.outputs = real.outputs
+        self.constants = real.constants
+        self.garbage = real.garbage
+        self.gates = real.gates
 
         if self.debugging:
             print('[INFO] Number of variables {}'.format(self.variables_num))
@@ -117,143 +129,187 @@ class SimpleCTG:
             # [print(gate) for gate in self.gates]
             print('[INFO] Finished parsing file {}\n'.format(input_file))
 
-    # Using Dijkstra algorithm find shortest path between vertex and to.
-    # This function finds shortest paths between all physical qubits with O(MlogN*N) complexity (M-edges, N-vertices)
+    # Find shortest paths between all physical qubits with a BFS from all of the qubits at once.
+    # Only distance and next-hop matrices are stored, the paths are reconstructed on demand
     def __shortest_paths__(self):
-        for vertex in range(0, self.qubits_num):
-            distances = {vertex: 0}
-            parent = {}
-            queue = []
-            heapq.heappush(queue, (0, vertex))
-            while len(queue) > 0:
-                (d, v) = heapq.heappop(queue)
-                if v in distances and distances[v] < d:
-                    continue
-                for to in self.connections[v].keys():
-                    if to not in distances or d + 1 < distances[to]:
-                        distances[to] = d + 1
-                        heapq.heappush(queue, (d + 1, to))
-                        parent[to] = v
-            # paths[0][5] = [2, 4, 3] means there's shortest path from 0 to 5 as 0->2->4->3->5
-            self.paths[vertex] = {}
-            for to in range(0, self.qubits_num):
-                if vertex == to or to not in distances:
-                    continue
-                v = parent[to]
-                path = []
-                while v != vertex:
-                    path.append(v)
-                    v = parent[v]
-                self.paths[vertex][to] = list(reversed(path))
+        self.paths = shortest_paths.ShortestPaths.from_couples(self.couples, self.qubits_num)
 
     # Add a physical qubit as ancilla to the circuit
-    def __add_ancilla__(self, physical_qubit: int):
-        ancillas_size = sum([1 if key.startswith('ancilla')
-                             else 0 for key in self.variable_to_logical])
-        variable = 'ancilla' + str(ancillas_size)
-        logical = len(self.circuit.qubits)
-        self.circuit.add_register(QuantumRegister(1, name=variable))
-        self.variable_to_logical[variable] = logical
-        self.logical_to_variable[logical] = variable
-        self.logical_to_physical[logical] = physical_qubit
-        self.physical_to_logical[physical_qubit] = logical
+    def __add_ancilla__(self, physical_qubit: int) -> str:
+        variable = self.ancillas.add(physical_qubit)
+        self.circuit.add_qubit(variable)
         self._mapping[variable] = physical_qubit
+        return variable
 
-    # Check whether a physical qubit is used as ancilla
-    def __is_ancilla_(self, qubit: int):
-        return (qubit in self.physical_to_logical
-                and self.logical_to_variable[self.physical_to_logical[qubit]].startswith('ancilla'))
-
-    # Returns nearest free ancilla variable
+    # Returns nearest free ancilla variable and reserves it until the gate releases it
     # If a nearest qubit is not an ancilla then adds it as ancilla
-    def __nearest_free_ancilla__(self, variable: str, reserved_qubits: List[str]):
-        physical = self.logical_to_physical[self.variable_to_logical[variable]]
-        ancilla = -1
-        reserved = [self.logical_to_physical[self.variable_to_logical[q]]
-                    for q in reserved_qubits]
-        for q in range(self.qubits_num):
-            if (q not in self.physical_to_logical or (self.__is_ancilla_(q) and q not in reserved)) and (
-                    ancilla == -1 or len(self.paths[physical][ancilla]) > len(self.paths[physical][q])):
-                ancilla = q
-        if ancilla == -1:
-            raise Exception('Not enough qubits!')
-
-        if ancilla not in self.physical_to_logical:
-            self.__add_ancilla__(ancilla)
-        return self.logical_to_variable[self.physical_to_logical[ancilla]]
+    def __nearest_free_ancilla__(self, variable: str) -> str:
+        ancilla = self.ancillas.nearest(variable)
+        name = self.layout.variable_at(ancilla)
+        if name is None:
+            name = self.__add_ancilla__(ancilla)
+        self.ancillas.reserve(name)
+        return name
 
     # This function moves variables a to b by swapping a through the path to b
     def move_variable(self, a: str, b: str, interchange=False):
-        physical_a = self.logical_to_physical[self.variable_to_logical[a]]
-        physical_b = self.logical_to_physical[self.variable_to_logical[b]]
+        physical_a = self.layout.physical(a)
+        physical_b = self.layout.physical(b)
 
         if physical_a == physical_b:
             return
 
-        if physical_a not in self.paths or physical_b not in self.paths[physical_a]:
+        if not self.paths.connected(physical_a, physical_b):
             raise Exception('No path btw {} (physical {}) and {} (physical {})!!!'.format(
                 a, physical_a, b, physical_b))
 
-        for v in self.paths[physical_a][physical_b]:
+        for v in self.paths.path(physical_a, physical_b):
             # If a physical qubit is not in the initial mapping but it's needed to connect two qubits
             # For example mapping is [(a, 0), (b, 1)] but physical coupling is 0-2-1, we need qubit 2 be in the layout
-            if v not in self.physical_to_logical:
-                self.__add_ancilla__(v)
-            self.swap(a, self.logical_to_variable[self.physical_to_logical[v]])
+            occupant = self.layout.variable_at(v)
+            if occupant is None:
+                occupant = self.__add_ancilla__(v)
+            self.swap(a, occupant)
         if interchange:
             self.swap(a, b)
 
+    # Brings variables a and b next to each other
+    # In the persistent layout mode both of them may move: a takes the first k steps of the shortest path, b the rest,
+    # k is chosen by the distances of the pairs in the next lookahead gates (ties move a all the way, as move_variable)
+    def bring_together(self, a: str, b: str):
+        if not self.persistent_layout or self.lookahead <= 0:
+            return self.move_variable(a, b)
+        physical_a = self.layout.physical(a)
+        physical_b = self.layout.physical(b)
+        if physical_a != physical_b and not self.paths.connected(physical_a, physical_b):
+            raise Exception('No path btw {} (physical {}) and {} (physical {})!!!'.format(
+                a, physical_a, b, physical_b))
+        path = self.paths.path(physical_a, physical_b)
+        if len(path) == 0:
+            return
+        for v in path:
+            # qubits on the path which are not in the layout yet become ancillas, as in move_variable
+            if not self.layout.is_used(v):
+                self.__add_ancilla__(v)
+        full_path = [physical_a] + path + [physical_b]
+        occupants = [self.layout.variable_at(v) for v in full_path]
+
+        upcoming = [pair for interactions in self._interactions[self._gate_index + 1:self._gate_index + 1 + self.lookahead]
+                    for pair in interactions]
+        best_steps = len(path)
+        if len(upcoming) > 0:
+            best_cost = None
+            for steps in range(len(path), -1, -1):
+                # positions of the variables on the path after a takes steps steps and b the rest
+                positions = {}
+                for i in range(1, steps + 1):
+                    positions[occupants[i]] = full_path[i - 1]
+                positions[a] = full_path[steps]
+                for i in range(steps + 1, len(full_path) - 1):
+                    positions[occupants[i]] = full_path[i + 1]
+                positions[b] = full_path[steps + 1]
+                cost = 0
+                for u, w in upcoming:
+                    pu = positions.get(u)
+                    if pu is None:
+                        pu = self.layout.physical(u)
+                    pw = positions.get(w)
+                    if pw is None:
+                        pw = self.layout.physical(w)
+                    cost += self.paths.distance(pu, pw)
+                if best_cost is None or cost < best_cost:
+                    best_cost = cost
+                    best_steps = steps
+
+        for i in range(1, best_steps + 1):
+            self.swap(a, occupants[i])
+        for i in range(len(full_path) - 2, best_steps, -1):
+            self.swap(b, occupants[i])
+
+    # Returns the variables displaced since the mark back to their logical positions of the mark
+    # p is logical position of variable v in ascending order,
+    # so it first returns back variable with 0 initial position, after variable with 1 initial position, so on..
+    # the positions which were not changed since the mark are not visited at all
+    def __restore_positions__(self, mark: int):
+        for p, v in self.layout.displaced(mark):
+            self.move_variable(v, self.layout.variable(p), True)
+        self.layout.release(mark)
+
     # This function swaps two variables using 3 controlled-not gates
     # Variables should be physically connected!
     def swap(self, a: str, b: str):
         if self.circuit is None:
             return
-        logical_a = self.variable_to_logical[a]
-        logical_b = self.variable_to_logical[b]
+        logical_a, logical_b = self.layout.swap(a, b)
+        self.tracer.count('swaps_inserted')
         if self.builtin_funcs is not None and 'swap' in self.builtin_funcs:
-            return self.circuit.swap(logical_a, logical_b)
-
-        self.circuit.cx(logical_a, logical_b)
-        self.circuit.cx(logical_b, logical_a)
-        self.circuit.cx(logical_a, logical_b)
-        self.variable_to_logical[a] = logical_b
-        self.variable_to_logical[b] = logical_a
-        self.logical_to_variable[logical_a] = b
-        self.logical_to_variable[logical_b] = a
+            self.circuit.swap(logical_a, logical_b)
+        else:
+            self.circuit.cx(logical_a, logical_b)
+            self.circuit.cx(logical_b, logical_a)
+            self.circuit.cx(logical_a, logical_b)
 
     # This function implements a Controlled-V gate
     def cv(self, control: str, target: str):
-        control_position = self.variable_to_logical[control]
-        self.move_variable(control, target)
-        self.circuit.tdg(self.variable_to_logical[control])
-        self.circuit.h(self.variable_to_logical[target])
+        control_position = self.layout.logical(control)
+        self.bring_together(control, target)
+        self.circuit.tdg(self.layout.logical(control))
+        self.circuit.h(self.layout.logical(target))
         self.circuit.cx(
-            self.variable_to_logical[target], self.variable_to_logical[control])
-        self.circuit.t(self.variable_to_logical[control])
-        self.circuit.tdg(self.variable_to_logical[target])
+            self.layout.logical(target), self.layout.logical(control))
+        self.circuit.t(self.layout.logical(control))
+        self.circuit.tdg(self.layout.logical(target))
         self.circuit.cx(
-            self.variable_to_logical[target], self.variable_to_logical[control])
-        self.circuit.h(self.variable_to_logical[target])
+            self.layout.logical(target), self.layout.logical(control))
+        self.circuit.h(self.layout.logical(target))
         # return to the initial position
-        self.move_variable(
-            control, self.logical_to_variable[control_position], True)
+        if not self.persistent_layout:
+            self.move_variable(
+                control, self.layout.variable(control_position), True)
 
     # This function implements a Controlled-V+ gate
     def cvdg(self, control: str, target: str):
-        control_position = self.variable_to_logical[control]
-        self.move_variable(control, target)
-        self.circuit.h(self.variable_to_logical[target])
+        control_position = self.layout.logical(control)
+        self.bring_together(control, target)
+        self.circuit.h(self.layout.logical(target))
         self.circuit.cx(
-            self.variable_to_logical[target], self.variable_to_logical[control])
-        self.circuit.t(self.variable_to_logical[target])
-        self.circuit.tdg(self.variable_to_logical[control])
+            self.layout.logical(target), self.layout.logical(control))
+        self.circuit.t(self.layout.logical(target))
+        self.circuit.tdg(self.layout.logical(control))
         self.circuit.cx(
-            self.variable_to_logical[target], self.variable_to_logical[control])
-        self.circuit.h(self.variable_to_logical[target])
-        self.circuit.t(self.variable_to_logical[control])
+            self.layout.logical(target), self.layout.logical(control))
+        self.circuit.h(self.layout.logical(target))
+        self.circuit.t(self.layout.logical(control))
         # return to the initial position
-        self.move_variable(
-            control, self.logical_to_variable[control_position], True)
+        if not self.persistent_layout:
+            self.move_variable(
+                control, self.layout.variable(control_position), True)
+
+    # Emits a Toffoli gate routed by route(first_control, second_control, target)
+    # The routing of the same decomposition on the same physical qubits is replayed from the template cache,
+    # the persistent layout mode routes by the next gates, so its Toffoli gates are always routed
+    def __toffoli__(self, variant: str, route, first_control: str, second_control: str, target: str):
+        if self.persistent_layout:
+            return route(first_control, second_control, target)
+        key = (variant, self.layout.physical(first_control), self.layout.physical(second_control),
+               self.layout.physical(target), self.builtin_funcs is not None and 'swap' in self.builtin_funcs)
+        template = self.toffoli_templates.get(key)
+        if template is not None:
+            self.circuit.extend(template.opcodes, template.operands)
+            self.layout.permute(template.moves)
+            self.tracer.count('swaps_inserted', template.swaps)
+            self.tracer.count('toffoli_template_hits')
+            return
+
+        start = len(self.circuit)
+        swaps = self.tracer.counters.get('swaps_inserted', 0)
+        mark = self.layout.mark()
+        route(first_control, second_control, target)
+        moves = self.layout.moves(mark)
+        self.layout.release(mark)
+        self.toffoli_templates.put(key, toffoli_templates.RoutedToffoli(
+            self.circuit.opcodes[start:], self.circuit.operands[circuit_ir.SLOTS * start:], moves,
+            self.tracer.counters.get('swaps_inserted', 0) - swaps))
 
     # This function implements CCNOT (TOFFOLI) gate
     def ccnot(self, first_control: str, second_control: str, target: str):
@@ -262,26 +318,29 @@ class SimpleCTG:
 
         if self.builtin_funcs is not None and 'ccx' in self.builtin_funcs:
             return self.circuit.ccx(
-                self.variable_to_logical[first_control],
-                self.variable_to_logical[second_control],
-                self.variable_to_logical[target]
+                self.layout.logical(first_control),
+                self.layout.logical(second_control),
+                self.layout.logical(target)
             )
+        self.__toffoli__('ccnot', self.__route_ccnot__, first_control, second_control, target)
 
-        variable_positions = deepcopy(self.logical_to_variable)
+    def __route_ccnot__(self, first_control: str, second_control: str, target: str):
+        # remember the positions, only the variables displaced by the gate are returned back
+        mark = None if self.persistent_layout else self.layout.mark()
 
-        self.move_variable(second_control, target)
+        self.bring_together(second_control, target)
         self.circuit.ch(
-            self.variable_to_logical[second_control], self.variable_to_logical[target])
-        self.move_variable(first_control, target)
+            self.layout.logical(second_control), self.layout.logical(target))
+        self.bring_together(first_control, target)
         self.circuit.cz(
-            self.variable_to_logical[first_control], self.variable_to_logical[target])
-        self.move_variable(second_control, target)
+            self.layout.logical(first_control), self.layout.logical(target))
+        self.bring_together(second_control, target)
         self.circuit.ch(
-            self.variable_to_logical[second_control], self.variable_to_logical[target])
+            self.layout.logical(second_control), self.layout.logical(target))
 
         # return variables to initial positions
-        for p, v in variable_positions.items():
-            self.move_variable(v, self.logical_to_variable[p], True)
+        if mark is not None:
+            self.__restore_positions__(mark)
 
     # This function implements CCNOT (TOFFOLI) gate with 6 NOT gates
     # The Circuit from Wikipedia is used (https://en.wikipedia.org/wiki/Toffoli_gate#Related_logic_gates)
@@ -291,46 +350,46 @@ class SimpleCTG:
 
         if self.builtin_funcs is not None and 'ccx' in self.builtin_funcs:
             return self.circuit.ccx(
-                self.variable_to_logical[first_control],
-                self.variable_to_logical[second_control],
-                self.variable_to_logical[target]
+                self.layout.logical(first_control),
+                self.layout.logical(second_control),
+                self.layout.logical(target)
             )
+        self.__toffoli__('ccnot_6_not_gates', self.__route_ccnot_6_not_gates__, first_control, second_control, target)
 
-        # Copy the initial position of all variables for returning them back at initial position after inserting gate
-        variable_positions = deepcopy(self.logical_to_variable)
+    def __route_ccnot_6_not_gates__(self, first_control: str, second_control: str, target: str):
+        # Mark the initial position of all variables for returning them back at initial position after inserting gate
+        mark = None if self.persistent_layout else self.layout.mark()
 
-        self.circuit.h(self.variable_to_logical[target])
-        self.move_variable(second_control, target)
+        self.circuit.h(self.layout.logical(target))
+        self.bring_together(second_control, target)
         self.circuit.cx(
-            self.variable_to_logical[second_control], self.variable_to_logical[target])
-        self.circuit.tdg(self.variable_to_logical[target])
-        self.move_variable(first_control, target)
+            self.layout.logical(second_control), self.layout.logical(target))
+        self.circuit.tdg(self.layout.logical(target))
+        self.bring_together(first_control, target)
         self.circuit.cx(
-            self.variable_to_logical[first_control], self.variable_to_logical[target])
-        self.circuit.t(self.variable_to_logical[target])
-        self.move_variable(second_control, target)
+            self.layout.logical(first_control), self.layout.logical(target))
+        self.circuit.t(self.layout.logical(target))
+        self.bring_together(second_control, target)
         self.circuit.cx(
-            self.variable_to_logical[second_control], self.variable_to_logical[target])
-        self.circuit.tdg(self.variable_to_logical[target])
-        self.move_variable(first_control, target)
+            self.layout.logical(second_control), self.layout.logical(target))
+        self.circuit.tdg(self.layout.logical(target))
+        self.bring_together(first_control, target)
         self.circuit.cx(
-            self.variable_to_logical[first_control], self.variable_to_logical[target])
-        self.circuit.t(self.variable_to_logical[target])
-        self.circuit.t(self.variable_to_logical[second_control])
-        self.circuit.h(self.variable_to_logical[target])
-        self.move_variable(first_control, second_control)
+            self.layout.logical(first_control), self.layout.logical(target))
+        self.circuit.t(self.layout.logical(target))
+        self.circuit.t(self.layout.logical(second_control))
+        self.circuit.h(self.layout.logical(target))
+        self.bring_together(first_control, second_control)
         self.circuit.cx(
-            self.variable_to_logical[first_control], self.variable_to_logical[second_control])
-        self.circuit.t(self.variable_to_logical[first_control])
-        self.circuit.tdg(self.variable_to_logical[second_control])
+            self.layout.logical(first_control), self.layout.logical(second_control))
+        self.circuit.t(self.layout.logical(first_control))
+        self.circuit.tdg(self.layout.logical(second_control))
         self.circuit.cx(
-            self.variable_to_logical[first_control], self.variable_to_logical[second_control])
+            self.layout.logical(first_control), self.layout.logical(second_control))
 
         # return variables to initial positions
-        # p is logical position of variable v in ascending order,
-        # so it first returns back variable with 0 initial position, after variable with 1 initial position, so on..
-        for p, v in variable_positions.items():
-            self.move_variable(v, self.logical_to_variable[p], True)
+        if mark is not None:
+            self.__restore_positions__(mark)
 
     # This function implements NCCNOT (N-TOFFOLI) gate - a NOT gate with N controlling qubits
     def n_ccnot(self, controllers: List[str], target: str):
@@ -339,7 +398,7 @@ class SimpleCTG:
         resets = []
         while len(controllers) > 0:
             # If the ccnot has more than 2 control qubits then wee need insert ancilla qubits
-            ancilla = self.__nearest_free_ancilla__(sc, [t[2] for t in resets])
+            ancilla = self.__nearest_free_ancilla__(sc)
             # Insert ccnot gate
             self.ccnot(fc, sc, ancilla)
             # And save it, because we need to return it back at the end
@@ -352,22 +411,60 @@ class SimpleCTG:
         # Insert all of the ccnot gate in reverse order, except the last one (all the ccnot gates with ancilla qubits)
         for tpl in reversed(resets):
             self.ccnot(tpl[0], tpl[1], tpl[2])
+        # the ancillas are clean again
+        self.ancillas.release([tpl[2] for tpl in resets])
 
     # Initialize the IBMQ account and select the backend (quantum machine)
-    def initialize(self, hub: Optional[str] = None, group: Optional[str] = None, project: Optional[str] = None):
+    # Coupling maps and shortest paths are taken from the architecture cache when possible,
+    # so a previously seen backend or coupling is initialized without contacting IBM Q
+    # catalog_entry: name of a backend catalog entry to use instead of IBM Q
+    def initialize(self, hub: Optional[str] = None, group: Optional[str] = None, project: Optional[str] = None,
+                   catalog_entry: Optional[str] = None):
+
+        # In offline mode the machine (or the one with the biggest coupling map) comes from the catalog
+        if catalog_entry is None and self.offline and not self.arbitrary:
+            if self.machine_name is not None:
+                catalog_entry = self.machine_name
+            else:
+                catalog_entry = backend_catalog.default_catalog().largest().name
 
-        # If the machine name defined then get that
-        if self.machine_name is not None:
+        if catalog_entry is not None:
             if self.debugging:
-                print('[INFO] Getting the {} information...'.format(
-                    self.machine_name))
-
-            self.backend = IBMQ.get_provider(
-                hub, group, project).get_backend(self.machine_name)
-            
-            configs = self.backend.configuration()
-            self.couples = configs.coupling_map
-            self.qubits_num = configs.n_qubits
+                print('[INFO] Taking the {} information from the backend catalog...'.format(catalog_entry))
+            entry = backend_catalog.default_catalog().get(catalog_entry)
+            self.machine_name = entry.name
+            self.couples = entry.coupling_map
+            self.qubits_num = entry.n_qubits
+            self.basis_gates = entry.basis_gates
+            # the mock backend (if qiskit has one) carries the noise model and the gate durations as well
+            self.backend = backend_catalog.fake_backend(entry.name, self.debugging)
+        # If the machine name defined then get that
+        elif self.machine_name is not None:
+            entry = self.cache.get_backend(self.machine_name) if self.cache is not None else None
+            if entry is None:
+                if self.debugging:
+                    print('[INFO] Getting the {} information...'.format(
+                        self.machine_name))
+                try:
+                    self.backend = IBMQ.get_provider(
+                        hub, group, project).get_backend(self.machine_name)
+                except Exception:
+                    # IBM Q is not reachable, an outdated cache entry is better than nothing
+                    entry = self.cache.get_backend(self.machine_name, allow_stale=True) if self.cache is not None else None
+                    if entry is None:
+                        raise
+
+            if entry is not None:
+                self.couples = entry.couples
+                self.qubits_num = entry.qubits_num
+                self.basis_gates = entry.basis_gates
+            else:
+                configs = self.backend.configuration()
+                self.couples = configs.coupling_map
+                self.qubits_num = configs.n_qubits
+                self.basis_gates = configs.basis_gates
+                if self.cache is not None:
+                    self.cache.put_backend(self.machine_name, self.couples, self.qubits_num, self.basis_gates)
         # Otherwise search for the quantum machine with the biggest coupling map
         elif not self.arbitrary:
             if self.debugging:
@@ -388,15 +485,18 @@ class SimpleCTG:
                     self.couples = coupling_map
 
             configs = self.backend.configuration()
+            self.machine_name = configs.backend_name
             self.couples = configs.coupling_map
             self.qubits_num = configs.n_qubits
+            self.basis_gates = configs.basis_gates
+            if self.cache is not None:
+                self.cache.put_backend(self.machine_name, self.couples, self.qubits_num, self.basis_gates)
 
         # if self.backend is None:
         #     raise Exception('No backend was selected')
 
-        
-
         # Construct a graph where connections[0][1] means physical qubits 0 and 1 are connected
+        self.connections = {}
         for couple in self.couples:
             if couple[0] not in self.connections:
                 self.connections[couple[0]] = {}
@@ -404,18 +504,21 @@ class SimpleCTG:
 
         if self.debugging:
             print('[INFO] selected backend {} with {} qubits'.format(
-                configs.backend_name, configs.n_qubits))
+                self.machine_name if self.machine_name is not None else 'arbitrary', self.qubits_num))
             print('[INFO] coupling map is {}\n'.format(self.couples))
             print('[INFO] Finding shortest paths between all qubits')
 
         # Find shortest path between all of the qubits
         # It's needed for connecting two qubits by swaps
-        self.__shortest_paths__()
+        if self.cache is not None:
+            self.paths = self.cache.get_paths(self.couples, self.qubits_num)
+        else:
+            self.__shortest_paths__()
         self.initialized = True
 
     # Set the input file (task definition)
     def set_input(self, input_file: str):
-        self.gates = []
+        self.gates = realfile.GateArray()
         self.__parse_input__(input_file)
 
         if len(self.variables) != len(self.inputs):
@@ -478,24 +581,18 @@ class SimpleCTG:
         if self.debugging:
             print('[INFO] Constructing quantum circuit...')
 
-        self.circuit = QuantumCircuit()
+        self.circuit = circuit_ir.CircuitIR()
         self._mapping = {}
-        self.variable_to_logical = {}
-        self.logical_to_variable = {}
-        self.logical_to_physical = {}
-        self.physical_to_logical = {}
-        size = 0
+        self.layout = qubit_layout.QubitLayout(self.qubits_num)
         # Set all of the mappings: variable <-> logical layer <-> physical layer
         for v in self.mapping:
             self._mapping[v] = self.mapping[v]
-            self.circuit.add_register(QuantumRegister(1, name=v))
-            self.variable_to_logical[v] = size
-            self.logical_to_physical[size] = self._mapping[v]
-            self.physical_to_logical[self._mapping[v]] = size
-            self.logical_to_variable[size] = v
-            size += 1
+            self.circuit.add_qubit(v)
+            self.layout.add(v, self._mapping[v])
+        self.ancillas = ancilla_pool.AncillaPool(self.layout, self.paths)
+        self.toffoli_templates.clear()
 
-        self.circuit.add_register(ClassicalRegister(len(self.outputs)))
+        self.circuit.add_clbits(len(self.outputs))
 
         if self.debugging:
             print('[INFO] Setting constants values...')
@@ -504,171 +601,261 @@ class SimpleCTG:
         # Ex: variables: a b c d and input: a 0 c 1 means variables b and d are constants
         for i, v in enumerate(self.inputs):
             if v == '1':
-                self.circuit.x(self.variable_to_logical[self.variables[i]])
-
-        for gate in self.gates:
+                self.circuit.x(self.layout.logical(self.variables[i]))
+
+        # the pairs of every gate, the lookahead of the persistent layout mode measures their distances
+        self._interactions = []
+        if self.persistent_layout:
+            for name, variables in self.gates.iter_gates():
+                pairs = [(control, variables[-1]) for control in variables[:-1]]
+                if len(variables) > 2:
+                    pairs.append((variables[0], variables[1]))
+                self._interactions.append(pairs)
+        # the variables return to their initial positions at the end with restore_layout
+        mark = self.layout.mark() if self.persistent_layout and self.restore_layout else None
+
+        for gate_index, (name, variables) in enumerate(self.gates.iter_gates()):
+            self._gate_index = gate_index
             # if self.debugging:
-            #     print('[INFO] Inserting gate: {}'.format(gate))
-
-            if gate.name == 'h' or gate.name == 'H':
-                self.circuit.h(self.variable_to_logical[gate.variables[0]])
-            elif gate.name == 'T':
-                self.circuit.t(self.variable_to_logical[gate.variables[0]])
-            elif gate.name == 'T+' or gate.name == 'T*':
-                self.circuit.tdg(self.variable_to_logical[gate.variables[0]])
-            elif gate.name == 'x' or gate.name == 't1':
-                self.circuit.x(self.variable_to_logical[gate.variables[0]])
-            elif gate.name.startswith('t') and len(gate.variables) > 2:
-                self.n_ccnot(gate.variables[:-1], gate.variables[-1])
+            #     print('[INFO] Inserting gate: {} {}'.format(name, variables))
+
+            if name == 'h' or name == 'H':
+                self.circuit.h(self.layout.logical(variables[0]))
+            elif name == 'T':
+                self.circuit.t(self.layout.logical(variables[0]))
+            elif name == 'T+' or name == 'T*':
+                self.circuit.tdg(self.layout.logical(variables[0]))
+            elif name == 'x' or name == 't1':
+                self.circuit.x(self.layout.logical(variables[0]))
+            elif name.startswith('t') and len(variables) > 2:
+                self.n_ccnot(variables[:-1], variables[-1])
             else:
-                if gate.name == 'v':
-                    self.cv(gate.variables[0], gate.variables[1])
-                elif gate.name == 'v+':
-                    self.cvdg(gate.variables[0], gate.variables[1])
-                elif gate.name == 'cx' or gate.name == 't2':
-                    position = self.variable_to_logical[gate.variables[0]]
-                    self.move_variable(gate.variables[0], gate.variables[1])
-                    control = self.variable_to_logical[gate.variables[0]]
-                    target = self.variable_to_logical[gate.variables[1]]
+                if name == 'v':
+                    self.cv(variables[0], variables[1])
+                elif name == 'v+':
+                    self.cvdg(variables[0], variables[1])
+                elif name == 'cx' or name == 't2':
+                    position = self.layout.logical(variables[0])
+                    self.bring_together(variables[0], variables[1])
+                    control = self.layout.logical(variables[0])
+                    target = self.layout.logical(variables[1])
                     self.circuit.cx(control, target)
-                    self.move_variable(
-                        gate.variables[0], self.logical_to_variable[position], True)
+                    if not self.persistent_layout:
+                        self.move_variable(
+                            variables[0], self.layout.variable(position), True)
+                elif self.persistent_layout:
+                    # swapping two variables is only renaming their qubits
+                    self.layout.swap(variables[0], variables[1])
                 else:
-                    logical_a = self.variable_to_logical[gate.variables[0]]
-                    logical_b = self.variable_to_logical[gate.variables[1]]
+                    logical_a = self.layout.logical(variables[0])
+                    logical_b = self.layout.logical(variables[1])
                     self.move_variable(
-                        gate.variables[0], gate.variables[1], True)
+                        variables[0], variables[1], True)
                     self.move_variable(
-                        gate.variables[1], self.logical_to_variable[logical_a], True)
-                    self.variable_to_logical[gate.variables[0]] = logical_a
-                    self.variable_to_logical[gate.variables[1]] = logical_b
-                    self.logical_to_variable[logical_a] = gate.variables[0]
-                    self.logical_to_variable[logical_b] = gate.variables[1]
+                        variables[1], self.layout.variable(logical_a), True)
+                    # the states are exchanged, the variables go back to their logical qubits
+                    if self.layout.logical(variables[0]) == logical_b and self.layout.logical(variables[1]) == logical_a:
+                        self.layout.swap(variables[0], variables[1])
+
+        # the variables return to their initial positions once, at the end
+        if mark is not None:
+            self.__restore_positions__(mark)
 
         if self.debugging:
             print('[INFO] Circuit is constructed!')
 
+    # Returns the physical qubit of every variable after the circuit, the variables end up away from their initial
+    # positions in the persistent layout mode
+    def final_layout(self) -> Dict[str, int]:
+        return {v: self.layout.physical(v) for v in self.variables}
+
     def ibm_layout(self):
-        qubits_size = len(self.circuit.qubits)
-        return [self.logical_to_physical[q] for q in range(qubits_size)]
+        qubits_size = self.circuit.num_qubits
+        return [self.layout.logical_to_physical[q] for q in range(qubits_size)]
 
 
 # Test a given file
 ### Simple mapping == True is IBM layout ###
 ### Simple mapping == False is our layout ###
 # def test(ctg: SimpleCTG, input_file: str, output_file: str, simple_mapping=False, debugging=True, limit_100=True,
-def test(ctg: SimpleCTG, input_file: str, simple_mapping=False, debugging=True, optimization_level=1, num_of_iterations=None):
+# simulate: run the circuit on Aer's qasm simulator, batch runs usually only need the mapping and the cost
+# trace_memory: measure the peak memory of every stage (slows the pipeline down)
+# trace_file: write the stages as Chrome trace JSON to this file
+# qasm_output: 'transpiled' circuit, 'routed' circuit (straight from the gate sequence, no qiskit needed) or None
+# qasm_gzip: compress the QASM file with gzip
+# mapping_refine: improve the mapping with simulated annealing (mapping_refine_budget seconds at most, mapping_seed)
+# mapping_starts: number of mapping searches from different starting points, run in parallel on mapping_workers processes
+# render: draw the logical and the reduced graph and the transpiled circuit into ./outputs (the GUI shows them),
+# the images are drawn on a background thread and are complete when test returns
+def test(ctg: SimpleCTG, input_file: str, simple_mapping=False, debugging=True, optimization_level=1, num_of_iterations=None,
+         simulate=True, trace_memory=False, trace_file: Optional[str] = None, qasm_output: Optional[str] = 'transpiled',
+         qasm_gzip=False, mapping_time_budget: Optional[float] = None, mapping_node_budget: Optional[int] = None,
+         mapping_starts=1, mapping_workers: Optional[int] = None, mapping_refine=False,
+         mapping_refine_budget: Optional[float] = None, mapping_seed: Optional[int] = None, render=False):
 
     # Create directory outputs/ if it doesn't exist
     os.makedirs('./outputs/txt/', exist_ok=True)
-    os.makedirs('./outputs/circuit/', exist_ok=True)
+    if render:
+        os.makedirs('./outputs/circuit/', exist_ok=True)
 
     # make feature keeper
     feature_keeper = {}
 
+    # every stage of the pipeline is measured by the tracer
+    stage_tracer = tracer.Tracer(trace_memory)
+    ctg.tracer = stage_tracer
+
     # parse file name
     file_name = input_file.split('/')[-1].split('.')[0]
 
     # Set the input
-    ctg.set_input(input_file)
+    with stage_tracer.stage('parse'):
+        ctg.set_input(input_file)
+    stage_tracer.count('gates_parsed', len(ctg.gates))
 
     # Set variable to physical mapping sequentially, thus a -> 0, b -> 1, c -> 2, etc.
     mapping = [(v, i) for i, v in enumerate(ctg.variables)]
     ancilla_mapping = None
     logical_circuit = None
 
-    if not simple_mapping:
-        weighted_graph = misc.Mapping()
-        weighted_graph.set_nodes_physical(ctg.couples)
-        weighted_graph.physical_add_edges(ctg.couples)
-        weighted_graph.construct_ctg(ctg.variables, ctg.gates)
-        logical_circuit = list(weighted_graph.logical_graph.edges())
-        logical_graph_name, reduced_graph_name = weighted_graph.isomorph(file_name)
-        feature_keeper['logical_graph'] = logical_graph_name
-        feature_keeper['reduced_graph'] = reduced_graph_name
-        mapping, ancilla_mapping = weighted_graph.get_mapping()
-
-    # Set mappings
-    ctg.set_mapping(mapping, ancilla_mapping)
+    with stage_tracer.stage('mapping'):
+        if not simple_mapping:
+            weighted_graph = misc.Mapping()
+            weighted_graph.tracer = stage_tracer
+            weighted_graph.debugging = debugging
+            # with a budget the mapper returns the best mapping found instead of searching indefinitely
+            weighted_graph.time_budget = mapping_time_budget
+            weighted_graph.node_budget = mapping_node_budget
+            weighted_graph.starts = mapping_starts
+            weighted_graph.workers = mapping_workers
+            # a circuit with the same interaction graph is not mapped again
+            weighted_graph.cache = ctg.mapping_cache
+            weighted_graph.draw_graphs = render
+            weighted_graph.set_nodes_physical(ctg.couples)
+            weighted_graph.physical_add_edges(ctg.couples)
+            with stage_tracer.stage('cig'):
+                weighted_graph.construct_ctg(ctg.variables, ctg.gates)
+            logical_circuit = weighted_graph.logical_edges()
+            logical_weights = weighted_graph.weights.copy()
+            with stage_tracer.stage('isomorph'):
+                logical_graph_name, reduced_graph_name = weighted_graph.isomorph(file_name)
+            feature_keeper['logical_graph'] = logical_graph_name
+            feature_keeper['reduced_graph'] = reduced_graph_name
+            if mapping_refine:
+                with stage_tracer.stage('refine'):
+                    weighted_graph.refine(logical_weights, time_budget=mapping_refine_budget, seed=mapping_seed)
+            mapping, ancilla_mapping = weighted_graph.get_mapping()
+
+        # Set mappings
+        ctg.set_mapping(mapping, ancilla_mapping)
     feature_keeper['mapping'] = ctg.mapping
     if debugging:
         print('[INFO] Mapping is', ctg.mapping)
 
     # Construct the circuit
-    ctg.construct()
+    with stage_tracer.stage('construct'):
+        ctg.construct()
 
     # Get the layout as IBM specifies
     layout = ctg.ibm_layout()
 
-    # Get the logical positions of the output variables
-    variables_to_measure = [ctg.variable_to_logical[v] for v in ctg.outputs]
+    # Get the logical positions of the output variables, where the routing left them
+    variables_to_measure = [ctg.layout.logical(v) for v in ctg.outputs]
+    feature_keeper['final_layout'] = ctg.final_layout()
 
     ctg.circuit.measure(variables_to_measure, list(
         range(len(variables_to_measure))))
 
+    # The routed circuit is converted to qiskit only once, after the routing
+    with stage_tracer.stage('convert'):
+        circuit = ctg.circuit.to_quantum_circuit()
+
     # Transpile the circuit https://towardsdatascience.com/what-is-a-quantum-circuit-transpiler-ba9a7853e6f9
     # set the optimization level
-    compiled = qiskit_transpile(
-        ctg.circuit, ctg.backend, initial_layout=layout, optimization_level=optimization_level)
-    assembled = Q_assemble(compiled)
-    qasm = compiled.qasm()
-
-    print('[RESULT] cost: {}'.format(
-        len(assembled.experiments[0].instructions)))
-    # print('[RESULT] qasm:\n{}'.format(qasm))
+    # without a backend object (cached architecture) the coupling map and basis gates are given explicitly
+    with stage_tracer.stage('transpile'):
+        if ctg.backend is not None:
+            compiled = qiskit_transpile(
+                circuit, ctg.backend, initial_layout=layout, optimization_level=optimization_level)
+        else:
+            compiled = qiskit_transpile(
+                circuit, coupling_map=ctg.couples, basis_gates=ctg.basis_gates,
+                initial_layout=layout, optimization_level=optimization_level)
+    with stage_tracer.stage('assemble'):
+        assembled = Q_assemble(compiled)
+
+    feature_keeper['cost'] = len(assembled.experiments[0].instructions)
+    print('[RESULT] cost: {}'.format(feature_keeper['cost']))
     if not simple_mapping:
-        print('[RESULT] swap: {}'.format(weighted_graph.count_swap(
-            ctg.mapping, ctg.paths, logical_circuit)))
+        feature_keeper['swap'] = weighted_graph.count_swap(
+            ctg.mapping, ctg.paths, logical_circuit)
+        print('[RESULT] swap: {}'.format(feature_keeper['swap']))
+        # swaps weighted by the number of interactions of every pair
+        feature_keeper['weighted_swap'] = weighted_graph.swap_cost(ctg.mapping, logical_weights)
+        print('[RESULT] weighted swap: {}'.format(feature_keeper['weighted_swap']))
 
-    # Use Aer's qasm_simulator
-    simulator = Aer.get_backend('qasm_simulator')
+    if simulate:
+        with stage_tracer.stage('simulate'):
+            # Use Aer's qasm_simulator
+            simulator = Aer.get_backend('qasm_simulator')
 
-    # Execute the circuit on the qasm simulator
-    job = qiskit_execute(ctg.circuit, simulator, shots=num_of_iterations)
+            # Execute the circuit on the qasm simulator
+            job = qiskit_execute(circuit, simulator, shots=num_of_iterations)
 
-    # Grab results from the job
-    result = job.result()
+            # Grab results from the job
+            result = job.result()
 
-    # Return counts
-    counts = result.get_counts(ctg.circuit)
-    print('[RESULT] counts {}'.format(counts))
+            # Return counts
+            counts = result.get_counts(circuit)
+        feature_keeper['counts'] = counts
+        print('[RESULT] counts {}'.format(counts))
 
     # retrieve date
     today = datetime.datetime.today()
 
-    # save qasm to txt file
-    qasm_name = './outputs/txt/{}_{}.txt'.format(
-        file_name, today.strftime("%Y%m%d%H%M%S"))
-    feature_keeper['qasm_file'] = qasm_name
-
-    with open(qasm_name, 'w+') as qasm_file:
-        qasm_file.write(qasm)
-        qasm_file.close()
-
-    # save circuit image
-    try:
-        circuit_image_name = './outputs/circuit/{}_{}.txt'.format(
-            file_name, today.strftime("%Y%m%d%H%M%S"))
-        feature_keeper['ibm_circuit'] = circuit_image_name
-        ctg.circuit.draw(filename=circuit_image_name,
-                         vertical_compression='high', idle_wires=False, fold=75)
-    except Exception as ex:
-        feature_keeper['ibm_circuit'] = 'None'
-    plt.clf()
+    with stage_tracer.stage('output'):
+        # save qasm to txt file, it is streamed gate by gate instead of building the whole string
+        if qasm_output is not None:
+            qasm_name = './outputs/txt/{}_{}.txt{}'.format(
+                file_name, today.strftime("%Y%m%d%H%M%S"), '.gz' if qasm_gzip else '')
+            feature_keeper['qasm_file'] = qasm_name
+            qasm_writer.save(compiled if qasm_output == 'transpiled' else ctg.circuit, qasm_name, qasm_gzip)
+
+        # save circuit image in the background
+        circuit_image = None
+        if render:
+            circuit_image_name = './outputs/circuit/{}_{}.txt'.format(
+                file_name, today.strftime("%Y%m%d%H%M%S"))
+            feature_keeper['ibm_circuit'] = circuit_image_name
+            circuit_image = artifacts.default_renderer().submit(
+                circuit.draw, filename=circuit_image_name, vertical_compression='high', idle_wires=False, fold=75)
 
     # Create a new circuit with the same amount of quantum and classical registers
     # This is needed to set the initial states of the variables by inserting not gates
-    circuit = QuantumCircuit()
-    for register in ctg.circuit.qregs:
-        circuit.add_register(register)
-    for register in ctg.circuit.cregs:
-        circuit.add_register(register)
+    initial_circuit = QuantumCircuit()
+    for register in circuit.qregs:
+        initial_circuit.add_register(register)
+    for register in circuit.cregs:
+        initial_circuit.add_register(register)
+
+    # the images are written by now, they were drawn while the circuit was transpiled and simulated
+    if render:
+        with stage_tracer.stage('artifacts'):
+            artifacts.default_renderer().wait()
+        if circuit_image.exception() is not None:
+            feature_keeper['ibm_circuit'] = 'None'
+
+    # wall time of every stage in seconds and all of the measurements
+    feature_keeper['trace'] = stage_tracer.report()
+    feature_keeper['times'] = {name: stage['wall'] for name, stage in feature_keeper['trace']['stages'].items()}
+    if trace_file is not None:
+        stage_tracer.save_chrome_trace(trace_file)
 
     return feature_keeper
 
 
 def gui_interaction(circuit_file: str, directory: str, layout_type: bool, optimization_level: int,  architecture: str or list,
-                    num_of_iterations: int, arbitrary : bool):
+                    num_of_iterations: int, arbitrary : bool, offline=False):
     """
     Function called by gui.
     """
@@ -683,10 +870,11 @@ def gui_interaction(circuit_file: str, directory: str, layout_type: bool, optimi
     if arbitrary:
         simple_ctg = SimpleCTG(None, arbitrary_coupling=architecture)
     else:
-        simple_ctg = SimpleCTG(architecture)
+        simple_ctg = SimpleCTG(architecture, offline=offline)
     simple_ctg.initialize('ibm-q', 'open', 'main')
 
-    circuit_features = test(simple_ctg, directory + "/" + circuit_file, simple_mapping=layout_type, optimization_level=optimization_level, num_of_iterations=num_of_iterations)
+    circuit_features = test(simple_ctg, directory + "/" + circuit_file, simple_mapping=layout_type, optimization_level=optimization_level, num_of_iterations=num_of_iterations,
+                            render=True)
         
 
     return s.getvalue(), circuit_features
@@ -0,0 +1,73 @@
+"""ancilla_pool.py: Implements the pool of ancilla qubits used by the routing of multi-controlled gates"""
+
+from typing import List, Set
+
+from qubit_layout import QubitLayout
+from shortest_paths import ShortestPaths
+
+# Name prefix of ancilla variables
+PREFIX = 'ancilla'
+
+
+class AncillaPool:
+    """
+    Ancilla qubits of a circuit being routed.
+
+    An ancilla is clean (|0>) whenever it is not reserved: the gates which use one uncompute it before releasing it,
+    so the free ancillas are reused by the next gates. The nearest free ancilla of a qubit is the first qubit of its
+    distance rings (see ShortestPaths.rings) which is either not in the layout yet or holds a free ancilla, every
+    check is O(1), so the search stops after a few qubits unless the neighbourhood is full of variables.
+
+    Attributes:
+    layout (QubitLayout): Placement of the variables, the ancillas are variables of the layout.
+    paths (ShortestPaths): Shortest paths of the coupling map.
+    free (Set[str]): Ancillas which are not reserved.
+    reserved (Set[str]): Ancillas used by the gate being routed.
+    """
+
+    def __init__(self, layout: QubitLayout, paths: ShortestPaths):
+        self.layout = layout
+        self.paths = paths
+        # ancillas given in the mapping are in the layout already
+        self.free: Set[str] = {name for name in layout.names if name.startswith(PREFIX)}
+        self.reserved: Set[str] = set()
+        self.count = len(self.free)
+
+    def add(self, physical: int) -> str:
+        """
+        Places a new ancilla on a physical qubit which is not in the layout and returns its name.
+        """
+        name = PREFIX + str(self.count)
+        while name in self.layout:
+            self.count += 1
+            name = PREFIX + str(self.count)
+        self.count += 1
+        self.layout.add(name, physical)
+        self.free.add(name)
+        return name
+
+    def nearest(self, variable: str) -> int:
+        """
+        Returns the nearest physical qubit to the variable which is not in the layout or holds a free ancilla,
+        ties are broken by the qubit index.
+        """
+        for qubit in self.paths.rings()[self.layout.physical(variable)]:
+            occupant = self.layout.variable_at(qubit)
+            if occupant is None or occupant in self.free:
+                return qubit
+        raise Exception('Not enough qubits!')
+
+    def reserve(self, name: str):
+        """
+        Takes a free ancilla for the gate being routed.
+        """
+        self.free.remove(name)
+        self.reserved.add(name)
+
+    def release(self, names: List[str]):
+        """
+        Returns ancillas to the pool, they must be clean again.
+        """
+        for name in names:
+            self.reserved.remove(name)
+            self.free.add(name)
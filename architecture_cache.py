@@ -0,0 +1,289 @@
+"""architecture_cache.py: Implements in-memory and on-disk cache of physical architectures"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from shortest_paths import ShortestPaths
+
+
+def default_directory() -> str:
+    """
+    Returns the cache directory, $SP2020QUANTUM_CACHE or $XDG_CACHE_HOME/sp2020quantum (~/.cache/sp2020quantum).
+    """
+    if os.environ.get('SP2020QUANTUM_CACHE'):
+        return os.environ['SP2020QUANTUM_CACHE']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'sp2020quantum')
+
+
+def canonical_couples(couples: List[List[int]]) -> List[List[int]]:
+    """
+    Returns the coupling list without duplicates in sorted order.
+    """
+    return [list(couple) for couple in sorted(set((int(a), int(b)) for a, b in couples))]
+
+
+def architecture_key(couples: List[List[int]], qubits_num: int = 0) -> str:
+    """
+    Computes the canonical hash of an architecture, the order and duplicates of the couples do not matter.
+
+    Parameters:
+    couples (List[List[int]]): Coupling map of the architecture.
+    qubits_num (int): Number of physical qubits.
+
+    Returns:
+    str: Hex digest identifying the architecture.
+    """
+    description = json.dumps([int(qubits_num), canonical_couples(couples)], separators=(',', ':'))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+class ArchitectureEntry:
+    """
+    A cached architecture.
+
+    Attributes:
+    key (str): Canonical hash of the architecture.
+    couples (List[List[int]]): Coupling map.
+    qubits_num (int): Number of physical qubits.
+    paths (ShortestPaths): Precomputed distance and next-hop tables.
+    basis_gates (List[str]): Basis gates of the backend, None for arbitrary couplings.
+    name (str): Name of the backend, None for arbitrary couplings.
+    timestamp (float): Time when the backend information was fetched.
+    """
+
+    def __init__(self, key: str, couples: List[List[int]], qubits_num: int, paths: ShortestPaths,
+                 basis_gates: Optional[List[str]] = None, name: Optional[str] = None, timestamp: float = 0.0):
+        self.key = key
+        self.couples = couples
+        self.qubits_num = qubits_num
+        self.paths = paths
+        self.basis_gates = basis_gates
+        self.name = name
+        self.timestamp = timestamp
+
+
+class ArchitectureCache:
+    """
+    Cache of coupling maps and their shortest path tables.
+
+    Architectures are looked up in memory first, then in <directory>/<key>.npz. Backend names are resolved
+    through <directory>/backends.json, so previously seen IBM backends can be used offline.
+
+    Eviction and invalidation policy:
+    - at most max_memory_entries architectures are kept in memory, the least recently used is dropped;
+    - at most max_disk_entries .npz files are kept, the least recently used (by modification time) are removed;
+    - backend records older than max_age seconds are stale, they are only used when asked for explicitly
+      (e.g. when IBM Q can not be reached);
+    - invalidate() and clear() remove entries by hand.
+    """
+
+    INDEX_FILE = 'backends.json'
+
+    def __init__(self, directory: Optional[str] = None, max_memory_entries: int = 32, max_disk_entries: int = 256,
+                 max_age: Optional[float] = 7 * 24 * 3600):
+        self.directory = directory or default_directory()
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age = max_age
+        self.memory: 'OrderedDict[str, ArchitectureEntry]' = OrderedDict()
+
+    def __entry_file__(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.npz')
+
+    def __load_index__(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE), 'r') as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def __save_index__(self, index: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        index_name = os.path.join(self.directory, self.INDEX_FILE)
+        # write to a temporary file first, so a concurrent reader never sees a partial index
+        temp_name = '{}.{}.tmp'.format(index_name, os.getpid())
+        with open(temp_name, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_name, index_name)
+
+    def __remember__(self, entry: ArchitectureEntry):
+        self.memory[entry.key] = entry
+        self.memory.move_to_end(entry.key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def __load__(self, key: str) -> Optional[ArchitectureEntry]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return entry
+        file_name = self.__entry_file__(key)
+        try:
+            with np.load(file_name) as data:
+                entry = ArchitectureEntry(key, data['couples'].tolist(), int(data['qubits_num']),
+                                          ShortestPaths(data['distances'], data['next_hops']))
+            # mark the file as recently used for the eviction
+            os.utime(file_name)
+        except (OSError, KeyError, ValueError):
+            return None
+        self.__remember__(entry)
+        return entry
+
+    def __store__(self, entry: ArchitectureEntry):
+        self.__remember__(entry)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            file_name = self.__entry_file__(entry.key)
+            temp_name = '{}.{}.tmp.npz'.format(file_name[:-len('.npz')], os.getpid())
+            np.savez(temp_name, couples=np.array(entry.couples, dtype=np.int32).reshape(-1, 2),
+                     qubits_num=entry.qubits_num, distances=entry.paths.distances,
+                     next_hops=entry.paths.next_hops)
+            os.replace(temp_name, file_name)
+            self.evict()
+        except OSError:
+            # the cache is an optimization, a read-only disk must not break the tool
+            pass
+
+    def get_architecture(self, couples: List[List[int]], qubits_num: int = 0) -> ArchitectureEntry:
+        """
+        Returns the cached architecture for the coupling map, computing and storing its paths on a miss.
+
+        Parameters:
+        couples (List[List[int]]): Coupling map.
+        qubits_num (int): Number of physical qubits.
+
+        Returns:
+        ArchitectureEntry: Cached architecture.
+        """
+        key = architecture_key(couples, qubits_num)
+        entry = self.__load__(key)
+        if entry is None:
+            couples = canonical_couples(couples)
+            entry = ArchitectureEntry(key, couples, qubits_num, ShortestPaths.from_couples(couples, qubits_num))
+            self.__store__(entry)
+        return entry
+
+    def get_paths(self, couples: List[List[int]], qubits_num: int = 0) -> ShortestPaths:
+        """
+        Returns the shortest path tables of the coupling map.
+        """
+        return self.get_architecture(couples, qubits_num).paths
+
+    def get_backend(self, name: str, allow_stale=False) -> Optional[ArchitectureEntry]:
+        """
+        Returns the cached architecture of an IBM backend.
+
+        Parameters:
+        name (str): Name of the backend.
+        allow_stale (bool): Return the entry even if it is older than max_age.
+
+        Returns:
+        ArchitectureEntry: Cached architecture or None if the backend is unknown or stale.
+        """
+        record = self.__load_index__().get(name)
+        if record is None:
+            return None
+        if not allow_stale and self.max_age is not None and time.time() - record['timestamp'] > self.max_age:
+            return None
+        entry = self.__load__(record['key'])
+        if entry is None:
+            return None
+        return ArchitectureEntry(entry.key, entry.couples, entry.qubits_num, entry.paths,
+                                 record.get('basis_gates'), name, record['timestamp'])
+
+    def put_backend(self, name: str, couples: List[List[int]], qubits_num: int,
+                    basis_gates: Optional[List[str]] = None) -> ArchitectureEntry:
+        """
+        Stores the configuration of an IBM backend fetched from IBM Q.
+
+        Returns:
+        ArchitectureEntry: Cached architecture with precomputed paths.
+        """
+        architecture = self.get_architecture(couples, qubits_num)
+        entry = ArchitectureEntry(architecture.key, architecture.couples, architecture.qubits_num,
+                                  architecture.paths, basis_gates, name, time.time())
+        index = self.__load_index__()
+        index[name] = {'key': entry.key, 'basis_gates': basis_gates, 'timestamp': entry.timestamp}
+        try:
+            self.__save_index__(index)
+        except OSError:
+            pass
+        return entry
+
+    def evict(self):
+        """
+        Removes the least recently used .npz files above max_disk_entries.
+        """
+        try:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.npz')]
+        except OSError:
+            return
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=modification_time)
+        for file_name in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(file_name)
+            except FileNotFoundError:
+                # another process evicted it first
+                pass
+
+    def invalidate(self, name_or_key: str):
+        """
+        Removes a backend record (by backend name) or an architecture (by key) from the cache.
+        """
+        index = self.__load_index__()
+        if name_or_key in index:
+            del index[name_or_key]
+            self.__save_index__(index)
+            return
+        self.memory.pop(name_or_key, None)
+        try:
+            os.remove(self.__entry_file__(name_or_key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """
+        Removes everything from the cache.
+        """
+        self.memory.clear()
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            return
+        for f in files:
+            if f.endswith('.npz') or f == self.INDEX_FILE:
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except FileNotFoundError:
+                    # another process removed it first
+                    pass
+
+
+def modification_time(file_name: str) -> float:
+    # a file removed by another process in the meantime is the oldest one
+    try:
+        return os.path.getmtime(file_name)
+    except FileNotFoundError:
+        return 0.0
+
+
+_default_cache = None
+
+
+def default_cache() -> ArchitectureCache:
+    """
+    Returns the cache shared by all SimpleCTG instances of the process.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ArchitectureCache()
+    return _default_cache
@@ -0,0 +1,125 @@
+"""artifacts.py: Implements background rendering of graph images and other output artifacts"""
+
+import datetime
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import networkx as nx
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+def graph_key(graph: nx.Graph) -> str:
+    """
+    Computes the hash of a weighted graph with its node names, the layout of the graph depends on both.
+    """
+    edges = sorted(sorted([str(u), str(v)]) + [d] for u, v, d in graph.edges(data='weight', default=1))
+    description = json.dumps([sorted(str(node) for node in graph.nodes()), edges], separators=(',', ':'))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def graph_image_name(file_name: str, is_logical=True) -> str:
+    """
+    Returns the name of the image of the logical (./outputs/input) or the reduced graph (./outputs/reduced).
+    """
+    directory = './outputs/input/' if is_logical else './outputs/reduced/'
+    os.makedirs(directory, exist_ok=True)
+    return '{}{}_{}.jpeg'.format(directory, file_name, datetime.datetime.today().strftime("%Y%m%d%H%M%S"))
+
+
+class ArtifactRenderer:
+    """
+    Renders images on a background thread, so the pipeline does not wait for them.
+
+    Graphs are drawn with the object-oriented matplotlib API (no pyplot state is shared with the main thread) and
+    their spring layouts are cached by the hash of the graph, the least recently used layout is dropped above
+    max_layouts.
+
+    Attributes:
+    layouts (OrderedDict[str, dict]): Node positions of every cached graph.
+    pending (List[Future]): Artifacts which are not written yet.
+    """
+
+    def __init__(self, workers: int = 1, max_layouts: int = 128):
+        self.max_layouts = max_layouts
+        self.layouts: 'OrderedDict[str, Dict]' = OrderedDict()
+        self.pending: List[Future] = []
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='artifacts')
+
+    def layout(self, graph: nx.Graph) -> Dict:
+        """
+        Returns the spring layout of the graph, computed only once per graph.
+        """
+        key = graph_key(graph)
+        positions = self.layouts.get(key)
+        if positions is None:
+            positions = nx.spring_layout(graph, seed=0)
+            self.layouts[key] = positions
+            while len(self.layouts) > self.max_layouts:
+                self.layouts.popitem(last=False)
+        else:
+            self.layouts.move_to_end(key)
+        return positions
+
+    def draw_graph(self, graph: nx.Graph, image_name: str) -> str:
+        """
+        Draws a weighted graph into a .jpeg file, heavy edges (weight > 5) are solid, the others dashed.
+
+        Returns:
+        str: The name of the image.
+        """
+        figure = Figure(figsize=(6, 4))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        elarge = [(u, v) for (u, v, d) in graph.edges(data=True) if d["weight"] > 5]
+        esmall = [(u, v) for (u, v, d) in graph.edges(data=True) if d["weight"] <= 5]
+        # positions for all nodes
+        pos = self.layout(graph)
+        # nodes
+        nx.draw_networkx_nodes(graph, pos, node_size=700, ax=ax)
+        # edges
+        nx.draw_networkx_edges(graph, pos, edgelist=elarge, width=6, ax=ax)
+        nx.draw_networkx_edges(graph, pos, edgelist=esmall, width=6, alpha=0.5, edge_color="b", style="dashed", ax=ax)
+        # labels
+        nx.draw_networkx_labels(graph, pos, font_size=20, font_family="sans-serif", ax=ax)
+        ax.axis("off")
+        figure.savefig(image_name)
+        return image_name
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        """
+        Runs a function producing an artifact in the background.
+        """
+        future = self.executor.submit(function, *args, **kwargs)
+        self.pending.append(future)
+        return future
+
+    def submit_graph(self, graph: nx.Graph, image_name: str) -> Future:
+        """
+        Draws a copy of the graph in the background, the graph itself may change in the meantime.
+        """
+        return self.submit(self.draw_graph, graph.copy(), image_name)
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Waits until all submitted artifacts are written, errors are raised by the futures themselves.
+        """
+        pending, self.pending = self.pending, []
+        wait(pending, timeout=timeout)
+
+
+_default_renderer = None
+
+
+def default_renderer() -> ArtifactRenderer:
+    """
+    Returns the renderer shared by the whole process.
+    """
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = ArtifactRenderer()
+    return _default_renderer
@@ -0,0 +1,241 @@
+"""backend_catalog.py: Implements offline catalog of IBM Q device configurations"""
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+
+import architecture_cache
+
+# Catalog shipped with the repository
+BUNDLED_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backends', 'catalog.json')
+
+
+def local_catalog_file() -> str:
+    """
+    Returns the path of the locally generated catalog, its entries override the bundled ones.
+    """
+    return os.path.join(architecture_cache.default_directory(), 'catalog.json')
+
+
+class CatalogEntry:
+    """
+    Configuration of a device.
+
+    Attributes:
+    name (str): Name of the backend.
+    n_qubits (int): Number of physical qubits.
+    coupling_map (List[List[int]]): Coupling map of the device.
+    basis_gates (List[str]): Basis gates of the device.
+    gate_errors (Dict[str, float]): Optional two-qubit gate errors, keyed by 'cx<a>_<b>'.
+    readout_errors (List[float]): Optional readout error of every qubit.
+    """
+
+    def __init__(self, name: str, n_qubits: int, coupling_map: List[List[int]], basis_gates: List[str],
+                 gate_errors: Optional[Dict[str, float]] = None, readout_errors: Optional[List[float]] = None):
+        self.name = name
+        self.n_qubits = n_qubits
+        self.coupling_map = coupling_map
+        self.basis_gates = basis_gates
+        self.gate_errors = gate_errors
+        self.readout_errors = readout_errors
+
+    def __repr__(self):
+        return '{} ({} qubits, {} couples)'.format(self.name, self.n_qubits, len(self.coupling_map))
+
+    def to_dict(self):
+        description = {'n_qubits': self.n_qubits, 'coupling_map': self.coupling_map, 'basis_gates': self.basis_gates}
+        # entries without calibration data (e.g. the bundled ones) carry no error fields
+        if self.gate_errors is not None:
+            description['gate_errors'] = self.gate_errors
+        if self.readout_errors is not None:
+            description['readout_errors'] = self.readout_errors
+        return description
+
+    @classmethod
+    def from_backend(cls, backend):
+        """
+        Creates an entry from an IBM Q backend, error rates are taken from the calibration data if there is any.
+        """
+        configs = backend.configuration()
+        gate_errors = None
+        readout_errors = None
+        try:
+            properties = backend.properties()
+        except Exception:
+            properties = None
+        if properties is not None:
+            gate_errors = {}
+            for gate in properties.gates:
+                if gate.gate == 'cx':
+                    gate_errors['cx{}_{}'.format(*gate.qubits)] = properties.gate_error('cx', gate.qubits)
+            readout_errors = [properties.readout_error(q) for q in range(configs.n_qubits)]
+        return cls(configs.backend_name, configs.n_qubits, configs.coupling_map or [], configs.basis_gates,
+                   gate_errors, readout_errors)
+
+
+class BackendCatalog:
+    """
+    Catalog of device configurations indexed by name and by coupling map size.
+    """
+
+    def __init__(self, entries: Optional[List[CatalogEntry]] = None):
+        self.entries: Dict[str, CatalogEntry] = {}
+        # names sorted by the size of the coupling map, biggest first
+        self.by_size: List[str] = []
+        for entry in entries or []:
+            self.add(entry)
+
+    def __contains__(self, name: str):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry: CatalogEntry):
+        """
+        Adds or replaces an entry, the size index is kept sorted.
+        """
+        self.entries[entry.name] = entry
+        self.by_size = sorted(self.entries, key=lambda name: (-len(self.entries[name].coupling_map),
+                                                              -self.entries[name].n_qubits, name))
+
+    def get(self, name: str) -> CatalogEntry:
+        """
+        Returns the entry of the backend.
+
+        Raises:
+        KeyError: The backend is not in the catalog.
+        """
+        if name not in self.entries:
+            raise KeyError('Backend {} is not in the catalog. Known backends: {}'.format(
+                name, ', '.join(sorted(self.entries))))
+        return self.entries[name]
+
+    def names(self) -> List[str]:
+        return list(self.by_size)
+
+    def largest(self) -> CatalogEntry:
+        """
+        Returns the entry with the biggest coupling map.
+        """
+        if len(self.by_size) == 0:
+            raise KeyError('The catalog is empty')
+        return self.entries[self.by_size[0]]
+
+    def load(self, file_name: str):
+        """
+        Adds all entries of a catalog file.
+        """
+        with open(file_name, 'r') as catalog_file:
+            data = json.load(catalog_file)
+        for name, description in data['backends'].items():
+            self.add(CatalogEntry(name, description['n_qubits'], description['coupling_map'],
+                                  description['basis_gates'], description.get('gate_errors'),
+                                  description.get('readout_errors')))
+
+    def save(self, file_name: str):
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        with open(file_name, 'w') as catalog_file:
+            json.dump({'version': 1, 'backends': {name: self.entries[name].to_dict() for name in sorted(self.entries)}},
+                      catalog_file)
+
+
+_default_catalog = None
+
+
+def default_catalog() -> BackendCatalog:
+    """
+    Returns the bundled catalog extended by the local one, loaded once per process.
+    """
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = BackendCatalog()
+        _default_catalog.load(BUNDLED_CATALOG)
+        if os.path.isfile(local_catalog_file()):
+            _default_catalog.load(local_catalog_file())
+    return _default_catalog
+
+
+def fake_backend_names(name: str) -> List[str]:
+    """
+    Returns the names of the qiskit mock backends which may describe a device (e.g. FakeMelbourne for
+    ibmq_16_melbourne).
+    """
+    short_name = name.replace('ibmq_', '').replace('16_', '')
+    fake_names = ['Fake' + short_name.capitalize()]
+    if name == 'ibmqx2':
+        fake_names.append('FakeYorktown')
+    return fake_names
+
+
+def fake_backend(name: str, debugging: bool = False):
+    """
+    Returns the qiskit mock backend of a device or None if the installed qiskit has none. Mock backends of the newer
+    devices (e.g. FakeAthens, FakeMontreal, FakeToronto) are missing from the pinned qiskit 0.16.2, those devices are
+    described by the coupling map and the basis gates of the catalog only, without a noise model.
+    """
+    try:
+        from qiskit.test import mock
+    except ImportError:
+        mock = None
+    for fake_name in fake_backend_names(name):
+        if mock is not None and hasattr(mock, fake_name):
+            return getattr(mock, fake_name)()
+    if debugging:
+        print('[INFO] The installed qiskit has no {}, using the coupling map of {} only'.format(
+            ' or '.join(fake_backend_names(name)), name))
+    return None
+
+
+def check_fake_backends():
+    """
+    Prints which catalog entries have a mock backend in the installed qiskit.
+    """
+    for name in default_catalog().names():
+        backend = fake_backend(name)
+        if backend is not None:
+            print('[INFO] {}: {}'.format(name, type(backend).__name__))
+        else:
+            print('[INFO] {}: no fake backend, coupling map and basis gates only'.format(name))
+
+
+def generate(token: Optional[str], hub: Optional[str] = None, group: Optional[str] = None,
+             project: Optional[str] = None, file_name: Optional[str] = None):
+    """
+    Fetches configurations of all real devices available to the account and stores them in the local catalog.
+    """
+    from qiskit import IBMQ
+
+    if token is not None:
+        IBMQ.enable_account(token)
+    else:
+        IBMQ.load_account()
+    catalog = BackendCatalog()
+    file_name = file_name or local_catalog_file()
+    if os.path.isfile(file_name):
+        catalog.load(file_name)
+    for backend in IBMQ.get_provider(hub, group, project).backends():
+        if backend.configuration().simulator:
+            continue
+        entry = CatalogEntry.from_backend(backend)
+        catalog.add(entry)
+        print('[INFO] {}'.format(entry))
+    catalog.save(file_name)
+    print('[INFO] Catalog is saved to {}'.format(file_name))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the local catalog of IBM Q devices')
+    parser.add_argument('--token', help='IBM Q token, the stored account is used if omitted')
+    parser.add_argument('--hub', default='ibm-q')
+    parser.add_argument('--group', default='open')
+    parser.add_argument('--project', default='main')
+    parser.add_argument('--output', help='catalog file, {} by default'.format(local_catalog_file()))
+    parser.add_argument('--check-fake', action='store_true',
+                        help='list the catalog entries which have a fake backend in the installed qiskit and exit')
+    args = parser.parse_args()
+    if args.check_fake:
+        check_fake_backends()
+    else:
+        generate(args.token, args.hub, args.group, args.project, args.output)
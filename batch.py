@@ -0,0 +1,268 @@
+"""batch.py: Implements headless batch processing of .real files over a process pool"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from typing import Dict, List, Optional, Tuple
+
+import SimpleCTG
+import misc
+
+# columns of the result file, stage times are stored as time_<stage>
+FIELDS = ['file', 'architecture', 'status', 'swap', 'weighted_swap', 'cost', 'mapping', 'final_layout', 'time_parse',
+          'time_mapping', 'time_cig', 'time_isomorph', 'time_refine', 'time_construct', 'time_convert',
+          'time_transpile', 'time_assemble', 'time_simulate', 'time_output', 'time_artifacts', 'time_total',
+          'gates_parsed', 'swaps_inserted', 'toffoli_template_hits', 'placements', 'isomorph_backtracks',
+          'monomorphism_calls', 'monomorphism_expansions', 'anytime_fallbacks', 'multistart_searches',
+          'mapping_cache_hits', 'refinement_gain', 'error']
+
+# state of a worker process: settings and one initialized SimpleCTG per architecture
+_worker_settings: Dict = {}
+_worker_ctgs: Dict[str, SimpleCTG.SimpleCTG] = {}
+
+
+def collect_inputs(patterns: List[str]) -> List[str]:
+    """
+    Expands directories and glob patterns to a sorted list of .real files.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.update(glob.glob(os.path.join(pattern, '*.real')))
+        else:
+            files.update(glob.glob(pattern))
+    # the biggest files go first, so they do not end up alone at the end of the run
+    return sorted(files, key=lambda f: (-os.path.getsize(f), f))
+
+
+def load_couplings(file_name: str) -> Dict[str, List[List[int]]]:
+    """
+    Loads arbitrary couplings from a JSON file, either a single coupling list or a {name: coupling list} dict.
+    """
+    with open(file_name, 'r') as coupling_file:
+        data = json.load(coupling_file)
+    if isinstance(data, dict):
+        return data
+    return {os.path.splitext(os.path.basename(file_name))[0]: data}
+
+
+def init_worker(settings: Dict):
+    """
+    Process pool initializer, signs in to IBM Q once per worker if the run is online.
+    """
+    _worker_settings.update(settings)
+    _worker_ctgs.clear()
+    if not settings['offline']:
+        from qiskit import IBMQ
+        if settings.get('token'):
+            IBMQ.enable_account(settings['token'])
+        else:
+            IBMQ.load_account()
+
+
+def get_ctg(architecture: str, coupling: Optional[List[List[int]]]) -> SimpleCTG.SimpleCTG:
+    """
+    Returns the SimpleCTG of the architecture, it is initialized only once per worker.
+    """
+    ctg = _worker_ctgs.get(architecture)
+    if ctg is None:
+        routing = {'persistent_layout': _worker_settings['persistent_layout'],
+                   'restore_layout': _worker_settings['restore_layout'],
+                   'use_mapping_cache': _worker_settings['mapping_cache']}
+        if coupling is not None:
+            ctg = SimpleCTG.SimpleCTG(None, arbitrary_coupling=coupling, **routing)
+        else:
+            ctg = SimpleCTG.SimpleCTG(architecture, offline=_worker_settings['offline'], **routing)
+        ctg.initialize(_worker_settings['hub'], _worker_settings['group'], _worker_settings['project'])
+        _worker_ctgs[architecture] = ctg
+    return ctg
+
+
+def process_file(input_file: str, architecture: str, coupling: Optional[List[List[int]]]) -> Dict:
+    """
+    Maps one file onto one architecture, runs in a worker process.
+
+    Returns:
+    dict: One row of the result file.
+    """
+    record = {'file': input_file, 'architecture': architecture, 'status': 'ok'}
+    # the pipeline reports through print, it is kept only for the error message
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    start = time.perf_counter()
+    try:
+        ctg = get_ctg(architecture, coupling)
+        shots = _worker_settings['shots']
+        features = SimpleCTG.test(ctg, input_file, simple_mapping=_worker_settings['simple_mapping'],
+                                  debugging=False, optimization_level=_worker_settings['optimization_level'],
+                                  num_of_iterations=shots if shots > 0 else None, simulate=shots > 0,
+                                  qasm_output=_worker_settings['qasm'], qasm_gzip=_worker_settings['gzip'],
+                                  mapping_time_budget=_worker_settings['time_budget'],
+                                  mapping_node_budget=_worker_settings['node_budget'],
+                                  mapping_starts=_worker_settings['starts'], mapping_workers=1,
+                                  mapping_refine=_worker_settings['refine'],
+                                  mapping_refine_budget=_worker_settings['refine_budget'],
+                                  mapping_seed=_worker_settings['seed'], render=_worker_settings['render'])
+        record['swap'] = features.get('swap')
+        record['weighted_swap'] = features.get('weighted_swap')
+        record['cost'] = features.get('cost')
+        record['mapping'] = json.dumps(features.get('mapping'))
+        record['final_layout'] = json.dumps(features.get('final_layout'))
+        for stage, elapsed in features['times'].items():
+            record['time_' + stage] = round(elapsed, 6)
+        record.update(features['trace']['counters'])
+    except misc.MappingNotFound as error:
+        record['status'] = 'no_mapping'
+        record['error'] = str(error)
+    except Exception:
+        record['status'] = 'error'
+        record['error'] = traceback.format_exc(limit=3)
+    finally:
+        sys.stdout = stdout
+    record['time_total'] = round(time.perf_counter() - start, 6)
+    return record
+
+
+class ResultWriter:
+    """
+    Writes result rows as they come to a .csv or a .jsonl file.
+    """
+
+    def __init__(self, file_name: str):
+        self.file = open(file_name, 'w', newline='')
+        self.jsonl = file_name.endswith('.jsonl') or file_name.endswith('.json')
+        self.csv = None
+        if not self.jsonl:
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, record: Dict):
+        if self.jsonl:
+            self.file.write(json.dumps(record) + '\n')
+        else:
+            self.csv.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run(files: List[str], architectures: List[Tuple[str, Optional[List[List[int]]]]], output: str,
+        settings: Dict, workers: Optional[int] = None) -> List[Dict]:
+    """
+    Maps every file onto every architecture in parallel.
+
+    Parameters:
+    files (List[str]): .real files.
+    architectures (List[(str, coupling)]): Backend names with None, or names of arbitrary couplings with the coupling list.
+    output (str): Result file, .csv or .jsonl.
+    settings (dict): offline, token, hub, group, project, simple_mapping, optimization_level, shots, qasm, gzip,
+    time_budget, node_budget, starts, refine, refine_budget, seed, render, persistent_layout,
+    restore_layout.
+    workers (int): Number of processes, all cores by default.
+
+    Returns:
+    List[dict]: All result rows.
+    """
+    writer = ResultWriter(output)
+    records = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings,)) as executor:
+            futures = [executor.submit(process_file, input_file, name, coupling)
+                       for name, coupling in architectures for input_file in files]
+            for done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                writer.write(record)
+                records.append(record)
+                print('[{}/{}] {} on {}: {} (swap {}, cost {}, {:.2f}s)'.format(
+                    done, len(futures), os.path.basename(record['file']), record['architecture'],
+                    record['status'], record.get('swap'), record.get('cost'), record['time_total']))
+    finally:
+        writer.close()
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Map .real circuits onto quantum architectures in parallel')
+    parser.add_argument('inputs', nargs='+', help='directories or glob patterns of .real files')
+    parser.add_argument('--arch', action='append', default=[], help='backend name, can be repeated')
+    parser.add_argument('--coupling', action='append', default=[],
+                        help='JSON file with a coupling list or a {name: coupling list} dict, can be repeated')
+    parser.add_argument('--output', default='results.csv', help='result file, .csv or .jsonl')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, all cores by default')
+    parser.add_argument('--online', action='store_true', help='take backends from IBM Q instead of the offline catalog')
+    parser.add_argument('--token', help='IBM Q token for --online, the stored account is used if omitted')
+    parser.add_argument('--hub', default='ibm-q')
+    parser.add_argument('--group', default='open')
+    parser.add_argument('--project', default='main')
+    parser.add_argument('--simple-mapping', action='store_true', help='use the sequential (IBM) layout')
+    parser.add_argument('--optimization-level', type=int, default=1)
+    parser.add_argument('--shots', type=int, default=0, help='simulate with this many shots, 0 disables simulation')
+    parser.add_argument('--qasm', choices=['transpiled', 'routed', 'none'], default='transpiled',
+                        help='circuit saved to outputs/txt (default transpiled)')
+    parser.add_argument('--gzip', action='store_true', help='compress the QASM files')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='seconds of the mapping search per file, the best mapping found is used when it runs out')
+    parser.add_argument('--node-budget', type=int, default=None, help='placements of the mapping search per file')
+    parser.add_argument('--starts', type=int, default=1,
+                        help='mapping searches from different starting points per file, the one with the least swaps is used')
+    parser.add_argument('--refine', action='store_true', help='improve the mapping with simulated annealing')
+    parser.add_argument('--refine-budget', type=float, default=None, help='seconds of the refinement per file')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the refinement')
+    parser.add_argument('--persistent-layout', action='store_true',
+                        help='qubits stay where the last gate left them instead of returning after every gate')
+    parser.add_argument('--restore-layout', action='store_true',
+                        help='with --persistent-layout, return the qubits to their initial positions at the end')
+    parser.add_argument('--mapping-cache', action='store_true',
+                        help='reuse the mappings of circuits mapped before with the same settings')
+    parser.add_argument('--render', action='store_true',
+                        help='draw the logical and reduced graphs and the circuit into outputs/ (slow)')
+    args = parser.parse_args(argv)
+
+    files = collect_inputs(args.inputs)
+    architectures = [(name, None) for name in args.arch]
+    for file_name in args.coupling:
+        architectures += list(load_couplings(file_name).items())
+    if len(files) == 0:
+        parser.error('no .real files found')
+    if len(architectures) == 0:
+        parser.error('at least one --arch or --coupling is required')
+
+    settings = {
+        'offline': not args.online,
+        'token': args.token,
+        'hub': args.hub,
+        'group': args.group,
+        'project': args.project,
+        'simple_mapping': args.simple_mapping,
+        'optimization_level': args.optimization_level,
+        'shots': args.shots,
+        'qasm': None if args.qasm == 'none' else args.qasm,
+        'gzip': args.gzip,
+        'time_budget': args.time_budget,
+        'node_budget': args.node_budget,
+        'starts': args.starts,
+        'refine': args.refine,
+        'refine_budget': args.refine_budget,
+        'seed': args.seed,
+        'render': args.render,
+        'persistent_layout': args.persistent_layout,
+        'restore_layout': args.restore_layout,
+        'mapping_cache': args.mapping_cache,
+    }
+    start = time.perf_counter()
+    records = run(files, architectures, args.output, settings, args.workers)
+    failed = sum(1 for r in records if r['status'] != 'ok')
+    print('[RESULT] {} runs, {} failed, {:.1f}s, results in {}'.format(
+        len(records), failed, time.perf_counter() - start, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""benchmark.py: Implements benchmarks over the RevLib corpus in tests/"""
+
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+import realfile
+
+try:
+    import resource
+except ImportError:
+    # resource is not available on Windows, peak RSS is not reported there
+    resource = None
+
+
+def peak_rss_kb():
+    """
+    Returns the peak resident set size of the process in kilobytes, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def corpus_files(directory: str = './tests') -> List[str]:
+    """
+    Returns all .real files of the directory sorted by size, smallest first.
+    """
+    return sorted(glob.glob(os.path.join(directory, '*.real')), key=os.path.getsize)
+
+
+def bench_parse(files: List[str]) -> List[Dict]:
+    """
+    Parses every file and measures the parse time and the memory allocated by the parser.
+
+    Parameters:
+    files (List[str]): Paths to .real files.
+
+    Returns:
+    List[dict]: One record per file with the gate count, time in seconds and the traced peak in kilobytes.
+    """
+    records = []
+    for input_file in files:
+        start = time.perf_counter()
+        real = realfile.parse(input_file)
+        elapsed = time.perf_counter() - start
+        # tracing slows the parser down, so the memory is measured in a separate run
+        tracemalloc.start()
+        realfile.parse(input_file)
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        records.append({
+            'file': os.path.basename(input_file),
+            'gates': len(real.gates),
+            'time': elapsed,
+            'traced_peak_kb': traced_peak // 1024,
+        })
+    return records
+
+
+def print_parse_report(records: List[Dict]):
+    print('{:<28} {:>10} {:>12} {:>14}'.format('file', 'gates', 'time (ms)', 'peak (KB)'))
+    for record in records:
+        print('{:<28} {:>10} {:>12.2f} {:>14}'.format(
+            record['file'], record['gates'], record['time'] * 1000, record['traced_peak_kb']))
+    print('[RESULT] files: {}'.format(len(records)))
+    print('[RESULT] gates: {}'.format(sum(r['gates'] for r in records)))
+    print('[RESULT] total parse time: {:.3f}s'.format(sum(r['time'] for r in records)))
+    print('[RESULT] peak RSS: {} KB'.format(peak_rss_kb()))
+
+
+# Size-tiered subsets of the corpus used by the mapping benchmark
+TIERS = {
+    'small': ['ham3_28', '4gt11_84', '3_17_13', 'rd32-v0_66', 'mod5mils_65', 'alu-v0_27', 'decod24-v0_38'],
+    'medium': ['4gt4-v0_72', 'rd53_135', 'ham7_104', 'mod5adder_127', 'cm82a_208', 'hwb5_53'],
+    'huge': ['hwb7_59', 'sym9_148', 'hwb8_113', 'urf1_149'],
+}
+
+# Metrics compared against the baseline, time and memory use the relative threshold,
+# swap and gate counts measure the quality of the mapping and use the quality threshold
+PERFORMANCE_METRICS = ['time', 'peak_rss_kb']
+QUALITY_METRICS = ['swap', 'gates']
+
+
+def run_mapping_case(input_file: str, architecture: str, queue):
+    """
+    Runs mapping and routing of one circuit, executed in a fresh process so the peak RSS belongs to this case only.
+    """
+    record = {'status': 'ok'}
+    try:
+        # imported here, the parse benchmark does not need qiskit
+        import misc
+        import SimpleCTG
+
+        stage_tracer = SimpleCTG.tracer.Tracer()
+        ctg = SimpleCTG.SimpleCTG(architecture, offline=True)
+        ctg.initialize()
+        ctg.tracer = stage_tracer
+        with stage_tracer.stage('total'):
+            with stage_tracer.stage('parse'):
+                ctg.set_input(input_file)
+            with stage_tracer.stage('mapping'):
+                weighted_graph = misc.Mapping()
+                weighted_graph.tracer = stage_tracer
+                weighted_graph.set_nodes_physical(ctg.couples)
+                weighted_graph.physical_add_edges(ctg.couples)
+                weighted_graph.construct_ctg(ctg.variables, ctg.gates)
+                logical_circuit = weighted_graph.logical_edges()
+                weighted_graph.isomorph(os.path.splitext(os.path.basename(input_file))[0])
+                mapping, ancilla_mapping = weighted_graph.get_mapping()
+                ctg.set_mapping(mapping, ancilla_mapping)
+            with stage_tracer.stage('construct'):
+                ctg.construct()
+        report = stage_tracer.report()
+        record['time'] = report['stages']['total']['wall']
+        record['stages'] = {name: stage['wall'] for name, stage in report['stages'].items() if name != 'total'}
+        record['counters'] = report['counters']
+        record['swap'] = weighted_graph.count_swap(ctg.mapping, ctg.paths, logical_circuit)
+        record['gates'] = ctg.circuit.size()
+    except Exception as ex:
+        record['status'] = 'error'
+        record['error'] = '{}: {}'.format(type(ex).__name__, ex)
+    record['peak_rss_kb'] = peak_rss_kb()
+    queue.put(record)
+
+
+def wait_for_record(process, queue, timeout: float) -> Dict:
+    """
+    Waits for the record of a case, a crashed or a too slow process gets an error or a timeout record.
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            return queue.get(timeout=0.1)
+        except Exception:
+            if not process.is_alive() and queue.empty():
+                return {'status': 'error', 'error': 'exit code {}'.format(process.exitcode)}
+    return {'status': 'timeout', 'time': timeout}
+
+
+def bench_mapping(tiers: List[str], architecture: str, tests: str = './tests', timeout: float = 600,
+                  repeat: int = 1) -> Dict[str, Dict]:
+    """
+    Runs the mapping pipeline (isomorph, construct, count_swap) over the tiers of the corpus.
+
+    Parameters:
+    tiers (List[str]): Names of the tiers (small, medium, huge).
+    architecture (str): Backend catalog entry used as the physical architecture.
+    tests (str): Directory with the .real files.
+    timeout (float): Seconds after which a case is stopped and recorded as timeout.
+    repeat (int): Number of runs of every case, the fastest one is recorded.
+
+    Returns:
+    Dict[str, dict]: Record of every circuit with tier, status, time, peak_rss_kb, swap and gates.
+    """
+    results = {}
+    for tier in tiers:
+        for circuit in TIERS[tier]:
+            input_file = os.path.join(tests, circuit + '.real')
+            best = None
+            for _ in range(repeat):
+                queue = multiprocessing.Queue()
+                process = multiprocessing.Process(target=run_mapping_case, args=(input_file, architecture, queue))
+                process.start()
+                record = wait_for_record(process, queue, timeout)
+                process.join(1)
+                if process.is_alive():
+                    process.terminate()
+                if best is None or (record['status'] == 'ok' and record['time'] < best['time']):
+                    best = record
+                if record['status'] != 'ok':
+                    break
+            best['tier'] = tier
+            results[circuit] = best
+            print('{:<8} {:<16} {:<8} time {:>9.3f}s  rss {:>8} KB  swap {:>7}  gates {:>9}'.format(
+                tier, circuit, best['status'], best.get('time', 0.0), str(best.get('peak_rss_kb')),
+                str(best.get('swap')), str(best.get('gates'))))
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float, quality_threshold: float,
+            min_time: float = 0.05) -> List[str]:
+    """
+    Compares the results with the baseline.
+
+    Parameters:
+    results (Dict[str, dict]): Records of the current run.
+    baseline (Dict[str, dict]): Records of the baseline.
+    threshold (float): Allowed relative growth of time and memory (0.2 means 20%).
+    quality_threshold (float): Allowed relative growth of the swap and gate counts.
+    min_time (float): Time differences below this many seconds are noise and never reported.
+
+    Returns:
+    List[str]: Description of every regression.
+    """
+    regressions = []
+    for circuit, record in results.items():
+        old = baseline.get(circuit)
+        if old is None:
+            continue
+        if old['status'] == 'ok' and record['status'] != 'ok':
+            regressions.append('{}: {} (was ok)'.format(circuit, record['status']))
+            continue
+        if record['status'] != 'ok' or old['status'] != 'ok':
+            continue
+        for metric in PERFORMANCE_METRICS + QUALITY_METRICS:
+            if record.get(metric) is None or old.get(metric) is None:
+                continue
+            allowed = threshold if metric in PERFORMANCE_METRICS else quality_threshold
+            if record[metric] > old[metric] * (1 + allowed):
+                if metric == 'time' and record[metric] - old[metric] < min_time:
+                    continue
+                regressions.append('{}: {} {} -> {} (+{:.1f}%)'.format(
+                    circuit, metric, old[metric], record[metric],
+                    100.0 * (record[metric] - old[metric]) / max(old[metric], 1e-9)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks over the .real corpus')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parse_parser = subparsers.add_parser('parse', help='parse time and peak memory of the .real parser')
+    parse_parser.add_argument('--tests', default='./tests', help='directory with .real files')
+
+    mapping_parser = subparsers.add_parser('mapping', help='runtime, memory and quality of mapping and routing')
+    mapping_parser.add_argument('--tests', default='./tests', help='directory with .real files')
+    mapping_parser.add_argument('--tier', action='append', choices=list(TIERS),
+                                help='tier to run, can be repeated (small and medium by default)')
+    mapping_parser.add_argument('--arch', default='ibmq_16_melbourne', help='backend catalog entry')
+    mapping_parser.add_argument('--baseline', default='benchmark_baseline.json', help='baseline JSON file')
+    mapping_parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    mapping_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='allowed relative growth of time and memory (default 0.2)')
+    mapping_parser.add_argument('--quality-threshold', type=float, default=0.0,
+                                help='allowed relative growth of swap and gate counts (default 0)')
+    mapping_parser.add_argument('--timeout', type=float, default=600, help='seconds per circuit')
+    mapping_parser.add_argument('--repeat', type=int, default=1, help='runs per circuit, the fastest is recorded')
+
+    args = parser.parse_args(argv)
+    if args.command == 'parse':
+        print_parse_report(bench_parse(corpus_files(args.tests)))
+    elif args.command == 'mapping':
+        results = bench_mapping(args.tier or ['small', 'medium'], args.arch, args.tests, args.timeout, args.repeat)
+        regressions = []
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, 'r') as baseline_file:
+                baseline = json.load(baseline_file)
+            if baseline.get('architecture') != args.arch:
+                print('[INFO] Baseline was recorded on {}, not compared'.format(baseline.get('architecture')))
+            else:
+                regressions = compare(results, baseline['cases'], args.threshold, args.quality_threshold)
+                for regression in regressions:
+                    print('[REGRESSION] {}'.format(regression))
+                print('[RESULT] {} regressions against {}'.format(len(regressions), args.baseline))
+        if args.save:
+            cases = {}
+            if os.path.isfile(args.baseline):
+                with open(args.baseline, 'r') as baseline_file:
+                    old = json.load(baseline_file)
+                if old.get('architecture') == args.arch:
+                    cases = old['cases']
+            cases.update(results)
+            with open(args.baseline, 'w') as baseline_file:
+                json.dump({'architecture': args.arch, 'date': datetime.datetime.today().isoformat(),
+                           'cases': cases}, baseline_file, indent=2, sort_keys=True)
+            print('[INFO] Baseline is saved to {}'.format(args.baseline))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
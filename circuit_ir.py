@@ -0,0 +1,146 @@
+"""circuit_ir.py: Implements compact array-backed circuit representation used during routing"""
+
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+# Gate names, the index in the list is the opcode
+OPNAMES = ['x', 'h', 't', 'tdg', 'cx', 'ch', 'cz', 'ccx', 'swap', 'measure']
+# Number of qubits of every opcode, measure stores the classical bit in the second slot
+ARITY = [1, 1, 1, 1, 2, 2, 2, 3, 2, 1]
+OPCODES: Dict[str, int] = {name: opcode for opcode, name in enumerate(OPNAMES)}
+
+X, H, T, TDG, CX, CH, CZ, CCX, SWAP, MEASURE = range(len(OPNAMES))
+
+# Every gate occupies this many operand slots, unused slots are -1
+SLOTS = 3
+
+
+class CircuitIR:
+    """
+    Flat, array-backed quantum circuit.
+
+    Gate i has the opcode opcodes[i] and the operands operands[3 * i:3 * i + 3]. Arrays grow with amortized
+    doubling, so appending a gate does not create any Python objects. The circuit is converted into a qiskit
+    QuantumCircuit (or written as QASM) once, when it is needed.
+
+    Attributes:
+    qubit_names (List[str]): Name of every qubit, each becomes a one-qubit register in qiskit.
+    clbits_num (int): Number of classical bits.
+    opcodes (array('B')): Opcode of every gate.
+    operands (array('h')): Qubit indices of every gate.
+    """
+
+    def __init__(self):
+        self.qubit_names: List[str] = []
+        self.clbits_num = 0
+        self.opcodes = array('B')
+        self.operands = array('h')
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __repr__(self):
+        return 'CircuitIR({} qubits, {} gates)'.format(len(self.qubit_names), len(self.opcodes))
+
+    @property
+    def num_qubits(self) -> int:
+        return len(self.qubit_names)
+
+    def size(self) -> int:
+        """
+        Returns the number of gates (measurements excluded), same as QuantumCircuit.size().
+        """
+        return len(self.opcodes) - self.opcodes.count(MEASURE)
+
+    def add_qubit(self, name: str) -> int:
+        """
+        Adds a qubit and returns its index.
+        """
+        self.qubit_names.append(name)
+        return len(self.qubit_names) - 1
+
+    def add_clbits(self, number: int):
+        self.clbits_num += number
+
+    def append(self, opcode: int, a: int, b: int = -1, c: int = -1):
+        self.opcodes.append(opcode)
+        self.operands.extend((a, b, c))
+
+    def extend(self, opcodes: array, operands: array):
+        """
+        Appends gates given by their opcodes and operands, e.g. a slice of another circuit.
+        """
+        self.opcodes.extend(opcodes)
+        self.operands.extend(operands)
+
+    def x(self, qubit: int):
+        self.append(X, qubit)
+
+    def h(self, qubit: int):
+        self.append(H, qubit)
+
+    def t(self, qubit: int):
+        self.append(T, qubit)
+
+    def tdg(self, qubit: int):
+        self.append(TDG, qubit)
+
+    def cx(self, control: int, target: int):
+        self.append(CX, control, target)
+
+    def ch(self, control: int, target: int):
+        self.append(CH, control, target)
+
+    def cz(self, control: int, target: int):
+        self.append(CZ, control, target)
+
+    def ccx(self, first_control: int, second_control: int, target: int):
+        self.append(CCX, first_control, second_control, target)
+
+    def swap(self, a: int, b: int):
+        self.append(SWAP, a, b)
+
+    def measure(self, qubits: List[int], clbits: List[int]):
+        for qubit, clbit in zip(qubits, clbits):
+            self.append(MEASURE, qubit, clbit)
+
+    def iter_gates(self) -> Iterator[Tuple[str, Tuple[int, ...]]]:
+        """
+        Iterates over the gates as (name, operands) pairs, the operands of measure are (qubit, clbit).
+        """
+        operands = self.operands
+        for i, opcode in enumerate(self.opcodes):
+            start = SLOTS * i
+            yield OPNAMES[opcode], tuple(operands[start:start + ARITY[opcode] + (opcode == MEASURE)])
+
+    def count_ops(self) -> Dict[str, int]:
+        counts = {}
+        for opcode in set(self.opcodes):
+            counts[OPNAMES[opcode]] = self.opcodes.count(opcode)
+        return counts
+
+    def to_quantum_circuit(self):
+        """
+        Builds the qiskit QuantumCircuit, every qubit is a one-qubit register named after its variable.
+
+        Returns:
+        QuantumCircuit: The circuit.
+        """
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        circuit = QuantumCircuit()
+        for name in self.qubit_names:
+            circuit.add_register(QuantumRegister(1, name=name))
+        if self.clbits_num > 0:
+            circuit.add_register(ClassicalRegister(self.clbits_num))
+        qubits = circuit.qubits
+        clbits = circuit.clbits
+        methods = [getattr(circuit, name) for name in OPNAMES]
+        operands = self.operands
+        for i, opcode in enumerate(self.opcodes):
+            start = SLOTS * i
+            if opcode == MEASURE:
+                circuit.measure(qubits[operands[start]], clbits[operands[start + 1]])
+            else:
+                methods[opcode](*[qubits[q] for q in operands[start:start + ARITY[opcode]]])
+        return circuit
@@ -16,6 +16,7 @@ import time
 import traceback
 from qiskit import IBMQ
 import SimpleCTG
+import backend_catalog
 import pickle
 
 
@@ -29,6 +30,7 @@ class GUI:
         self.projection_map = {}
         self.arbitrary_node_list = []
         self.arbitrary_node_connections = {}
+        self.offline = False
 
 gui = GUI()
 
@@ -75,12 +77,19 @@ def get_backends_async(sender, data):
     """
     Fills the backend_dict.
     """
-    activate_IBM_account(token=data)
-    backends = IBMQ.get_provider().backends()
-    # add backend names with indexes, so it will be easier to retrieve them in radio button
-    for i in range(len(backends)):
-        if not backends[i].name().startswith("simulator"):
-            gui.backend_dict[i] = backends[i].name()
+    try:
+        activate_IBM_account(token=data)
+        backends = IBMQ.get_provider().backends()
+        # add backend names with indexes, so it will be easier to retrieve them in radio button
+        for i in range(len(backends)):
+            if not backends[i].name().startswith("simulator"):
+                gui.backend_dict[i] = backends[i].name()
+    except Exception:
+        # IBM Q is not reachable, the backends are taken from the offline catalog
+        # the first one (default) is the backend with the biggest coupling map
+        gui.offline = True
+        for i, name in enumerate(backend_catalog.default_catalog().names()):
+            gui.backend_dict[i] = name
     gui.server_on = True
     gui.loading = True
 
@@ -155,7 +164,7 @@ def process(sender, data):
 
     try:
         infoStr, circuit_features = SimpleCTG.gui_interaction(
-            file_directory, directory, layout_type, opt_level, architecture, num_of_iter, arbitrary
+            file_directory, directory, layout_type, opt_level, architecture, num_of_iter, arbitrary, gui.offline
         )
         # show program output
         core.configure_item(
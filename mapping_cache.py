@@ -0,0 +1,245 @@
+"""mapping_cache.py: Implements in-memory and on-disk cache of logical to physical qubit mappings"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+
+import architecture_cache
+
+# version of the placement search and of the entry format, bump it when either changes so old mappings are not served
+SCHEMA_VERSION = 1
+
+
+def cig_hash(graph: nx.Graph) -> str:
+    """
+    Computes the Weisfeiler-Lehman hash of a weighted Circuit Interaction Graph, it does not depend on the node names,
+    so isomorphic graphs (e.g. the same circuit with renamed variables) have the same hash.
+    """
+    return nx.weisfeiler_lehman_graph_hash(graph, edge_attr='weight', iterations=3)
+
+
+def mapping_key(graph: nx.Graph, physical_graph: nx.Graph, settings: Optional[Dict] = None) -> str:
+    """
+    Computes the key of a mapping from the hash of the Circuit Interaction Graph, the hash of the architecture, the
+    settings of the search and SCHEMA_VERSION.
+
+    Parameters:
+    graph (NetworkX graph): The (not reduced) Circuit Interaction Graph.
+    physical_graph (NetworkX graph): The physical architecture.
+    settings (dict): Settings which change the mapping found (e.g. budgets, starts, seeds), JSON serializable.
+
+    Returns:
+    str: Hex digest identifying the mapping problem.
+    """
+    couples = [sorted(edge) for edge in physical_graph.edges()]
+    architecture = architecture_cache.architecture_key(couples, physical_graph.number_of_nodes())
+    description = json.dumps([SCHEMA_VERSION, cig_hash(graph), architecture, settings or {}], separators=(',', ':'),
+                             sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def to_graph(nodes: List[str], edges: List[List]) -> nx.Graph:
+    """
+    Builds a weighted graph from node names and [i, j, weight] edges over the node indices.
+    """
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_weighted_edges_from((nodes[i], nodes[j], weight) for i, j, weight in edges)
+    return graph
+
+
+class MappingEntry:
+    """
+    A cached mapping.
+
+    Attributes:
+    key (str): Hash of the Circuit Interaction Graph and the architecture.
+    nodes (List[str]): Names of the logical nodes.
+    edges (List[[int, int, int]]): Edges of the Circuit Interaction Graph as node indices and weight.
+    reduced (List[[int, int, int]]): Edges of the reduced Circuit Interaction Graph.
+    mapping (List[(str, int)]): Logical node and its physical node.
+    """
+
+    def __init__(self, key: str, nodes: List[str], edges: List[List], reduced: List[List], mapping: List[Tuple]):
+        self.key = key
+        self.nodes = nodes
+        self.edges = edges
+        self.reduced = reduced
+        self.mapping = mapping
+
+    def correspondence(self, graph: nx.Graph) -> Optional[Dict[str, str]]:
+        """
+        Finds the node correspondence between a Circuit Interaction Graph and the cached one.
+
+        Returns:
+        Dict[str, str]: The cached node of every node of the graph, None if the graphs are not the same up to
+        the node names (different graphs may have the same hash).
+        """
+        cached = to_graph(self.nodes, self.edges)
+        if set(graph.nodes()) == set(cached.nodes()) and \
+                all(cached.has_edge(u, v) and cached[u][v]['weight'] == wt for u, v, wt in graph.edges(data='weight')) \
+                and graph.number_of_edges() == cached.number_of_edges():
+            return {node: node for node in graph.nodes()}
+        matcher = nx.algorithms.isomorphism.GraphMatcher(
+            graph, cached, edge_match=nx.algorithms.isomorphism.numerical_edge_match('weight', 0))
+        if not matcher.is_isomorphic():
+            return None
+        return dict(matcher.mapping)
+
+
+class MappingCache:
+    """
+    Cache of mappings found by the placement search.
+
+    Mappings are looked up in memory first, then in <directory>/<key>.json. A hit on a Circuit Interaction Graph
+    with other node names is translated through the node correspondence.
+
+    Eviction policy:
+    - at most max_memory_entries mappings are kept in memory, the least recently used is dropped;
+    - at most max_disk_entries .json files are kept, the least recently used (by modification time) are removed;
+    - clear() removes everything.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_memory_entries: int = 256, max_disk_entries: int = 4096):
+        self.directory = directory or os.path.join(architecture_cache.default_directory(), 'mappings')
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory: 'OrderedDict[str, MappingEntry]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __entry_file__(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.json')
+
+    def __remember__(self, entry: MappingEntry):
+        self.memory[entry.key] = entry
+        self.memory.move_to_end(entry.key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def __load__(self, key: str) -> Optional[MappingEntry]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            return entry
+        file_name = self.__entry_file__(key)
+        try:
+            with open(file_name, 'r') as entry_file:
+                data = json.load(entry_file)
+            entry = MappingEntry(key, data['nodes'], data['edges'], data['reduced'],
+                                 [tuple(pair) for pair in data['mapping']])
+            # mark the file as recently used for the eviction
+            os.utime(file_name)
+        except (OSError, KeyError, ValueError):
+            return None
+        self.__remember__(entry)
+        return entry
+
+    def get(self, key: str, graph: nx.Graph) -> Optional[Tuple[List[Tuple], List[Tuple]]]:
+        """
+        Returns the cached mapping of a Circuit Interaction Graph.
+
+        Parameters:
+        key (str): Key of the mapping problem (see mapping_key).
+        graph (NetworkX graph): The (not reduced) Circuit Interaction Graph.
+
+        Returns:
+        (List[(str, int)], List[(str, str, int)]): The mapping and the edges of the reduced graph with the node
+        names of the graph, None on a miss.
+        """
+        entry = self.__load__(key)
+        correspondence = None if entry is None else entry.correspondence(graph)
+        if correspondence is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # cached node names to the names of the graph
+        names = {cached: node for node, cached in correspondence.items()}
+        mapping = [(names[node], physical) for node, physical in entry.mapping]
+        reduced = [(names[entry.nodes[i]], names[entry.nodes[j]], weight) for i, j, weight in entry.reduced]
+        return mapping, reduced
+
+    def put(self, key: str, graph: nx.Graph, reduced_graph: nx.Graph, mapping: List[Tuple]):
+        """
+        Stores a mapping.
+
+        Parameters:
+        key (str): Key of the mapping problem (see mapping_key).
+        graph (NetworkX graph): The (not reduced) Circuit Interaction Graph.
+        reduced_graph (NetworkX graph): The reduced Circuit Interaction Graph.
+        mapping (List[(str, int)]): Logical node and its physical node.
+
+        Returns:
+        None
+        """
+        nodes = list(graph.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        entry = MappingEntry(key, nodes,
+                             [[index[u], index[v], int(wt)] for u, v, wt in graph.edges(data='weight')],
+                             [[index[u], index[v], int(wt)] for u, v, wt in reduced_graph.edges(data='weight')],
+                             [(node, int(physical)) for node, physical in mapping])
+        self.__remember__(entry)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            file_name = self.__entry_file__(key)
+            # write to a temporary file first, so a concurrent reader never sees a partial entry
+            temp_name = '{}.{}.tmp'.format(file_name, os.getpid())
+            with open(temp_name, 'w') as entry_file:
+                json.dump({'nodes': entry.nodes, 'edges': entry.edges, 'reduced': entry.reduced,
+                           'mapping': entry.mapping}, entry_file)
+            os.replace(temp_name, file_name)
+            self.evict()
+        except OSError:
+            # the cache is an optimization, a read-only disk must not break the tool
+            pass
+
+    def evict(self):
+        """
+        Removes the least recently used .json files above max_disk_entries.
+        """
+        try:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.json')]
+        except OSError:
+            return
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=architecture_cache.modification_time)
+        for file_name in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(file_name)
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Removes everything from the cache.
+        """
+        self.memory.clear()
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            return
+        for f in files:
+            if f.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except FileNotFoundError:
+                    # removed by another process in the meantime
+                    pass
+
+
+_default_cache = None
+
+
+def default_cache() -> MappingCache:
+    """
+    Returns the cache shared by all mappings of the process.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MappingCache()
+    return _default_cache
@@ -0,0 +1,77 @@
+"""mapping_cost.py: Implements vectorized swap cost evaluation of logical to physical qubit mappings"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Number of mappings evaluated at once by batch_cost, bounds the size of the temporary arrays
+BATCH_SIZE = 1024
+
+
+def mapping_array(mapping: Dict[str, int], nodes: List[str]) -> np.ndarray:
+    """
+    Returns the physical node of every logical node in the node order.
+
+    Parameters:
+    mapping (Dict[str, int]): Mapping from logical to physical nodes.
+    nodes (List[str]): Logical nodes, the index in the list is the index in the weight matrix.
+
+    Returns:
+    np.ndarray: Physical node of every logical node.
+    """
+    return np.fromiter((mapping[node] for node in nodes), dtype=np.int64, count=len(nodes))
+
+
+def edge_matrix(edges, index: Dict[str, int], size: int) -> np.ndarray:
+    """
+    Returns the symmetric matrix of unweighted edges, an edge listed twice is counted twice.
+    """
+    matrix = np.zeros((size, size), dtype=np.int64)
+    if len(edges) > 0:
+        rows = np.fromiter((index[edge[0]] for edge in edges), dtype=np.int64, count=len(edges))
+        columns = np.fromiter((index[edge[1]] for edge in edges), dtype=np.int64, count=len(edges))
+        np.add.at(matrix, (rows, columns), 1)
+        np.add.at(matrix, (columns, rows), 1)
+    return matrix
+
+
+def cost(permutation: np.ndarray, weights: np.ndarray, swaps: np.ndarray) -> int:
+    """
+    Computes the swap cost of one mapping, sum(W * S[perm][:, perm]).
+    The matrices are symmetric, so every edge is counted twice: once per direction of the swap chain, the same as
+    count_swap.
+
+    Parameters:
+    permutation (np.ndarray): Physical node of every logical node.
+    weights (np.ndarray): Weight matrix of the logical graph (0/1 for the unweighted swap count).
+    swaps (np.ndarray): Swaps between all pairs of physical nodes (ShortestPaths.swaps_matrix).
+
+    Returns:
+    int: The cost.
+    """
+    return int((weights * swaps[np.ix_(permutation, permutation)]).sum())
+
+
+def batch_cost(permutations: np.ndarray, weights: np.ndarray, swaps: np.ndarray,
+               batch_size: Optional[int] = BATCH_SIZE) -> np.ndarray:
+    """
+    Computes the swap cost of many mappings at once.
+
+    Parameters:
+    permutations (np.ndarray): One mapping per row, the physical node of every logical node.
+    weights (np.ndarray): Weight matrix of the logical graph.
+    swaps (np.ndarray): Swaps between all pairs of physical nodes.
+    batch_size (int): Mappings evaluated at once, None for all of them.
+
+    Returns:
+    np.ndarray: The cost of every mapping.
+    """
+    permutations = np.asarray(permutations, dtype=np.int64)
+    costs = np.empty(len(permutations), dtype=np.int64)
+    step = batch_size or max(len(permutations), 1)
+    for start in range(0, len(permutations), step):
+        chunk = permutations[start:start + step]
+        # swaps of every logical pair in every mapping, shape (mappings, nodes, nodes)
+        pair_swaps = swaps[chunk[:, :, None], chunk[:, None, :]]
+        costs[start:start + step] = np.einsum('ij,bij->b', weights, pair_swaps)
+    return costs
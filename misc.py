@@ -3,16 +3,157 @@
 __author__ = "Saadat Nursultan"
 __email__ = "saadat.nursultan@nu.edu.kz"
 
-import datetime
-import matplotlib.pyplot as plt
+import heapq
+import time
 import networkx as nx
 import numpy as np
 import os
 import random
 import sys
 from typing import List, Dict
-from networkx.algorithms import isomorphism
-import itertools
+import artifacts
+import mapping_cache
+import mapping_cost
+import monomorphism
+import multistart
+import refinement
+import shortest_paths
+import tracer
+
+def toffoli_template(arity: int):
+    """
+    Returns the CNOT-equivalents of a Toffoli gate with arity - 1 controls, decomposed as SimpleCTG.n_ccnot does it:
+    a chain of ccnots through arity - 3 ancillas, the ccnot on the target, then the chain in reverse order, which
+    uncomputes the ancillas. A ccnot on a b c is the CNOT-equivalents (b, c), (a, c), (b, c).
+
+    Parameters:
+    arity (int): Number of operands of the gate, at least 3.
+
+    Returns:
+    (List[(int, int)], int): Pairs of operand slots (slots after the operands are ancillas) and the number of ancillas.
+
+    Example:
+    toffoli_template(4) = ([(1, 4), (0, 4), (1, 4), (2, 3), (4, 3), (2, 3), (1, 4), (0, 4), (1, 4)], 1)
+    """
+    chain = []
+    first, second = 0, 1
+    for ancilla in range(arity, 2 * arity - 3):
+        chain.append((first, second, ancilla))
+        first, second = ancilla, second + 1
+    ccnots = chain + [(first, second, arity - 1)] + chain[::-1]
+    return [pair for a, b, c in ccnots for pair in ((b, c), (a, c), (b, c))], arity - 3
+
+
+def cig_template(name: str, arity: int):
+    """
+    Returns the CNOT-equivalents a gate adds to the Circuit Interaction Graph.
+
+    Parameters:
+    name (str): Name of the gate.
+    arity (int): Number of operands of the gate.
+
+    Returns:
+    (List[(int, int)], int): Pairs of operand slots and the number of ancillas the gate needs,
+    or None if the gate is unknown.
+    """
+    if name == 'h' or name == 'H' or name == 'T' or name == 'T+' or name == 'T*':
+        return [], 0
+    elif name == 'x' or name == 't1':
+        return [], 0
+    elif name.startswith('t') and arity >= 3:
+        return toffoli_template(arity)
+    elif name == 'v':
+        return [(0, 1), (0, 1)], 0
+    elif name == 'v+':
+        return [(1, 0), (1, 0)], 0
+    elif name == 'cx' or name == 't2' or name == 'sw':
+        return [(0, 1)], 0
+    return None
+
+
+class MappingNotFound(RuntimeError):
+    """
+    Raised when the placement search finds no mapping of the logical graph onto the physical one.
+    """
+
+
+class PlacementState:
+    """
+    State of the placement search of Mapping.isomorph.
+
+    Every change goes through the methods of the state (and through the logical graph methods of Mapping), which
+    record how to undo it on the trail. Backtracking undoes the changes since a mark in O(changes) instead of
+    restoring copies of all lists.
+
+    Attributes:
+    logical_degree_list (List[(str, int)]): Logical nodes sorted by degrees, taken nodes are marked in taken_logical.
+    physical_degree_list (List[(int, int)]): Physical nodes sorted by degrees, taken nodes are marked in taken_physical.
+    queue (List[(str, int)]): Queue of logical nodes, the head is at queue_head.
+    mapping (List[(str, int)]): Resulting mapping from logical circuit to physical architecture.
+    trail (List[(function, args...)]): Undo log.
+    """
+
+    def __init__(self, logical_degree_list, physical_degree_list):
+        self.logical_degree_list = logical_degree_list
+        self.physical_degree_list = physical_degree_list
+        self.taken_logical = set()
+        self.taken_physical = set()
+        self.queue = []
+        self.queue_head = 0
+        self.mapping = []
+        self.trail = []
+
+    def mark(self) -> int:
+        """
+        Returns the current position of the trail.
+        """
+        return len(self.trail)
+
+    def undo(self, mark: int):
+        """
+        Undoes all changes recorded after the mark, the latest first.
+        """
+        trail = self.trail
+        while len(trail) > mark:
+            entry = trail.pop()
+            entry[0](*entry[1:])
+
+    def queue_empty(self) -> bool:
+        return self.queue_head == len(self.queue)
+
+    def pop_queue(self):
+        node = self.queue[self.queue_head]
+        self.queue_head += 1
+        self.trail.append((self.__unpop_queue,))
+        return node
+
+    def __unpop_queue(self):
+        self.queue_head -= 1
+
+    def push_queue(self, node):
+        self.queue.append(node)
+        self.trail.append((self.queue.pop,))
+
+    def is_taken(self, logical_node: str) -> bool:
+        return logical_node in self.taken_logical
+
+    def take_logical(self, logical_node: str):
+        self.taken_logical.add(logical_node)
+        self.trail.append((self.taken_logical.discard, logical_node))
+
+    def take_physical(self, physical_node):
+        self.taken_physical.add(physical_node[0])
+        self.trail.append((self.taken_physical.discard, physical_node[0]))
+
+    def free_physical_nodes(self):
+        """
+        Returns the physical nodes that are not taken, sorted by degrees.
+        """
+        return [pair for pair in self.physical_degree_list if pair[0] not in self.taken_physical]
+
+    def place(self, logical_node: str, physical_node: int):
+        self.mapping.append((logical_node, physical_node))
+        self.trail.append((self.mapping.pop,))
 
 
 class Mapping:
@@ -22,22 +163,84 @@ class Mapping:
     Attributes: 
     map (List[("logical_node_string", physical_node_int)]): Mapping of logical circuit to a physcial architecture.
     physical graph (NetworkX Graph): Physical circuit configuration.
-    logical graph (NetworkX Graph): Circuit Interaction Graph (refer to the paper).
+    logical graph (NetworkX Graph): Circuit Interaction Graph (refer to the paper), a view of the weight matrix.
+    logical_nodes (List[str]): Nodes of the Circuit Interaction Graph, the index is the row of the weight matrix.
+    weights (np.ndarray): Symmetric weight matrix of the Circuit Interaction Graph, 0 means no edge.
     """
 
     def __init__(self):
-        self.logical_graph = nx.Graph()
+        # Circuit Interaction Graph as a dense weight matrix over interned node indices,
+        # the networkx view (logical_graph) is built from it only when it is needed
+        self.logical_nodes: List[str] = []
+        self.logical_index: Dict[str, int] = {}
+        self.weights = np.zeros((0, 0), dtype=np.int64)
+        self.__edge_order = np.zeros((0, 2), dtype=np.int64)
+        self.__logical_graph = None
+        # undo log of the placement search, changes of the logical graph are recorded on it when it is set
+        self.trail = None
         self.ancilla_num = 0
         self.physical_graph = nx.Graph()
         self.map = []
 
+        # budget of a single placement search, the check counts as failed when it runs out
+        self.matcher_max_nodes = 200000
+        self.matcher_time_limit = 2.0
+        self.__matcher = None
+        self.__matcher_target = None
+        # budgets of the anytime placement search in seconds and in placements, None for no limit
+        # when a budget is set, isomorph always returns the best mapping found, completed greedily
+        self.time_budget = None
+        self.node_budget = None
+        self.budget_exhausted = False
+        self.__deadline = None
+        self.__expansions = 0
+        self.__physical_paths = None
+        # starting point of the placement search: the logical root, the physical node it goes on and the seed which
+        # shuffles the nodes of the same degree, None for the default (the biggest degrees, no shuffling)
+        self.root = None
+        self.physical_root = None
+        self.seed = None
+        self.__random = None
+        # with more than one start, searches from different starting points run over a process pool
+        # (see multistart.py), the one with the least swaps (or the first feasible one) is taken
+        self.starts = 1
+        self.workers = None
+        self.first_feasible = False
+        # event which stops the placement search from another process (see multistart.py), None if nothing stops it
+        self.stop = None
+        # cache of mappings found before (MappingCache), None to always search
+        self.cache = None
+        # images of the logical and the reduced graph are drawn by isomorph only when asked for (e.g. by the GUI)
+        self.draw_graphs = False
+
+        # print the progress of the search, the counters (tracer) are kept either way
+        self.debugging = False
+
         self.animCount = 0
+        # counters of the search (e.g. backtracks, GraphMatcher calls)
+        self.tracer = tracer.Tracer()
 
     def __repr__(self):
         # list(self.logical_graph.nodes(data=True)
         return "Logical mapping:\n {} \nPhysical mapping:\n {} \nLogical to physical mapping:\n {} \n".format(
             list(self.logical_graph.edges(data=True)), list(self.physical_graph.edges()), list(self.map))
 
+    @property
+    def logical_graph(self) -> nx.Graph:
+        """
+        The networkx view of the Circuit Interaction Graph, built on the first access and kept in sync afterwards.
+        Edges are added in the order they appeared in the circuit, so the view is the same as if it was built
+        edge by edge.
+        """
+        if self.__logical_graph is None:
+            graph = nx.Graph()
+            graph.add_nodes_from(self.logical_nodes)
+            for i, j in self.__edge_order:
+                if self.weights[i, j] != 0:
+                    graph.add_edge(self.logical_nodes[i], self.logical_nodes[j], weight=int(self.weights[i, j]))
+            self.__logical_graph = graph
+        return self.__logical_graph
+
     def set_nodes_physical(self, coupling_list: List[List[int]]):
         """
         Adds nodes to the physical graph.
@@ -53,6 +256,7 @@ class Mapping:
         """
         flat_list = [item for sublist in coupling_list for item in sublist]
         self.physical_graph.add_nodes_from(list(dict.fromkeys(flat_list)))
+        self.__physical_paths = None
 
     def set_nodes_logical(self, variables: List[str]):
         """
@@ -67,7 +271,18 @@ class Mapping:
         Example:
         set_nodes_logical([1, 2, 3])
         """
-        self.logical_graph.add_nodes_from(variables)
+        new_nodes = [v for v in dict.fromkeys(variables) if v not in self.logical_index]
+        if len(new_nodes) == 0:
+            return
+        for node in new_nodes:
+            self.logical_index[node] = len(self.logical_nodes)
+            self.logical_nodes.append(node)
+        # grow the weight matrix once for all new nodes
+        weights = np.zeros((len(self.logical_nodes), len(self.logical_nodes)), dtype=np.int64)
+        weights[:self.weights.shape[0], :self.weights.shape[1]] = self.weights
+        self.weights = weights
+        if self.__logical_graph is not None:
+            self.__logical_graph.add_nodes_from(new_nodes)
 
     def physical_add_edges(self, coupling_list: List[List[int]]):
         """
@@ -84,6 +299,17 @@ class Mapping:
                 self.physical_graph.add_edge(item[0], item[1])
             else:
                 continue
+        self.__physical_paths = None
+
+    def physical_paths(self) -> shortest_paths.ShortestPaths:
+        """
+        Returns the shortest paths of the physical graph, computed on the first call.
+        """
+        if self.__physical_paths is None:
+            couples = [[u, v] for u, v in self.physical_graph.edges()] + [[v, u] for u, v in self.physical_graph.edges()]
+            self.__physical_paths = shortest_paths.ShortestPaths.from_couples(
+                couples, max(self.physical_graph.nodes()) + 1)
+        return self.__physical_paths
 
     def logical_add_weight(self, node1: str, node2: str, weight=1):
         """
@@ -97,14 +323,146 @@ class Mapping:
         Returns:
         None
         """
-        # create edge notaion
-        e = (node1, node2, weight)
-        if self.logical_graph.has_edge(*e[:2]):
+        index = self.logical_index
+        if node1 not in index or node2 not in index:
+            self.set_nodes_logical([node1, node2])
+        i = index[node1]
+        j = index[node2]
+        weights = self.weights
+        weights[i, j] += weight
+        if i != j:
+            weights[j, i] += weight
+        graph = self.logical_graph
+        if graph.has_edge(node1, node2):
             # add weight value to the weight
-            self.logical_graph[node1][node2]['weight'] += weight
+            graph[node1][node2]['weight'] += weight
+            if self.trail is not None:
+                self.trail.append((self.__undo_weight, node1, node2, weight))
         else:
             # create a new edge
-            self.logical_graph.add_weighted_edges_from([e])
+            graph.add_edge(node1, node2, weight=weight)
+            if self.trail is not None:
+                self.trail.append((self.__undo_new_edge, node1, node2))
+
+    def __undo_weight(self, node1: str, node2: str, weight):
+        i = self.logical_index[node1]
+        j = self.logical_index[node2]
+        self.weights[i, j] -= weight
+        if i != j:
+            self.weights[j, i] -= weight
+        self.logical_graph[node1][node2]['weight'] -= weight
+
+    def __undo_new_edge(self, node1: str, node2: str):
+        i = self.logical_index[node1]
+        j = self.logical_index[node2]
+        self.weights[i, j] = 0
+        self.weights[j, i] = 0
+        self.logical_graph.remove_edge(node1, node2)
+
+    def __undo_remove_edge(self, node1: str, node2: str, weight):
+        i = self.logical_index[node1]
+        j = self.logical_index[node2]
+        self.weights[i, j] = weight
+        self.weights[j, i] = weight
+        self.logical_graph.add_edge(node1, node2, weight=weight)
+
+    def __setWeights(self, weights):
+        # replaces the weights by the ones of a reduced graph, its edges are a subset of the original ones
+        self.weights = weights
+        self.__logical_graph = None
+
+    def logical_remove_edge(self, node1: str, node2: str):
+        """
+        Removes an edge from the logical graph.
+
+        Parameters:
+        node1 (str): Name of first node.
+        node2 (str): Name of second node.
+
+        Returns:
+        None
+        """
+        if self.trail is not None:
+            self.trail.append((self.__undo_remove_edge, node1, node2, self.logical_graph[node1][node2]['weight']))
+        self.logical_graph.remove_edge(node1, node2)
+        i = self.logical_index[node1]
+        j = self.logical_index[node2]
+        self.weights[i, j] = 0
+        self.weights[j, i] = 0
+
+    def logical_reduce_edge(self, node1: str, node2: str):
+        """
+        Removes an edge from the logical graph and adds 2 * (its weight) to every edge of the lightest alternative
+        path between its nodes. The graph stays connected exactly when such a path exists, so the search for it is
+        also the bridge check: a bridge is put back and the graph is left as it was. Only the neighbourhood of the
+        edge is searched, not the whole graph.
+
+        Parameters:
+        node1 (str): Name of first node.
+        node2 (str): Name of second node.
+
+        Returns:
+        List[str]: The alternative path, or None if the edge is a bridge and was kept.
+        """
+        weight = self.logical_graph[node1][node2]['weight']
+        self.logical_remove_edge(node1, node2)
+        try:
+            alternative_path = nx.bidirectional_dijkstra(self.logical_graph, node1, node2, weight='weight')[1]
+        except nx.NetworkXNoPath:
+            # the edge is a bridge, return it back
+            self.logical_add_weight(node1, node2, weight)
+            self.tracer.count('bridges_kept')
+            return None
+        self.tracer.count('edges_reduced')
+        for i in range(len(alternative_path) - 1):
+            self.logical_add_weight(alternative_path[i], alternative_path[i + 1], weight * 2)
+        return alternative_path
+
+    def logical_has_edge(self, node1: str, node2: str) -> bool:
+        """
+        Checks whether there is an edge between two nodes of the logical graph, reads the weight matrix.
+        """
+        index = self.logical_index
+        return self.weights[index[node1], index[node2]] != 0
+
+    def logical_degree(self, node: str, weighted=False) -> int:
+        """
+        Returns the degree of a node of the logical graph, read from the weight matrix.
+
+        Parameters:
+        node (str): Name of the node.
+        weighted (bool): Sum of the weights instead of the number of edges.
+
+        Returns:
+        int: The degree.
+        """
+        row = self.weights[self.logical_index[node]]
+        if weighted:
+            return int(row.sum())
+        return int(np.count_nonzero(row))
+
+    def logical_degrees(self, weighted=False):
+        """
+        Returns the degrees of all nodes of the logical graph in the node order, read from the weight matrix.
+
+        Returns:
+        List[(str, int)]: Node and its degree.
+        """
+        if weighted:
+            degrees = self.weights.sum(axis=1)
+        else:
+            degrees = np.count_nonzero(self.weights, axis=1)
+        return list(zip(self.logical_nodes, degrees.tolist()))
+
+    def logical_edges(self):
+        """
+        Returns the edges of the logical graph, read from the weight matrix.
+
+        Returns:
+        List[(str, str)]: Edges of the logical graph.
+        """
+        rows, columns = np.nonzero(np.triu(self.weights))
+        return [(self.logical_nodes[i], self.logical_nodes[j]) for i, j in zip(rows.tolist(), columns.tolist())]
 
     def physical_degree_is_less(self):
         """
@@ -116,9 +474,7 @@ class Mapping:
         Returns:
         bool: Is degree of physical architecture less than one of logical graph.
         """
-        degree_sequence = sorted(
-            [d for n, d in self.logical_graph.degree(weight="weight")], reverse=True)
-        max_logical_degree = max(degree_sequence)
+        max_logical_degree = max(d for n, d in self.logical_degrees(weighted=True))
         degree_sequence = sorted(
             [d for n, d in self.physical_graph.degree()], reverse=True)
         max_physical_degree = max(degree_sequence)
@@ -161,46 +517,10 @@ class Mapping:
         physical_qubits = [pair[1] for pair in self.map]
         return physical_qubits
 
-    def line_graph_remapping(self, line_graph_mapping):
-        """
-        Takes an edge-to-edge mapping 
-        (e.g. found by using graph matcher on the line graph representations of two graphs) 
-        and converts it into node-to-node mapping.
-
-        Parameters: 
-        lineGraphMapping (List[(logical edge, physical edge)]): Edge-to-edge mapping.
-
-        Returns:
-        mapping (List[(logical edge, physical edge)]): Node-to-node mapping.
-        """
-        mappingFound = set()
-        mappingTaken = set()
-        mapping = list()
-        potentialyFound = set()
-
-        for edgeMapping in line_graph_mapping:
-            edgeG1, edgeG2 = edgeMapping
-            for nodeG1 in edgeG1:
-                if nodeG1 not in mappingFound:
-                    for nodeG2 in edgeG2:
-                        if (nodeG1, nodeG2) not in potentialyFound:
-                            potentialyFound.add((nodeG1, nodeG2))
-                        else:
-                            mappingFound.add(nodeG1)
-                            mappingTaken.add(nodeG2)
-                            mapping.append((nodeG1, nodeG2))
-                            break
-        for remaning in potentialyFound:
-            nodeG1, nodeG2 = remaning
-            if (nodeG1 not in mappingFound) and (nodeG2 not in mappingTaken):
-                mappingTaken.add(nodeG2)
-                mapping.append(remaning)
-
-        return mapping
-
     def subgraphIsomorphismCheck(self, G1, G2):
         """
-        Checks whether G1 contains a subgraph isomorphic to G2 by using Whitney isomorphism theorem.
+        Checks whether G1 contains a (non-induced) subgraph isomorphic to G2 by a subgraph monomorphism search
+        on the graphs themselves, G1 edges that are not used by G2 are allowed.
 
         Parameters:
         G1 (NetworkX graph): The bigger graph.
@@ -208,140 +528,28 @@ class Mapping:
 
         Returns:
         bool: Is graph G2 isomorphic to a subgraph in G1.
-        isomorphism.GraphMatcher: Graph matcher object with parameters.
-        """
-        # transform graphs into line graphs and check for subgraph isomorphism
-        # isomorphism.GraphMatcher tries to find an induced subgraph of G1, such that it is isomorphic to G2.
-        # Consequently, if G2 is non-induced subgraph of G1, the algorithm will return False
-        GM = isomorphism.GraphMatcher(nx.line_graph(G1), nx.line_graph(G2))
-        subgraph_is_iso = GM.subgraph_is_isomorphic()
-
-        # check for exceptions
-        # e.g. line graphs of K_3 triangle graph and K_1,3 claw graph are isomorphic, but the original graphs are not
-        if subgraph_is_iso:
-            edgeListG1 = []
-            edgeListG2 = []
-
-            for edgeMaping in GM.mapping.items():
-                edgeListG1.append(edgeMaping[0])
-                edgeListG2.append(edgeMaping[1])
-
-            # let's construct the graphs the algorithm thinks are isomorphic and check them for a quick isomorphism.is_isomorphic
-            testG1 = nx.Graph(edgeListG1)
-            testG2 = nx.Graph(edgeListG2)
-            subgraph_is_iso = isomorphism.is_isomorphic(testG1, testG2)
-
-        return subgraph_is_iso, GM
-
-    def isomorphOptimistic(self):
+        mapping (List[(G2 node, G1 node)]): Node-to-node mapping, empty if none was found.
         """
-        Checks whether the logical graph and physical graphs are isomorphic and creates a mapping.
-
-        Parameters:
-        None
-
-        Returns:
-        None
-        """
-        elarge = [(u, v) for (u, v, d) in self.logical_graph.edges(
-            data=True) if d["weight"] > 5]
-        esmall = [(u, v) for (u, v, d) in self.logical_graph.edges(
-            data=True) if d["weight"] <= 5]
-
-        pos = nx.spring_layout(self.logical_graph)  # positions for all nodes
-
-        # nodes
-        nx.draw_networkx_nodes(self.logical_graph, pos, node_size=700)
-
-        # edges
-        nx.draw_networkx_edges(self.logical_graph, pos,
-                               edgelist=elarge, width=6)
-        nx.draw_networkx_edges(
-            self.logical_graph, pos, edgelist=esmall, width=6, alpha=0.5, edge_color="b", style="dashed"
-        )
-
-        # labels
-        nx.draw_networkx_labels(self.logical_graph, pos,
-                                font_size=20, font_family="sans-serif")
-
-        plt.axis("off")
-        plt.show()
-
-        # check if already ismorphic
-        subgraph_is_iso, GM = self.subgraphIsomorphismCheck(
-            self.physical_graph, self.logical_graph)
-
-        if subgraph_is_iso:
-            # generate isomorphic mapping
-            happy = [(j, i) for i, j in GM.mapping.items()]
-            happy = self.line_graph_remapping(happy)
-        else:
-            # list of disconnecting edges
-            disconnecting_edges = []
-
-            # reduce ctg until the mapping is found
-            while not subgraph_is_iso:
-                # sort edges in non-increasing order (queue)
-                edges_list = sorted(self.logical_graph.edges.data(
-                    'weight'), key=lambda node_node_weight: node_node_weight[2])
-
-                # remove disconnecting edges
-                for e in disconnecting_edges:
-                    edges_list.remove(e)
-
-                # look if there other edges with the same weight
-                weights_list = [(u, v, wt) for (u, v, wt)
-                                in edges_list if wt == edges_list[0][2]]
-
-                if len(weights_list) > 1:
-                    # select the edge wich will reduce the overall graph degree
-                    to_be_popped_edge = weights_list.pop(0)
-                    maximal_degree = max(self.logical_graph.degree(
-                        to_be_popped_edge[0], weight='weight'), self.logical_graph.degree(to_be_popped_edge[1], weight='weight'))
-                    for e in weights_list:
-                        curr_deg = max(self.logical_graph.degree(
-                            e[0], weight='weight'), self.logical_graph.degree(e[1], weight='weight'))
-                        if curr_deg > maximal_degree:
-                            maximal_degree = curr_deg
-                            to_be_popped_edge = e
-
-                    edge_weight = to_be_popped_edge
-
-                else:
-                    # take the edge with the least weight
-                    edge_weight = edges_list.pop(0)
-
-                # remove the edge with the least weight
-                self.logical_graph.remove_edge(edge_weight[0], edge_weight[1])
-
-                # if the graph is disconnected, return the edge back
-                if not nx.is_connected(self.logical_graph):
-                    self.logical_add_weight(
-                        edge_weight[0], edge_weight[1], edge_weight[2])
-                    disconnecting_edges.append(edge_weight)
-                # else adjust weights on the alternative path
-                else:
-                    alternative_path = nx.shortest_path(
-                        self.logical_graph, source=edge_weight[0], target=edge_weight[1], weight='weight')
-                    # add 2 * (weight of removed edge) to every edge on the alternative path
-                    for i in range(len(alternative_path) - 1):
-                        self.logical_add_weight(
-                            alternative_path[i], alternative_path[i+1], edge_weight[2] * 2)
-
-                # check for isomorphism
-                subgraph_is_iso, GM = self.subgraphIsomorphismCheck(
-                    self.physical_graph, self.logical_graph)
-
-            happy = [(j, i) for i, j in GM.mapping.items()]
-            happy = self.line_graph_remapping(happy)
-
-        happy = sorted(happy, key=lambda el: el[0])
-        # print("Happy mapping: ", happy)
-        self.map = happy
+        self.tracer.count('monomorphism_calls')
+        # the physical graph is preprocessed once
+        if self.__matcher is None or self.__matcher_target is not G1:
+            self.__matcher = monomorphism.MonomorphismMatcher(G1)
+            self.__matcher_target = G1
+        matcher = self.__matcher
+        matcher.max_nodes = self.matcher_max_nodes
+        matcher.time_limit = self.matcher_time_limit
+        placement = matcher.find(G2)
+        self.tracer.count('monomorphism_expansions', matcher.expansions)
+
+        if placement is None:
+            return False, []
+        return True, list(placement.items())
 
     def drawGraph(self, file_name, is_logical=True):
         """
         Visualizes the graph representation.
+        The image is drawn on a background thread (see artifacts.py), the file is complete after
+        artifacts.default_renderer().wait().
 
         Parameters:
         file_name (str): The name of the file where the circuit is stored.
@@ -350,124 +558,107 @@ class Mapping:
         Returns:
         graph_image (str): The name of the file, where the image is stored.
         """
-        plt.figure(figsize=(6, 4))
-        elarge = [(u, v) for (u, v, d) in self.logical_graph.edges(
-            data=True) if d["weight"] > 5]
-        esmall = [(u, v) for (u, v, d) in self.logical_graph.edges(
-            data=True) if d["weight"] <= 5]
-        # positions for all nodes
-        pos = nx.spring_layout(self.logical_graph)
-        # nodes
-        nx.draw_networkx_nodes(self.logical_graph, pos, node_size=700)
-        # edges
-        nx.draw_networkx_edges(self.logical_graph, pos,
-                               edgelist=elarge, width=6)
-        nx.draw_networkx_edges(
-            self.logical_graph, pos, edgelist=esmall, width=6, alpha=0.5, edge_color="b", style="dashed"
-        )
-        # labels
-        nx.draw_networkx_labels(self.logical_graph, pos,
-                                font_size=20, font_family="sans-serif")
-        plt.axis("off")
-        # retrieve date
-        today = datetime.datetime.today()
-        # make outputs/ directory
-        os.makedirs('./outputs/', exist_ok=True)
-        if (is_logical):
-            os.makedirs('./outputs/input/', exist_ok=True)
-            # create file name
-            graph_image = './outputs/input/{}_{}.jpeg'.format(
-                file_name, today.strftime("%Y%m%d%H%M%S"))
-        else:
-            os.makedirs('./outputs/reduced/', exist_ok=True)
-            # create file name
-            graph_image = './outputs/reduced/{}_{}.jpeg'.format(
-                file_name, today.strftime("%Y%m%d%H%M%S"))
-
-        # save graph
-        plt.savefig(graph_image)
-        if (is_logical):
-            plt.clf()
+        graph_image = artifacts.graph_image_name(file_name, is_logical)
+        artifacts.default_renderer().submit_graph(self.logical_graph, graph_image)
         # return the name
         return graph_image
 
-    def figureOutWrongEdge(self, logical_node, permutation_list, physical_node_list, mapping, removed_edges):
+    def figureOutWrongEdge(self, logical_node, state):
         """
-        Recursively tries to remove edges such that one, or more potential physical placements appeares.
+        Tries to remove edges between the logical node and its placed neighbours such that one, or more potential
+        physical placements appeares.
+
+        A free physical node can host the logical node once the edges to the placed neighbours it is not next to are
+        removed, so every free physical node gives one candidate set of edges. The distinct sets are tried from the
+        smallest (then the lightest) one, until a set can be removed without disconnecting the graph. The number of
+        sets is bounded by the number of physical nodes, instead of the permutations of the edges.
+        The removed edges are recorded on the trail of the state.
 
         Parameters:
         logical_node (tuple(str, int)): The logical node from the node queue.
-        permutation_list (List[n-tuple((node1, node2, weight))]): order of edges to be removed
-        physical_node_list (List[(int, int)]): Physical degrees by degrees.
-        mapping (List[(str, int)]): Resulting mapping from logical circuit to physical architecture.
-        removed_edges (List[[(node1, node2, weight), List[int]]]): Record of removed edges for a potential rollback.
+        state (PlacementState): Current placement.
 
         Returns:
         a list of physical nodes or an empty list if none were found.
         """
-        try:
-            # prepare list
-            potential_physical_nodes = []
-
-            # run the while loop until there are any potential placement, or we pop from an empty list
-            while len(potential_physical_nodes) == 0:
+        placed = dict(state.mapping)
+        # edges to the already placed nodes
+        edges = [(u, v, wt) for (u, v, wt) in self.logical_graph.edges(logical_node[0], data='weight') if v in placed]
+
+        # the edges every free physical node requires to be removed, each set only once
+        removal_sets = {}
+        for node, degree in state.free_physical_nodes():
+            removal = frozenset(i for i, (u, v, wt) in enumerate(edges)
+                                if not self.physical_graph.has_edge(placed[v], node))
+            if len(removal) > 0 and removal not in removal_sets:
+                removal_sets[removal] = (len(removal), sum(edges[i][2] for i in removal))
+
+        # the edges with the least weight are removed first, the order is the same for every set
+        order = sorted(range(len(edges)), key=lambda i: edges[i][2])
+        # edges which are bridges before any removal, they stay bridges while edges are removed
+        bridges = set()
+        for removal in sorted(removal_sets, key=lambda removal: removal_sets[removal]):
+            if not bridges.isdisjoint(removal):
+                continue
+            if self.budgetExhausted():
+                break
+            self.__expansions += 1
+            self.tracer.count('edge_removal_sets')
+            mark = state.mark()
+            removed = True
+            first = True
+            for i in order:
+                if i not in removal:
+                    continue
+                # remove the edge, if it is a bridge, the set cannot be removed
+                if self.logical_reduce_edge(edges[i][0], edges[i][1]) is None:
+                    if first:
+                        bridges.add(i)
+                    removed = False
+                    break
+                first = False
 
-                # take the edge with the least weight
-                # if no more edges, then this will trigger the except
-                edge_weight = permutation_list.pop(0)
-
-                # the weight of the poped edge may have changed
-                real_weight = self.logical_graph[edge_weight[0]][edge_weight[1]]['weight']
-
-                # remove the edge with the least weight
-                self.logical_graph.remove_edge(edge_weight[0], edge_weight[1])
-
-                # if the graph is disconnected, return the edge back
-                if not nx.is_connected(self.logical_graph):
-                    self.logical_add_weight(
-                        edge_weight[0], edge_weight[1], real_weight)
-                # else adjust weights on the alternative path
-                else:
-                    alternative_path = nx.shortest_path(
-                        self.logical_graph, source=edge_weight[0], target=edge_weight[1], weight='weight')
-                    # add 2 * (weight of removed edge) to every edge on the alternative path
-                    for i in range(len(alternative_path) - 1):
-                        self.logical_add_weight(
-                            alternative_path[i], alternative_path[i+1], real_weight * 2)
-                    # record removed edges for a potential rollback
-                    removed_edges.append(
-                        [(edge_weight[0], edge_weight[1], real_weight), alternative_path])
-
-                    # recalculate the potential placements
-                    # prepare potential_physical_nodes for intersection operation
-                    potential_physical_nodes = physical_node_list.copy()
-                    parents = []
-                    # to what placed logical nodes the current node is connected?
-                    for lNode, pNode in mapping:
-                        if self.logical_graph.has_edge(logical_node[0], lNode):
-                            parents.append(pNode)
-                    # make potential physical node list according to the neiboring nodes to the just mapped physical node
-                    for parentNode in parents:
-                        potential = []
-                        for node, degree in physical_node_list:
-                            if self.physical_graph.has_edge(parentNode, node):
-                                potential.append((node, degree))
-                        potential_physical_nodes = sorted(list(set(potential_physical_nodes).intersection(
-                            potential)), key=lambda node_deg_pair: node_deg_pair[1])
-
-            return potential_physical_nodes
-        except IndexError:
+            if removed:
+                # recalculate the potential placements
+                potential_physical_nodes = self.potentialPlacements(logical_node, state)
+                if len(potential_physical_nodes) > 0:
+                    return potential_physical_nodes
             # return all removed edges
-            for edge_weight, alternative_path in removed_edges:
-                self.logical_add_weight(
-                    edge_weight[0], edge_weight[1], edge_weight[2])
-                # subtract 2 * (weight of removed edge) to every edge on the alternative path
-                for i in range(len(alternative_path) - 1):
-                    self.logical_add_weight(
-                        alternative_path[i], alternative_path[i+1], edge_weight[2] * (-2))
-            removed_edges.clear()
+            state.undo(mark)
+
+        return []
 
-            return []
+    def potentialPlacements(self, logical_node, state):
+        """
+        Finds free physical nodes next to the physical nodes of all placed logical neighbours.
+
+        Parameters:
+        logical_node (tuple(str, int)): The logical node to be placed.
+        state (PlacementState): Current placement.
+
+        Returns:
+        List[(int, int)]: Physical nodes with their degrees, sorted by degree.
+        """
+        # prepare potential_physical_nodes for intersection operation
+        potential_physical_nodes = state.free_physical_nodes()
+        parents = []
+        # to what placed logical nodes the current node is connected?
+        for lNode, pNode in state.mapping:
+            if self.logical_has_edge(logical_node[0], lNode):
+                parents.append(pNode)
+        # make potential physical node list according to the neiboring nodes to the just mapped physical node
+        for parentNode in parents:
+            potential = []
+            for node, degree in state.physical_degree_list:
+                if self.physical_graph.has_edge(parentNode, node):
+                    potential.append((node, degree))
+            potential_physical_nodes = sorted(list(set(potential_physical_nodes).intersection(
+                potential)), key=lambda node_deg_pair: node_deg_pair[1])
+        if self.__random is not None and len(parents) > 0:
+            # the candidates of the same degree in a random order
+            self.__random.shuffle(potential_physical_nodes)
+            potential_physical_nodes.sort(key=lambda node_deg_pair: node_deg_pair[1])
+        return potential_physical_nodes
 
     def anim(self):
         animation = "|/-\\"
@@ -479,442 +670,580 @@ class Mapping:
         else:
             self.animCount += 1
 
-    def placeNodeOnNode(self, node_queue, potential_physical_nodes, use_potential, figureOuted_before, logical_node_list, physical_node_list, mapping):
+    def placeNodeOnNode(self, state, potential_physical_nodes, use_potential, figureOuted_before):
         """
         BFS-like algorithm to find placement of logical nodes onto physical nodes.
-        For the first run, the node_queue should contain the root node (usually a node with biggest degree)
+        For the first run, the node queue of the state should contain the root node (usually a node with biggest degree)
+        Every change of the state and the logical graph is recorded on the trail of the state.
 
         Parameters:
-        node_queue (List[(node, degree)]): queue of logical graph nodes.
+        state (PlacementState): queue of logical graph nodes, logical and physical nodes sorted by degrees and the resulting mapping.
         potential_physical_nodes (List[int]): copy of the physical degree list as a list of potential physical node placements.
         use_potential (bool): whether the list of potential physical node placement should be used. False when the potential_physical_nodes is empty.
-        logical_node_list (List[(str, int)]): logical nodes sorted by degrees.
-        physical_node_list (List[(int, int)]): physical nodes sorted by degrees.
-        mapping (List[(str, int)]): resulting mapping from logical circuit to physical architecture.
+        figureOuted_before (bool): whether figureOutWrongEdge was already used for this node.
 
         Returns:
-        bool: can the logical circuit be mapped to the physical architecture.
-
-        Raises:
-        IndexError
+        bool: was the node placed.
+        bool: can the logical circuit be mapped to the physical architecture (all nodes are placed).
+        List[(int, int)]: the remaining potential physical nodes.
+        bool: was figureOutWrongEdge used.
         """
 
+        self.tracer.count('placements')
+        self.__expansions += 1
         # if node_queue is empty, then we are done
-        if len(node_queue) == 0:
-            # return True
-            return (True, True)
+        if state.queue_empty():
+            return (True, True, [], False)
         # get the logical node
-        logical_node = node_queue.pop(0)
+        logical_node = state.pop_queue()
 
         if not use_potential:
 
             # if mapping is empty, then algorithm only just started
-            if len(mapping) == 0:
-                potential_physical_nodes = physical_node_list.copy()
+            if len(state.mapping) == 0:
+                potential_physical_nodes = state.free_physical_nodes()
+                if self.physical_root is not None:
+                    # the last candidate is tried first
+                    potential_physical_nodes.sort(key=lambda node_deg_pair: node_deg_pair[0] == self.physical_root)
             # else find intersection of all neighboring nodes of already placed logical parents
             else:
-                # prepare potential_physical_nodes for intersection operation
-                potential_physical_nodes = physical_node_list.copy()
-                parents = []
-                # to what placed logical nodes the current node is connected?
-                for lNode, pNode in mapping:
-                    if self.logical_graph.has_edge(logical_node[0], lNode):
-                        parents.append(pNode)
-                # make potential physical node list according to the neiboring nodes to the just mapped physical node
-                for parentNode in parents:
-                    potential = []
-                    for node, degree in physical_node_list:
-                        if self.physical_graph.has_edge(parentNode, node):
-                            potential.append((node, degree))
-                    potential_physical_nodes = sorted(list(set(potential_physical_nodes).intersection(
-                        potential)), key=lambda node_deg_pair: node_deg_pair[1])
+                potential_physical_nodes = self.potentialPlacements(logical_node, state)
         # initiate a try/excpet block to cycle through all potential physical nodes in case of wrong placement
         # self.anim()
         try:
-            # list of disconnecting edges
-            disconnecting_edges = []
-            # list of removed edges
-            removed_edges = []
-
             # boolean to return at the end
             figureOuted = figureOuted_before
 
             # try to find more placements
             if (len(potential_physical_nodes) == 0) and (not figureOuted):
-                # get all edges for the logical_node
-                edges = [(u, v, wt) for (u, v, wt) in self.logical_graph.edges.data(
-                    'weight') if (u == logical_node[0]) or (v == logical_node[0])]
-                edges = sorted(
-                    edges, key=lambda node_node_weight: node_node_weight[2])
-                # remove edges that are not connected to already placed nodes
-                for (u, v, wt) in edges:
-                    placed = False
-                    for (logNode, phyNode) in mapping:
-                        if (u == logNode) or (v == logNode):
-                            placed = True
-                            break
-                    if not placed:
-                        edges.remove((u, v, wt))
-                # get all permutations to go through all possible combinations
-                # ussually a node will have up to 4 edges, so number of permutations should be low
-                permutations = list(itertools.permutations(edges))
-                # run a while loop until pernutations is empty
-                while len(permutations) > 0:
-                    permutation_list = list(permutations.pop())
-                    potential_physical_nodes = self.figureOutWrongEdge(logical_node, permutation_list, physical_node_list, mapping, removed_edges)
-                    
-                    # if there is anything in the potential_physical_nodes, then we finished successfully
-                    if len(potential_physical_nodes) > 0:
-                        break
+                potential_physical_nodes = self.figureOutWrongEdge(logical_node, state)
             figureOuted = True
 
-                
             # if there is no potential placements by this point, preveious node was placed wrong
             if len(potential_physical_nodes) == 0:
-                # return False
-                return (False, False, [], [])
+                return (False, False, [], False)
 
             physical_node = potential_physical_nodes.pop()
-            physical_node_list.remove(physical_node)
+            state.take_physical(physical_node)
 
             # before comparing degrees, we need to update the degree of the logical_node because it could have been changed
-            logical_node = (logical_node[0], self.logical_graph.degree()[
-                            logical_node[0]])
+            logical_node = (logical_node[0], self.logical_degree(logical_node[0]))
 
             # reduce edges until equal
             # if the degree of the logical node is the same, or less than the degree of physical node, then no problems
+            # the edges of the node are kept in a heap keyed by weight and by their order in the graph, an entry is
+            # outdated once its edge is removed or gets heavier (alternative paths only add weight to existing edges)
+            edge_queue = None
             while logical_node[1] > physical_node[1]:
-                edges_list = [(u, v, wt) for (u, v, wt) in self.logical_graph.edges.data(
-                    'weight') if (u == logical_node[0]) or (v == logical_node[0])]
-                edges_list = sorted(
-                    edges_list, key=lambda node_node_weight: node_node_weight[2])
-
-                # remove disconnecting edges
-                for e in disconnecting_edges:
-                    edges_list.remove(e)
-
-                # take the edge with the least weight
+                if edge_queue is None:
+                    edge_queue = [(wt, k, u, v) for k, (u, v, wt) in
+                                  enumerate(self.logical_graph.edges(logical_node[0], data='weight'))]
+                    heapq.heapify(edge_queue)
+                # take the edge with the least weight which is not a bridge
                 # if no more edges, then this will trigger the except
-                edge_weight = edges_list.pop(0)
-
-                # remove the edge with the least weight
-                self.logical_graph.remove_edge(edge_weight[0], edge_weight[1])
-
-                # if the graph is disconnected, return the edge back
-                if not nx.is_connected(self.logical_graph):
-                    self.logical_add_weight(
-                        edge_weight[0], edge_weight[1], edge_weight[2])
-                    disconnecting_edges.append(edge_weight)
-                # else adjust weights on the alternative path
-                else:
-                    alternative_path = nx.shortest_path(
-                        self.logical_graph, source=edge_weight[0], target=edge_weight[1], weight='weight')
-                    # add 2 * (weight of removed edge) to every edge on the alternative path
-                    for i in range(len(alternative_path) - 1):
-                        self.logical_add_weight(
-                            alternative_path[i], alternative_path[i+1], edge_weight[2] * 2)
-                    # record removed edges for a potential rollback
-                    removed_edges.append([edge_weight, alternative_path])
+                wt, k, u, v = heapq.heappop(edge_queue)
+                if not self.logical_graph.has_edge(u, v):
+                    continue
+                current = self.logical_graph[u][v]['weight']
+                if current != wt:
+                    heapq.heappush(edge_queue, (current, k, u, v))
+                    continue
+
+                # remove the edge, a bridge is kept and does not go back to the queue
+                if self.logical_reduce_edge(u, v) is not None:
                     # update the node degree
-                    logical_node = (logical_node[0], self.logical_graph.degree()[
-                                    logical_node[0]])
+                    logical_node = (logical_node[0], self.logical_degree(logical_node[0]))
 
             # now nodes have the same degree
-            mapping.append((logical_node[0], physical_node[0]))
+            state.place(logical_node[0], physical_node[0])
 
             # now we need to go through all the neighbours
-            # in order to prevent errors with the for loop we will make a temporary copy of logical_node_list
-            temp_logical_node_list = logical_node_list.copy()
-            for node, degree in logical_node_list:
-                if self.logical_graph.has_edge(logical_node[0], node):
-                    temp_logical_node_list.remove((node, degree))
-                    # for qNode, qDegree in node_queue:
-                    #     if node == qNode:
-                    #         node_queue.remove((qNode, qDegree))
-                    node_queue.append((node, degree))
-
-            temp = logical_node_list.copy()
-            for item in temp:
-                if not item in temp_logical_node_list:
-                    logical_node_list.remove(item)
+            for node, degree in state.logical_degree_list:
+                if not state.is_taken(node) and self.logical_has_edge(logical_node[0], node):
+                    state.take_logical(node)
+                    state.push_queue((node, degree))
 
             # next, go through all nodes in the node_queue
-            return (True, False, removed_edges, potential_physical_nodes, figureOuted)
+            return (True, False, potential_physical_nodes, figureOuted)
 
         except IndexError:
-            # return all removed edges
-            for edge_weight, alternative_path in removed_edges:
-                self.logical_add_weight(
-                    edge_weight[0], edge_weight[1], edge_weight[2])
-                # subtract 2 * (weight of removed edge) to every edge on the alternative path
-                for i in range(len(alternative_path) - 1):
-                    self.logical_add_weight(
-                        alternative_path[i], alternative_path[i+1], edge_weight[2] * (-2))
+            # the removed edges are returned by the caller, which undoes the whole attempt
+            return (False, False, potential_physical_nodes, figureOuted)
+
+    def budgetExhausted(self):
+        """
+        Checks whether the time or the node budget of the running placement search is used up.
+
+        Returns:
+        bool: Should the search stop.
+        """
+        if self.__deadline is not None and time.perf_counter() > self.__deadline:
+            return True
+        if self.node_budget is not None and self.__expansions > self.node_budget:
+            return True
+        return False
+
+    def greedyCompletion(self, mapping, weights=None):
+        """
+        Completes a partial mapping, the unplaced logical node with the heaviest edges to the placed ones goes first,
+        onto the free physical node which minimizes the weighted distance to its placed neighbours.
 
-            return [False, False, [], potential_physical_nodes, figureOuted]
+        Parameters:
+        mapping (List[(str, int)]): Partial mapping from logical circuit to physical architecture.
+        weights (np.ndarray): Weight matrix of the logical graph, the current one by default.
+
+        Returns:
+        List[(str, int)]: Mapping of all logical nodes.
+        """
+        if weights is None:
+            weights = self.weights
+        placed = dict(mapping)
+        used = set(placed.values())
+        # the highest degree physical nodes are preferred when nothing else decides
+        free = [node for node, degree in sorted(self.physical_graph.degree(), key=lambda node_deg_pair: -node_deg_pair[1])
+                if node not in used]
+        missing = [i for i, node in enumerate(self.logical_nodes) if node not in placed]
+        if len(missing) > len(free):
+            raise Exception('Physical architecture has {} free qubits, {} logical qubits are left'.format(
+                len(free), len(missing)))
+        if len(missing) == 0:
+            return list(mapping)
+
+        distances = self.physical_paths().distances.astype(np.int64)
+        # unreachable physical nodes are as far as possible
+        distances[distances < 0] = len(distances)
+        placed_index = np.array([i for i, node in enumerate(self.logical_nodes) if node in placed], dtype=np.int64)
+        placed_physical = [placed[self.logical_nodes[i]] for i in placed_index]
+        total_weights = np.abs(weights).sum(axis=1)
+        while len(missing) > 0:
+            # the node most connected to the placed ones, then the one with the biggest weighted degree
+            attached = np.abs(weights[np.ix_(missing, placed_index)]).sum(axis=1) if len(placed_index) > 0 \
+                else np.zeros(len(missing), dtype=np.int64)
+            choice = max(range(len(missing)), key=lambda k: (attached[k], total_weights[missing[k]]))
+            node = missing.pop(choice)
+            if len(placed_index) > 0:
+                node_weights = np.abs(weights[node, placed_index])
+                costs = distances[np.ix_(free, placed_physical)] @ node_weights
+                physical = free[int(np.argmin(costs))]
+            else:
+                physical = free[0]
+            free.remove(physical)
+            placed[self.logical_nodes[node]] = physical
+            placed_index = np.append(placed_index, node)
+            placed_physical.append(physical)
+        return list(placed.items())
 
     def isomorph(self, file_name):
         """
         Creates isomorphic mapping.
+        With a time or node budget (time_budget, node_budget) the search is anytime: the best mapping found so far,
+        scored by count_swap after a greedy completion, is returned when the budget runs out or the search fails.
+        With more than one start (starts), several searches run in parallel from different starting points.
 
         Parameters:
         file_name (str): The name of the file where the circuit is stored.
 
         Returns:
-        logical_graph_name (str): Name of the file where the image of the logical graph is stored.
-        reduced_graph_name (str): Name of the file where the image og reduced logical graph is stored.
+        logical_graph_name (str): Name of the file where the image of the logical graph is stored, None unless
+        draw_graphs is set.
+        reduced_graph_name (str): Name of the file where the image og reduced logical graph is stored, None unless
+        draw_graphs is set.
         """
         # save graph image and get its name
-        logical_graph_name = self.drawGraph(file_name, is_logical=True)
+        logical_graph_name = self.drawGraph(file_name, is_logical=True) if self.draw_graphs else None
+
+        # the same (or an isomorphic) graph was mapped onto this architecture before
+        cached = None
+        if self.cache is not None:
+            key = mapping_cache.mapping_key(self.logical_graph, self.physical_graph, self.searchSettings())
+            cached = self.cache.get(key, self.logical_graph)
+        if cached is not None:
+            self.tracer.count('mapping_cache_hits')
+            mapping, reduced = cached
+            weights = np.zeros_like(self.weights)
+            for node1, node2, weight in reduced:
+                weights[self.logical_index[node1], self.logical_index[node2]] = weight
+                weights[self.logical_index[node2], self.logical_index[node1]] = weight
+            self.__setWeights(weights)
+            self.map = sorted(mapping, key=lambda el: el[0])
+        else:
+            original_graph = self.logical_graph.copy() if self.cache is not None else None
+            fallbacks = self.tracer.counters.get('anytime_fallbacks', 0)
+            if self.starts > 1:
+                self.multistartSearch()
+            else:
+                self.search()
+            # a mapping cut short by the budget depends on the speed of the machine, it is not stored
+            complete = not self.budget_exhausted and self.tracer.counters.get('anytime_fallbacks', 0) == fallbacks
+            if self.cache is not None and complete:
+                self.cache.put(key, original_graph, self.logical_graph, self.map)
+
+        # save reduced graph image and get its name
+        reduced_graph_name = self.drawGraph(file_name, is_logical=False) if self.draw_graphs else None
+        return logical_graph_name, reduced_graph_name
+
+    def searchSettings(self):
+        """
+        Returns the settings which change the mapping found by isomorph, they are part of the key of the cache.
+        The mapping is cached before any refinement (see refine), so the refinement settings are not part of it.
+
+        Returns:
+        dict: Budgets and starting points of the search.
+        """
+        return {'time_budget': self.time_budget, 'node_budget': self.node_budget, 'root': self.root,
+                'physical_root': self.physical_root, 'seed': self.seed, 'starts': self.starts,
+                'first_feasible': self.first_feasible, 'matcher_max_nodes': self.matcher_max_nodes,
+                'matcher_time_limit': self.matcher_time_limit}
+
+    def search(self):
+        """
+        Searches for the mapping from the starting point given by root, physical_root and seed, and reduces the
+        logical graph on the way.
+
+        Returns:
+        List[(str, int)]: The mapping, also stored in map.
+
+        Raises:
+        MappingNotFound: The search failed without a time or node budget, or it was stopped (stop).
+        """
+        # the original graph scores the mappings, the search reduces the logical graph
+        anytime = self.time_budget is not None or self.node_budget is not None
+        original_weights = self.weights.copy()
+        # the edges as a 0/1 matrix, the cost evaluator takes matrices
+        original_edges = (original_weights != 0).astype(np.int64)
+        self.budget_exhausted = False
+        self.__expansions = 0
+        self.__deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        # best mapping found so far as (swaps, completed mapping) and the most nodes placed so far
+        best = None
+        deepest = 0
 
         # check if already ismorphic
-        subgraph_is_iso, GM = self.subgraphIsomorphismCheck(
+        subgraph_is_iso, happy = self.subgraphIsomorphismCheck(
             self.physical_graph, self.logical_graph)
 
-        if subgraph_is_iso:
-            # generate isomorphic mapping
-            happy = [(j, i) for i, j in GM.mapping.items()]
-            happy = self.line_graph_remapping(happy)
-        else:
+        # if not, reduce the graph until a mapping is found
+        if not subgraph_is_iso:
             # sort all nodes by their degree
+            logical_degree_list = self.logical_degrees()
+            physical_degree_list = list(self.physical_graph.degree())
+            self.__random = None if self.seed is None else random.Random(self.seed)
+            if self.__random is not None:
+                # nodes of the same degree in a random order
+                self.__random.shuffle(logical_degree_list)
+                self.__random.shuffle(physical_degree_list)
             logical_degree_list = sorted(
-                self.logical_graph.degree(), key=lambda node_deg_pair: node_deg_pair[1])
+                logical_degree_list, key=lambda node_deg_pair: node_deg_pair[1])
             physical_degree_list = sorted(
-                self.physical_graph.degree(), key=lambda node_deg_pair: node_deg_pair[1])
-            
-            # list for mapping
-            mapping = []
-            # pop nodes with the biggest degree
-            logical_node = logical_degree_list.pop()
+                physical_degree_list, key=lambda node_deg_pair: node_deg_pair[1])
+
+            # the state of the search, every change is recorded on its trail
+            state = PlacementState(logical_degree_list, physical_degree_list)
+            self.trail = state.trail
+            # take the node with the biggest degree, unless the root is given
+            if self.root is None:
+                logical_node = logical_degree_list[-1]
+            else:
+                logical_node = (self.root, self.logical_degree(self.root))
+            state.take_logical(logical_node[0])
 
             # let's work like in BFS
             # queue of nodes to be done
-            node_queue = [logical_node]
-            # memory for node placement
-            saved_node_queue = {}
-            saved_logical_node_list = {}
-            saved_physical_node_list = {}
-            saved_mapping = {}
-            saved_removed_edges = {}
+            state.push_queue(logical_node)
+            # trail position at the start of every level, undoing to it returns to the level
+            marks = {}
             potential_list = {}
             current_node = 0
             use_potential = False
             # memory to not get stuck in figure out wrong edge
             figureOuted = {}
             # save the first node information
-            # save node information to return to it if node placement fails
-            saved_node_queue[current_node] = node_queue.copy()
-            saved_logical_node_list[current_node] = logical_degree_list.copy()
-            saved_physical_node_list[current_node] = physical_degree_list.copy()
-            saved_mapping[current_node] = mapping.copy()
+            marks[current_node] = state.mark()
             figureOuted[current_node] = False
-            # start the algorithm
-            while True:
-                # if we go below 0, then it means this algorithm failed
-                if current_node < 0:
-                    raise NotImplementedError("Mapping not found")
-
-                # are we placing the next node, or trying to place another node on the same place?
-                if use_potential:
-                    # another node on the same palce
-                    result = self.placeNodeOnNode(node_queue, potential_list[current_node], True, figureOuted[current_node], logical_degree_list, physical_degree_list, mapping)
-                else:
-                    # the next node
-                    result = self.placeNodeOnNode(node_queue, [], False, False, logical_degree_list, physical_degree_list, mapping)
-                 
-                # was the current node placement successful?
-                if not result[0]:
-                    # No
-                    removed_edges = result[2]
-                    # return all removed edges
-                    for edge_weight, alternative_path in removed_edges:
-                        self.logical_add_weight(edge_weight[0], edge_weight[1], edge_weight[2])
-                        # subtract 2 * (weight of removed edge) to every edge on the alternative path
-                        for i in range(len(alternative_path) - 1):
-                            self.logical_add_weight(alternative_path[i], alternative_path[i+1], edge_weight[2] * (-2))
-
-                    # check potential_physical_nodes
-                    if len(result[3]) == 0:
-                        # algorithm failed to place any node after placing the parent node 
-                        # so, the parent node was wrong
-                        # clear figureOuted memory
-                        figureOuted[current_node] = False
-                        # go back to the parent node
-                        current_node -= 1
-                        use_potential = True
-                        # return removed_edges by parent
-                        removed_edges = saved_removed_edges[current_node].copy()
-                        # return all removed edges
-                        for edge_weight, alternative_path in removed_edges:
-                            self.logical_add_weight(edge_weight[0], edge_weight[1], edge_weight[2])
-                            # subtract 2 * (weight of removed edge) to every edge on the alternative path
-                            for i in range(len(alternative_path) - 1):
-                                self.logical_add_weight(alternative_path[i], alternative_path[i+1], edge_weight[2] * (-2))
-                        # return the previous node info
-                        node_queue = saved_node_queue[current_node].copy()
-                        logical_degree_list = saved_logical_node_list[current_node].copy()
-                        physical_degree_list = saved_physical_node_list[current_node].copy()
-                        mapping = saved_mapping[current_node].copy()
+            try:
+                # start the algorithm
+                while True:
+                    # if we go below 0, then it means this algorithm failed
+                    if current_node < 0:
+                        if not anytime:
+                            raise MappingNotFound("Mapping not found")
+                        happy = self.__anytimeFallback(best, original_weights, 'the search failed')
+                        break
+                    if self.stop is not None and self.stop.is_set():
+                        raise MappingNotFound("The search was stopped")
+                    if anytime and self.budgetExhausted():
+                        self.budget_exhausted = True
+                        happy = self.__anytimeFallback(best, original_weights, 'the budget ran out')
+                        break
+
+                    # are we placing the next node, or trying to place another node on the same place?
+                    if use_potential:
+                        # another node on the same palce
+                        result = self.placeNodeOnNode(state, potential_list[current_node], True, figureOuted[current_node])
                     else:
-                        # there are more nodes to try
-                        use_potential = True
+                        # the next node
+                        result = self.placeNodeOnNode(state, [], False, False)
+
+                    # was the current node placement successful?
+                    if not result[0]:
+                        # No
+                        # check potential_physical_nodes
+                        if len(result[2]) == 0:
+                            # algorithm failed to place any node after placing the parent node
+                            # so, the parent node was wrong
+                            # clear figureOuted memory
+                            figureOuted[current_node] = False
+                            # go back to the parent node
+                            current_node -= 1
+                            self.tracer.count('isomorph_backtracks')
+                            use_potential = True
+                            # undo everything since the parent node was placed
+                            if current_node >= 0:
+                                state.undo(marks[current_node])
+                        else:
+                            # there are more nodes to try
+                            use_potential = True
+                            # did the algorithm use figureOutWrongEnge()?
+                            figureOuted[current_node] = result[3]
+                            # don't forget, that placeNodeOnNode pops potential_node_list
+                            # return the current node info
+                            state.undo(marks[current_node])
+                            # update the potential_list
+                            potential_list[current_node] = result[2].copy()
+                    # did we place all of the nodes?
+                    elif not result[1]:
+                        # No
+                        # save the potential physical nodes for the current (placed) node
+                        potential_list[current_node] = result[2]
                         # did the algorithm use figureOutWrongEnge()?
-                        figureOuted[current_node] = result[4]
-                        # don't forget, that placeNodeOnNode pops potential_node_list
-                        # return the current node info
-                        node_queue = saved_node_queue[current_node].copy()
-                        logical_degree_list = saved_logical_node_list[current_node].copy()
-                        physical_degree_list = saved_physical_node_list[current_node].copy()
-                        mapping = saved_mapping[current_node].copy()
-                        # update the potential_list
-                        potential_list[current_node] = result[3].copy()
-                # did we place all of the nodes?
-                elif not result[1]:
-                    # No
-                    # save the removed edges
-                    saved_removed_edges[current_node] = result[2].copy()
-                    # save the potential physical nodes for the current (placed) node
-                    potential_list[current_node] = result[3]
-                    # did the algorithm use figureOutWrongEnge()?
-                    figureOuted[current_node] = result[4]
-                    # increment the current_node
-                    current_node += 1
-                    use_potential = False
-                    # save node information to return to it if node placement fails
-                    saved_node_queue[current_node] = node_queue.copy()
-                    saved_logical_node_list[current_node] = logical_degree_list.copy()
-                    saved_physical_node_list[current_node] = physical_degree_list.copy()
-                    saved_mapping[current_node] = mapping.copy()
-                else:
-                    happy = mapping
-                    break
+                        figureOuted[current_node] = result[3]
+                        # score the deepest placements
+                        if anytime and len(state.mapping) >= deepest:
+                            deepest = len(state.mapping)
+                            best = self.__scoreMapping(state.mapping, best, original_weights, original_edges)
+                        # increment the current_node
+                        current_node += 1
+                        use_potential = False
+                        # remember where the next level starts
+                        marks[current_node] = state.mark()
+                    else:
+                        happy = list(state.mapping)
+                        if anytime:
+                            best = self.__scoreMapping(happy, best, original_weights, original_edges)
+                            happy = best[1]
+                        break
+            finally:
+                self.trail = None
+                self.__deadline = None
+                self.__random = None
 
+        # logical nodes which are not connected to the rest of the graph are not reached by the search
+        happy = self.greedyCompletion(happy, original_weights)
         happy = sorted(happy, key=lambda el: el[0])
         # print("Happy mapping: ", happy)
         self.map = happy
 
-        # save reduced graph image and get its name
-        reduced_graph_name = self.drawGraph(file_name, is_logical=False)
-        return logical_graph_name, reduced_graph_name
+        return happy
+
+    def multistartSearch(self):
+        """
+        Runs the search from several starting points in parallel (see multistart.py) and takes the best mapping
+        together with its reduced logical graph.
+
+        Returns:
+        List[(str, int)]: The mapping, also stored in map.
+
+        Raises:
+        MappingNotFound: Every search failed.
+        """
+        result = multistart.run(self, self.starts, self.workers, self.time_budget, self.first_feasible)
+        if result is None:
+            raise MappingNotFound("Mapping not found")
+        for name, value in result['counters'].items():
+            self.tracer.count(name, value)
+        # the reduced logical graph of the chosen search, its edges are a subset of the original ones
+        self.__setWeights(result['weights'])
+        self.map = result['mapping']
+        # searches cancelled at the deadline may have found a better mapping
+        self.budget_exhausted = result['cancelled'] > 0
+        if self.debugging:
+            print('[INFO] Multi-start: {} swaps from the start (root, physical root, seed) {}'.format(
+                result['swaps'], result['start']))
+        return self.map
+
+    def __scoreMapping(self, mapping, best, original_weights, original_edges):
+        """
+        Completes a mapping greedily and scores it by count_swap on the original graph.
+
+        Returns:
+        (int, List[(str, int)]): The better of the mapping and best, as (swaps, completed mapping).
+        """
+        completed = self.greedyCompletion(mapping, original_weights)
+        swaps = mapping_cost.cost(mapping_cost.mapping_array(dict(completed), self.logical_nodes), original_edges,
+                                  self.physical_paths().swaps_matrix())
+        if best is None or swaps < best[0]:
+            return (swaps, completed)
+        return best
+
+    def __anytimeFallback(self, best, original_weights, reason):
+        """
+        Returns the best mapping found so far, or a greedy one if there is none.
+        """
+        self.tracer.count('anytime_fallbacks')
+        if best is None:
+            mapping = self.greedyCompletion([], original_weights)
+        else:
+            mapping = best[1]
+        if self.debugging:
+            print('[INFO] Mapping: {}, using the best mapping found so far'.format(reason))
+        return mapping
 
     def construct_ctg(self, variables, gates):
         """
         Constructs Circuit Interaction Graph (refer to the paper).
+        The weight matrix is accumulated in one vectorized pass over the gate array, gates with the same name
+        and number of operands are expanded into their CNOT-equivalents together.
 
         Parameters:
         variables (List[str]): Nodes of circuit graph. 
-        gates (List[Gate]): Gates used in the circuit.  
+        gates (GateArray): Gates used in the circuit.
 
         Returns:
         None
         """
         self.set_nodes_logical(variables)
-
-        for gate in gates:
-            if gate.name == 'h' or gate.name == 'H' or gate.name == 'T' or gate.name == 'T+' or gate.name == 'T*':
+        self.set_nodes_logical(gates.variables)
+        if len(gates) == 0:
+            return
+
+        opcodes = np.array(gates.opcodes, dtype=np.int64)
+        offsets = np.array(gates.offsets, dtype=np.int64)
+        operands = np.array(gates.operands, dtype=np.int64)
+        arities = np.diff(offsets)
+        # variable ids of the gate array to node indices
+        node_of = np.array([self.logical_index[v] for v in gates.variables], dtype=np.int64)
+
+        # group the gates by name and number of operands
+        group_keys = opcodes * (int(arities.max()) + 1) + arities
+        groups = []
+        unknown = []
+        for key in np.unique(group_keys).tolist():
+            indices = np.flatnonzero(group_keys == key)
+            name = gates.opnames[int(opcodes[indices[0]])]
+            arity = int(arities[indices[0]])
+            template = cig_template(name, arity)
+            if template is None:
+                unknown.extend(indices.tolist())
                 continue
-            elif gate.name == 'x' or gate.name == 't1':
+            pairs, ancilla_num = template
+            if len(pairs) == 0:
                 continue
-            # do only until t5
-            elif gate.name.startswith('t') and len(gate.variables) == 3:
-                a = gate.variables[0]
-                b = gate.variables[1]
-                c = gate.variables[2]
-                # cnot on a b c
-                self.logical_add_weight(b, c)
-                self.logical_add_weight(a, c)
-                self.logical_add_weight(b, c)
-
-            elif gate.name.startswith('t') and len(gate.variables) == 4:
-                t0 = 'ancilla' + str(self.ancilla_num)
-                self.logical_graph.add_node(t0)
-                self.ancilla_num += 1
-                a = gate.variables[0]
-                b = gate.variables[1]
-                c = gate.variables[2]
-                d = gate.variables[3]
-                # cnot on a b t0
-                self.logical_add_weight(b, t0)
-                self.logical_add_weight(a, t0)
-                self.logical_add_weight(b, t0)
-                # cnot on t0 c d
-                self.logical_add_weight(c, d)
-                self.logical_add_weight(t0, d)
-                self.logical_add_weight(c, d)
-                # cnot on a b t0
-                self.logical_add_weight(b, t0)
-                self.logical_add_weight(a, t0)
-                self.logical_add_weight(b, t0)
-
-            elif gate.name.startswith('t') and len(gate.variables) == 5:
-                t0 = 'ancilla' + str(self.ancilla_num)
-                self.logical_graph.add_node(t0)
-                self.ancilla_num += 1
-                t1 = 'ancilla' + str(self.ancilla_num)
-                self.logical_graph.add_node(t1)
-                self.ancilla_num += 1
-                a = gate.variables[0]
-                b = gate.variables[1]
-                c = gate.variables[2]
-                d = gate.variables[3]
-                e = gate.variables[4]
-                # cnot on a b t0
-                self.logical_add_weight(b, t0)
-                self.logical_add_weight(a, t0)
-                self.logical_add_weight(b, t0)
-                # cnot on t0 c t1
-                self.logical_add_weight(c, t1)
-                self.logical_add_weight(t0, t1)
-                self.logical_add_weight(c, t1)
-                # cnot on t1 d e
-                self.logical_add_weight(d, e)
-                self.logical_add_weight(t1, e)
-                self.logical_add_weight(d, e)
-                # cnot on t0 c t1
-                self.logical_add_weight(c, t1)
-                self.logical_add_weight(t0, t1)
-                self.logical_add_weight(c, t1)
-                # cnot on a b t0
-                self.logical_add_weight(b, t0)
-                self.logical_add_weight(a, t0)
-                self.logical_add_weight(b, t0)
-            else:
-                if gate.name == 'v':
-                    self.logical_add_weight(
-                        gate.variables[0], gate.variables[1])
-                    self.logical_add_weight(
-                        gate.variables[0], gate.variables[1])
-
-                elif gate.name == 'v+':
-                    self.logical_add_weight(
-                        gate.variables[1], gate.variables[0])
-                    self.logical_add_weight(
-                        gate.variables[1], gate.variables[0])
-                elif gate.name == 'cx' or gate.name == 't2' or gate.name == 'sw':
-                    self.logical_add_weight(
-                        gate.variables[0], gate.variables[1])
-                else:
-                    print(
-                        "[INFO] Error inserting gates to ctg. Unknown gate {}".format(gate))
+            groups.append((indices, arity, pairs, ancilla_num))
+
+        for index in sorted(unknown):
+            print("[INFO] Error inserting gates to ctg. Unknown gate {} {}".format(
+                gates.opnames[gates.opcodes[index]], ' '.join(gates.gate_variables(index))))
+
+        # every gate uncomputes its ancillas (see SimpleCTG.n_ccnot), so the gates share a pool of ancillas:
+        # the ancilla i of every gate is the node ancilla<i>, the pool is as big as the widest gate needs
+        self.ancilla_num = max([self.ancilla_num] + [ancilla_num for indices, arity, pairs, ancilla_num in groups])
+        self.set_nodes_logical(['ancilla' + str(i) for i in range(self.ancilla_num)])
+        pool = np.array([self.logical_index['ancilla' + str(i)] for i in range(self.ancilla_num)], dtype=np.int64)
+        # gates are ordered by their position in the circuit and the position of a CNOT-equivalent in the template
+        template_length = max([1] + [len(pairs) for indices, arity, pairs, ancilla_num in groups])
+
+        sources = []
+        targets = []
+        positions = []
+        for indices, arity, pairs, ancilla_num in groups:
+            # slots of every gate: its operands followed by its ancillas
+            slots = node_of[operands[offsets[indices, None] + np.arange(arity)]]
+            if ancilla_num > 0:
+                slots = np.hstack((slots, np.broadcast_to(pool[:ancilla_num], (len(indices), ancilla_num))))
+            pairs = np.array(pairs)
+            sources.append(slots[:, pairs[:, 0]].ravel())
+            targets.append(slots[:, pairs[:, 1]].ravel())
+            positions.append((indices[:, None] * template_length + np.arange(len(pairs))).ravel())
+        if len(sources) == 0:
+            return
+        # restore the order of the CNOT-equivalents in the circuit
+        order = np.argsort(np.concatenate(positions), kind='stable')
+        sources = np.concatenate(sources)[order]
+        targets = np.concatenate(targets)[order]
+
+        nodes_num = len(self.logical_nodes)
+        counts = np.bincount(sources * nodes_num + targets, minlength=nodes_num * nodes_num).reshape(nodes_num, nodes_num)
+        counts = counts + counts.T
+        # self loops are counted once
+        np.fill_diagonal(counts, counts.diagonal() // 2)
+        self.weights += counts
+
+        # first appearance of every edge, the networkx view adds the edges in this order
+        edge_keys = np.minimum(sources, targets) * nodes_num + np.maximum(sources, targets)
+        first = np.sort(np.unique(edge_keys, return_index=True)[1])
+        self.__edge_order = np.stack((sources[first], targets[first]), axis=1)
+        self.__logical_graph = None
+
+    def refine(self, weights=None, moves=refinement.MOVES, time_budget=None, seed=None):
+        """
+        Improves the mapping (map) with simulated annealing: logical nodes are swapped or moved to unused physical
+        nodes as long as the swaps weighted by the interactions (swap_cost) go down.
+
+        Parameters:
+        weights (np.ndarray): Weight matrix of the logical graph, should be the original (not reduced) one.
+        moves (int): Number of proposed moves.
+        time_budget (float): Seconds of the refinement, None for no limit.
+        seed (int): Seed of the moves.
+
+        Returns:
+        List[(str, int)]: The refined mapping, also stored in map.
+        """
+        if weights is None:
+            weights = self.weights
+        swaps = self.physical_paths().swaps_matrix()
+        # unreachable physical nodes are as far as possible
+        swaps[self.physical_paths().distances < 0] = len(swaps)
+        physical_nodes = sorted(self.physical_graph.nodes())
+        physical_neighbours = {node: list(self.physical_graph.neighbors(node)) for node in physical_nodes}
+        permutation = mapping_cost.mapping_array(dict(self.map), self.logical_nodes)
+        refined, cost, initial = refinement.anneal(permutation, weights, swaps, physical_nodes, physical_neighbours,
+                                                   moves, time_budget, seed)
+        self.tracer.count('refinement_gain', initial - cost)
+        if self.debugging:
+            print('[INFO] Refinement: weighted swaps {} -> {}'.format(initial, cost))
+        self.map = sorted(zip(self.logical_nodes, refined.tolist()), key=lambda el: el[0])
+        return self.map
 
     def count_swap(self, mapping, physical_paths, ctg):
         """
         Counts number of swap gates.
 
         Parameters:
-        mapping (List[(string, int)]): Mapping from logical circuit to physical architecture.
-        physical_paths (dict(int: List[(int, int)])): Shortest physical paths using Djikstra algorithm.
+        mapping (Dict[string, int]): Mapping from logical circuit to physical architecture.
+        physical_paths (ShortestPaths): Shortest paths between the physical qubits.
         ctg (List[edge(u, w, weight)]): Logical circuit.
 
         Returns:
         int: number of swap gates.
         """
-        numswap = 0
+        nodes = list(mapping)
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = mapping_cost.edge_matrix(ctg, index, len(nodes))
+        return mapping_cost.cost(mapping_cost.mapping_array(mapping, nodes), edges, physical_paths.swaps_matrix())
+
+    def swap_cost(self, mapping, weights=None):
+        """
+        Counts number of swap gates weighted by the number of interactions of every pair of logical qubits,
+        heavily used pairs which are far apart cost more than in count_swap.
 
-        for edge in ctg:
-            node1 = mapping[edge[0]]
-            node2 = mapping[edge[1]]
-            if len(physical_paths[node1][node2]) != 0:
-                numswap += (len(physical_paths[node1][node2])) * 2
+        Parameters:
+        mapping (Dict[string, int]): Mapping of all logical nodes to physical architecture.
+        weights (np.ndarray): Weight matrix of the logical graph, the current one by default.
 
-        return numswap
+        Returns:
+        int: weighted number of swap gates.
+        """
+        if weights is None:
+            weights = self.weights
+        return mapping_cost.cost(mapping_cost.mapping_array(mapping, self.logical_nodes), weights,
+                                 self.physical_paths().swaps_matrix())
@@ -0,0 +1,185 @@
+"""monomorphism.py: Implements subgraph monomorphism search used for the placement of logical qubits"""
+
+import time
+from typing import Dict, List, Optional
+
+import networkx as nx
+
+
+def neighbour_signature(degrees: List[int], neighbours) -> tuple:
+    """
+    Returns the degrees of the neighbours of a node in non-increasing order.
+    """
+    return tuple(sorted((degrees[n] for n in neighbours), reverse=True))
+
+
+def signature_dominates(target_signature: tuple, pattern_signature: tuple) -> bool:
+    """
+    Checks whether a target node can host a pattern node: every neighbour of the pattern node needs its own neighbour
+    of the target node with at least the same degree.
+    """
+    if len(target_signature) < len(pattern_signature):
+        return False
+    for target_degree, pattern_degree in zip(target_signature, pattern_signature):
+        if target_degree < pattern_degree:
+            return False
+    return True
+
+
+class MonomorphismMatcher:
+    """
+    Finds a non-induced subgraph monomorphism: an injective placement of the nodes of a pattern graph (the Circuit
+    Interaction Graph) onto the nodes of a target graph (the physical architecture), such that every pattern edge
+    lands on a target edge. Target edges without a pattern edge are allowed, unlike in induced subgraph isomorphism.
+
+    The search is a depth-first backtracking over the pattern nodes. Candidate domains are bitsets (Python integers,
+    bit i is target node i), pruned by degree and neighbour degree signatures, intersected with the neighbourhoods
+    of the already placed neighbours and forward-checked for the unplaced ones.
+
+    Attributes:
+    max_nodes (int): Budget of search node expansions per call, None for no limit.
+    time_limit (float): Budget of seconds per call, None for no limit.
+    expansions (int): Search node expansions of the last call.
+    exhausted (bool): Did the last call run out of the budget.
+    """
+
+    def __init__(self, target: nx.Graph, max_nodes: Optional[int] = None, time_limit: Optional[float] = None):
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.expansions = 0
+        self.exhausted = False
+
+        self.target_nodes = list(target.nodes())
+        index = {node: i for i, node in enumerate(self.target_nodes)}
+        self.target_neighbours = [[index[n] for n in target.neighbors(node) if n != node] for node in self.target_nodes]
+        self.target_adjacency = [0] * len(self.target_nodes)
+        for i, neighbours in enumerate(self.target_neighbours):
+            for n in neighbours:
+                self.target_adjacency[i] |= 1 << n
+        self.target_degrees = [len(neighbours) for neighbours in self.target_neighbours]
+        self.target_signatures = [neighbour_signature(self.target_degrees, neighbours)
+                                  for neighbours in self.target_neighbours]
+
+    def domains(self, degrees: List[int], signatures: List[tuple]) -> List[int]:
+        """
+        Returns the initial candidate bitset of every pattern node.
+        """
+        domains = []
+        for degree, signature in zip(degrees, signatures):
+            domain = 0
+            for t, target_degree in enumerate(self.target_degrees):
+                if target_degree >= degree and signature_dominates(self.target_signatures[t], signature):
+                    domain |= 1 << t
+            domains.append(domain)
+        return domains
+
+    @staticmethod
+    def order(neighbours: List[List[int]], degrees: List[int], domains: List[int]) -> List[int]:
+        """
+        Returns the order in which the pattern nodes are placed: the node with the most placed neighbours first,
+        then the one with the highest degree and the smallest domain, so the search stays connected.
+        """
+        n = len(neighbours)
+        placed_neighbours = [0] * n
+        ordered = [False] * n
+        order = []
+        for _ in range(n):
+            best = None
+            best_key = None
+            for p in range(n):
+                if ordered[p]:
+                    continue
+                key = (placed_neighbours[p], degrees[p], -bin(domains[p]).count('1'))
+                if best_key is None or key > best_key:
+                    best = p
+                    best_key = key
+            ordered[best] = True
+            order.append(best)
+            for q in neighbours[best]:
+                placed_neighbours[q] += 1
+        return order
+
+    def find(self, pattern: nx.Graph) -> Optional[Dict]:
+        """
+        Searches for a placement of the pattern graph onto the target graph.
+
+        Parameters:
+        pattern (NetworkX graph): The smaller graph, usually the Circuit Interaction Graph.
+
+        Returns:
+        Dict[pattern node, target node]: The placement of every pattern node, or None if there is none
+        (or the budget ran out, see exhausted).
+        """
+        self.expansions = 0
+        self.exhausted = False
+        pattern_nodes = list(pattern.nodes())
+        n = len(pattern_nodes)
+        if n == 0:
+            return {}
+        if n > len(self.target_nodes):
+            return None
+
+        index = {node: i for i, node in enumerate(pattern_nodes)}
+        neighbours = [[index[m] for m in pattern.neighbors(node) if m != node] for node in pattern_nodes]
+        degrees = [len(ns) for ns in neighbours]
+        signatures = [neighbour_signature(degrees, ns) for ns in neighbours]
+        domains = self.domains(degrees, signatures)
+        if any(domain == 0 for domain in domains):
+            return None
+
+        order = self.order(neighbours, degrees, domains)
+        position = [0] * n
+        for depth, p in enumerate(order):
+            position[p] = depth
+        # neighbours placed before (constraints) and after (forward checks) every pattern node
+        parents = [[q for q in neighbours[p] if position[q] < position[p]] for p in range(n)]
+        children = [[q for q in neighbours[p] if position[q] > position[p]] for p in range(n)]
+
+        adjacency = self.target_adjacency
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        assignment = [-1] * n
+        used = 0
+        candidates = [0] * n
+
+        def domain_of(p: int) -> int:
+            domain = domains[p] & ~used
+            for q in parents[p]:
+                if assignment[q] >= 0:
+                    domain &= adjacency[assignment[q]]
+            return domain
+
+        depth = 0
+        candidates[0] = domain_of(order[0])
+        while depth >= 0:
+            p = order[depth]
+            if assignment[p] >= 0:
+                # take back the previous candidate of this node
+                used &= ~(1 << assignment[p])
+                assignment[p] = -1
+            if candidates[depth] == 0:
+                depth -= 1
+                continue
+
+            bit = candidates[depth] & -candidates[depth]
+            candidates[depth] ^= bit
+            t = bit.bit_length() - 1
+
+            self.expansions += 1
+            if self.max_nodes is not None and self.expansions > self.max_nodes:
+                self.exhausted = True
+                return None
+            if deadline is not None and self.expansions & 255 == 0 and time.perf_counter() > deadline:
+                self.exhausted = True
+                return None
+
+            assignment[p] = t
+            used |= bit
+            # forward checking: every unplaced neighbour must still have a candidate next to t
+            if any(domain_of(q) == 0 for q in children[p]):
+                continue
+
+            depth += 1
+            if depth == n:
+                return {pattern_nodes[p]: self.target_nodes[assignment[p]] for p in range(n)}
+            candidates[depth] = domain_of(order[depth])
+        return None
@@ -0,0 +1,134 @@
+"""multistart.py: Implements parallel multi-start search of the logical to physical qubit mapping"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import misc
+
+# stops the searches of a worker process once the result is chosen or the deadline passed, set by init_worker
+_stop = None
+
+
+def init_worker(stop):
+    """
+    Initializes a worker process with the event shared by all searches of a run.
+    """
+    global _stop
+    _stop = stop
+
+
+def start_configurations(mapping, starts: int) -> List[Tuple]:
+    """
+    Returns different starting points of the placement search.
+    The first one is the default search (the biggest logical node on the biggest physical node, no seed), the others
+    pair the logical and physical nodes of the biggest degrees and shuffle the ties with their own seed.
+
+    Parameters:
+    mapping (Mapping): The mapping with the logical and physical graphs.
+    starts (int): Number of starting points.
+
+    Returns:
+    List[(str, int, int)]: Logical root, physical root and seed of every start, None for the default.
+    """
+    logical_roots = [node for node, degree in sorted(mapping.logical_degrees(), key=lambda pair: -pair[1])]
+    physical_roots = [node for node, degree in sorted(mapping.physical_graph.degree(), key=lambda pair: -pair[1])]
+    configurations = [(None, None, None)]
+    for seed in range(1, starts):
+        configurations.append((logical_roots[seed % len(logical_roots)],
+                               physical_roots[(seed // len(logical_roots)) % len(physical_roots)], seed))
+    return configurations
+
+
+def search_worker(mapping, root, physical_root, seed, deadline: Optional[float]) -> Dict:
+    """
+    Runs one placement search in a worker process, the time budget of the search ends at the deadline (wall clock).
+
+    Returns:
+    dict: mapping, swaps on the original graph, feasible (found without a fallback), the weights of the reduced
+    logical graph and the trace counters, or error if the search failed.
+    """
+    mapping.root = root
+    mapping.physical_root = physical_root
+    mapping.seed = seed
+    mapping.stop = _stop
+    # the copy counts only its own search
+    mapping.tracer.counters = {}
+    if deadline is not None:
+        mapping.time_budget = deadline - time.time()
+        if mapping.time_budget <= 0:
+            return {'error': 'the deadline passed', 'counters': {}}
+    edges = mapping.logical_edges()
+    try:
+        result = mapping.search()
+    except misc.MappingNotFound as error:
+        return {'error': str(error), 'counters': mapping.tracer.counters}
+    return {'mapping': result, 'swaps': mapping.count_swap(dict(result), mapping.physical_paths(), edges),
+            'feasible': mapping.tracer.counters.get('anytime_fallbacks', 0) == 0, 'weights': mapping.weights,
+            'counters': mapping.tracer.counters}
+
+
+def run(mapping, starts: int, workers: Optional[int] = None, time_budget: Optional[float] = None,
+        first_feasible=False) -> Optional[Dict]:
+    """
+    Runs several placement searches with different starting points over a process pool.
+
+    Parameters:
+    mapping (Mapping): The mapping with the logical and physical graphs, it is copied to every worker.
+    starts (int): Number of searches.
+    workers (int): Number of processes, all cores by default.
+    time_budget (float): Seconds until the deadline, the searches not started by then are cancelled. None for no
+    deadline.
+    first_feasible (bool): Take the first mapping found without a fallback instead of the one with the least swaps,
+    the latter is still taken if no search finds one.
+
+    Returns:
+    dict: The result of the chosen search (see search_worker) with the start configuration and the number of searches
+    cancelled at the deadline, None if every search failed.
+    """
+    # the workers compare the deadline with the wall clock
+    deadline = None if time_budget is None else time.time() + time_budget
+    configurations = start_configurations(mapping, starts)
+    best = None
+    futures = {}
+    cancelled = set()
+    stop = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_worker, initargs=(stop,))
+    try:
+        futures = {executor.submit(search_worker, mapping, root, physical_root, seed, deadline):
+                   (root, physical_root, seed) for root, physical_root, seed in configurations}
+        pending = set(futures)
+        while len(pending) > 0:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if len(done) == 0:
+                # the searches which did not start are cancelled, the running ones reach the deadline on their own
+                # and return the best mapping they found
+                cancelled = {future for future in pending if future.cancel()}
+                pending -= cancelled
+                deadline = None
+                if mapping.debugging:
+                    print('[INFO] Multi-start: the deadline passed, {} searches cancelled'.format(len(cancelled)))
+                continue
+            for future in done:
+                result = future.result()
+                result['start'] = futures[future]
+                mapping.tracer.count('multistart_searches')
+                if 'error' in result:
+                    continue
+                if first_feasible and result['feasible']:
+                    result['cancelled'] = len(cancelled)
+                    return result
+                if best is None or result['swaps'] < best['swaps']:
+                    best = result
+    finally:
+        # the searches which did not start are cancelled, the running ones stop at their next placement
+        stop.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+    if best is not None:
+        best['cancelled'] = len(cancelled)
+    return best
@@ -0,0 +1,138 @@
+"""qasm_writer.py: Implements streaming OpenQASM 2.0 output"""
+
+import gzip
+import re
+from typing import List
+
+import circuit_ir
+
+HEADER = 'OPENQASM 2.0;\ninclude "qelib1.inc";\n'
+# Lines are collected into chunks of this size before they are written
+CHUNK_LINES = 4096
+
+
+def register_name(name: str) -> str:
+    """
+    Returns a valid OpenQASM identifier for a variable name.
+    """
+    name = re.sub(r'[^A-Za-z0-9_]', '_', name)
+    if not re.match(r'[a-z]', name):
+        name = 'q_' + name
+    return name
+
+
+def open_output(file_name: str, compress=False):
+    """
+    Opens a text file for writing, gzip compressed if asked or if the name ends with .gz.
+    """
+    if compress or file_name.endswith('.gz'):
+        return gzip.open(file_name, 'wt')
+    return open(file_name, 'w')
+
+
+class ChunkedWriter:
+    """
+    Collects lines and writes them to the file handle in chunks.
+    """
+
+    def __init__(self, file, chunk_lines: int = CHUNK_LINES):
+        self.file = file
+        self.chunk_lines = chunk_lines
+        self.lines: List[str] = []
+
+    def write(self, line: str):
+        self.lines.append(line)
+        if len(self.lines) >= self.chunk_lines:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.lines))
+        self.lines = []
+
+
+def write_ir(ir: circuit_ir.CircuitIR, file, chunk_lines: int = CHUNK_LINES):
+    """
+    Writes a routed circuit as OpenQASM, gate by gate, the whole text never exists in memory.
+
+    Parameters:
+    ir (CircuitIR): The routed circuit, every qubit becomes a one-qubit register named after its variable.
+    file: Text file handle.
+    chunk_lines (int): Number of lines written at once.
+
+    Returns:
+    None
+    """
+    writer = ChunkedWriter(file, chunk_lines)
+    writer.write(HEADER)
+    names = []
+    # the classical register is called c, qubit registers must not clash with it
+    used = {'c'}
+    for name in ir.qubit_names:
+        qasm_name = register_name(name)
+        while qasm_name in used:
+            qasm_name += '_'
+        used.add(qasm_name)
+        names.append(qasm_name + '[0]')
+        writer.write('qreg {};\n'.format(qasm_name + '[1]'))
+    if ir.clbits_num > 0:
+        writer.write('creg c[{}];\n'.format(ir.clbits_num))
+
+    opnames = circuit_ir.OPNAMES
+    arity = circuit_ir.ARITY
+    operands = ir.operands
+    for i, opcode in enumerate(ir.opcodes):
+        start = circuit_ir.SLOTS * i
+        if opcode == circuit_ir.MEASURE:
+            writer.write('measure {} -> c[{}];\n'.format(names[operands[start]], operands[start + 1]))
+        else:
+            writer.write('{} {};\n'.format(
+                opnames[opcode], ','.join(names[q] for q in operands[start:start + arity[opcode]])))
+    writer.flush()
+
+
+def write_quantum_circuit(circuit, file, chunk_lines: int = CHUNK_LINES):
+    """
+    Writes a qiskit QuantumCircuit (e.g. the transpiled one) as OpenQASM instruction by instruction,
+    the output is the same as circuit.qasm() without building the string.
+
+    Parameters:
+    circuit (QuantumCircuit): The circuit.
+    file: Text file handle.
+    chunk_lines (int): Number of lines written at once.
+
+    Returns:
+    None
+    """
+    writer = ChunkedWriter(file, chunk_lines)
+    writer.write(HEADER)
+    for register in circuit.qregs:
+        writer.write(register.qasm() + '\n')
+    for register in circuit.cregs:
+        writer.write(register.qasm() + '\n')
+    for instruction, qargs, cargs in circuit.data:
+        if instruction.name == 'measure':
+            writer.write('measure {}[{}] -> {}[{}];\n'.format(
+                qargs[0].register.name, qargs[0].index, cargs[0].register.name, cargs[0].index))
+        else:
+            writer.write('{} {};\n'.format(instruction.qasm(), ','.join(
+                '{}[{}]'.format(bit.register.name, bit.index) for bit in qargs + cargs)))
+    writer.flush()
+
+
+def save(circuit, file_name: str, compress=False):
+    """
+    Streams a CircuitIR or a QuantumCircuit to a file.
+
+    Parameters:
+    circuit (CircuitIR or QuantumCircuit): The circuit.
+    file_name (str): Output file, compressed with gzip if compress is set or the name ends with .gz.
+    compress (bool): Use gzip.
+
+    Returns:
+    None
+    """
+    with open_output(file_name, compress) as file:
+        if isinstance(circuit, circuit_ir.CircuitIR):
+            write_ir(circuit, file)
+        else:
+            write_quantum_circuit(circuit, file)
@@ -0,0 +1,177 @@
+"""qubit_layout.py: Implements array-backed placement of variables on logical and physical qubits used during routing"""
+
+import heapq
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class QubitLayout:
+    """
+    Placement of the variables: variable <-> logical qubit <-> physical qubit.
+
+    Variables and logical qubits are numbered in the order they are added, a logical qubit is a wire of the circuit
+    and stays on its physical qubit, a swap exchanges the variables of two logical qubits in O(1). While a mark is
+    held, every change of a logical qubit is recorded on the trail, so taking a mark is O(1) and the qubits displaced
+    since a mark are found from the trail without looking at the others.
+
+    Attributes:
+    names (List[str]): Name of every variable.
+    variable_to_logical (List[int]): Logical qubit of every variable.
+    logical_to_variable (List[int]): Variable on every logical qubit.
+    logical_to_physical (List[int]): Physical qubit of every logical qubit.
+    physical_to_logical (List[int]): Logical qubit on every physical qubit, -1 if it is not in the layout.
+    trail (List[(int, int)]): Logical qubit and its previous variable of every change, -1 for an added qubit.
+    """
+
+    def __init__(self, physical_qubits: int = 0):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.variable_to_logical: List[int] = []
+        self.logical_to_variable: List[int] = []
+        self.logical_to_physical: List[int] = []
+        self.physical_to_logical: List[int] = [-1] * physical_qubits
+        self.trail: List[Tuple[int, int]] = []
+        self.marks = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, variable: str):
+        return variable in self.ids
+
+    def add(self, variable: str, physical: int) -> int:
+        """
+        Adds a variable on a new logical qubit placed on the physical qubit and returns the logical qubit.
+        """
+        if variable in self.ids:
+            raise Exception('Variable {} is already in the layout'.format(variable))
+        if self.is_used(physical):
+            raise Exception('Physical qubit {} is already in the layout'.format(physical))
+        logical = len(self.names)
+        self.ids[variable] = logical
+        self.names.append(variable)
+        self.variable_to_logical.append(logical)
+        self.logical_to_variable.append(logical)
+        self.logical_to_physical.append(physical)
+        if physical >= len(self.physical_to_logical):
+            self.physical_to_logical.extend([-1] * (physical + 1 - len(self.physical_to_logical)))
+        self.physical_to_logical[physical] = logical
+        if self.marks > 0:
+            self.trail.append((logical, -1))
+        return logical
+
+    def logical(self, variable: str) -> int:
+        """
+        Returns the logical qubit holding the variable.
+        """
+        return self.variable_to_logical[self.ids[variable]]
+
+    def physical(self, variable: str) -> int:
+        """
+        Returns the physical qubit holding the variable.
+        """
+        return self.logical_to_physical[self.variable_to_logical[self.ids[variable]]]
+
+    def variable(self, logical: int) -> str:
+        """
+        Returns the variable on the logical qubit.
+        """
+        return self.names[self.logical_to_variable[logical]]
+
+    def is_used(self, physical: int) -> bool:
+        """
+        Checks whether the physical qubit is in the layout.
+        """
+        return physical < len(self.physical_to_logical) and self.physical_to_logical[physical] >= 0
+
+    def variable_at(self, physical: int) -> Optional[str]:
+        """
+        Returns the variable on the physical qubit, None if the qubit is not in the layout.
+        """
+        try:
+            logical = self.physical_to_logical[physical]
+        except IndexError:
+            return None
+        return self.names[self.logical_to_variable[logical]] if logical >= 0 else None
+
+    def swap(self, a: str, b: str) -> Tuple[int, int]:
+        """
+        Exchanges the logical qubits of two variables and returns their logical qubits before the swap.
+        """
+        id_a = self.ids[a]
+        id_b = self.ids[b]
+        logical_a = self.variable_to_logical[id_a]
+        logical_b = self.variable_to_logical[id_b]
+        if self.marks > 0:
+            self.trail.append((logical_a, id_a))
+            self.trail.append((logical_b, id_b))
+        self.variable_to_logical[id_a] = logical_b
+        self.variable_to_logical[id_b] = logical_a
+        self.logical_to_variable[logical_a] = id_b
+        self.logical_to_variable[logical_b] = id_a
+        return logical_a, logical_b
+
+    def mark(self) -> int:
+        """
+        Starts recording the changes and returns the current position of the trail.
+        """
+        self.marks += 1
+        return len(self.trail)
+
+    def release(self, mark: int):
+        """
+        Stops recording the changes since the mark, the trail is dropped once no mark is held.
+        """
+        self.marks -= 1
+        if self.marks == 0:
+            self.trail.clear()
+
+    def displaced(self, mark: int) -> Iterator[Tuple[int, str]]:
+        """
+        Yields the logical qubits which do not hold their variable of the mark, in ascending order, with that variable.
+        The caller may move variables between the steps: a qubit displaced by the moves is yielded as well when it
+        comes later in the order, as if all qubits were checked one by one. Qubits added after the mark are skipped.
+        """
+        original: Dict[int, int] = {}
+        pending: List[int] = []
+        scanned = mark
+        last = -1
+        while True:
+            trail = self.trail
+            for i in range(scanned, len(trail)):
+                logical, previous = trail[i]
+                if logical not in original:
+                    original[logical] = previous
+                    if previous >= 0 and logical > last:
+                        heapq.heappush(pending, logical)
+            scanned = len(trail)
+            if len(pending) == 0:
+                return
+            last = heapq.heappop(pending)
+            if self.logical_to_variable[last] != original[last]:
+                yield last, self.names[original[last]]
+
+    def moves(self, mark: int) -> List[Tuple[int, int]]:
+        """
+        Returns how the variables moved since the mark: the variable on the first logical qubit of the mark is on
+        the second one now. A qubit added after the mark counts as holding its variable since the mark.
+        """
+        # the first change of every logical qubit holds its variable of the mark
+        original = dict(reversed(self.trail[mark:]))
+        moves = []
+        for logical, variable in original.items():
+            # the variable id of an added qubit is its logical qubit
+            current = self.variable_to_logical[logical if variable < 0 else variable]
+            if current != logical:
+                moves.append((logical, current))
+        return moves
+
+    def permute(self, moves: List[Tuple[int, int]]):
+        """
+        Moves the variables as returned by moves(): the variable on the first logical qubit goes to the second one.
+        """
+        variables = [self.logical_to_variable[source] for source, target in moves]
+        if self.marks > 0:
+            self.trail.extend((target, self.logical_to_variable[target]) for source, target in moves)
+        for (source, target), variable in zip(moves, variables):
+            self.variable_to_logical[variable] = target
+            self.logical_to_variable[target] = variable
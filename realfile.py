@@ -0,0 +1,201 @@
+"""realfile.py: Implements streaming parser and compact gate storage for .real files"""
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class Gate:
+    """
+    A single gate of the circuit.
+
+    Attributes:
+    name (str): Name of the gate as written in the .real file (e.g. t3, v+, H).
+    variables (List[str]): Variables the gate acts on, the target is the last one.
+    """
+
+    def __init__(self, name: str, variables: List[str]):
+        self.name = name
+        self.variables = variables
+
+    def __repr__(self):
+        return self.name + ' ' + ' '.join(self.variables)
+
+
+class GateArray:
+    """
+    Columnar, array-backed storage of the gates of a circuit.
+
+    Variable and gate names are interned to small integers, gate i has the opcode opcodes[i]
+    and the operands operands[offsets[i]:offsets[i + 1]].
+
+    Attributes:
+    variables (List[str]): Interned variable names, the index is the variable id.
+    opnames (List[str]): Interned gate names, the index is the opcode.
+    opcodes (array('H')): Opcode of every gate.
+    offsets (array('L')): Offsets of the operands of every gate, has one more element than opcodes.
+    operands (array('H')): Variable ids of the operands of all gates.
+    """
+
+    def __init__(self, variables: Optional[List[str]] = None):
+        self.variables: List[str] = []
+        self.variable_ids: Dict[str, int] = {}
+        self.opnames: List[str] = []
+        self.opcode_ids: Dict[str, int] = {}
+        self.opcodes = array('H')
+        self.offsets = array('L', [0])
+        self.operands = array('H')
+        for variable in variables or []:
+            self.intern_variable(variable)
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self.opcodes)
+        return Gate(self.opnames[self.opcodes[index]], self.gate_variables(index))
+
+    def __iter__(self) -> Iterator[Gate]:
+        for name, variables in self.iter_gates():
+            yield Gate(name, variables)
+
+    def __repr__(self):
+        return 'GateArray({} gates, {} variables)'.format(len(self.opcodes), len(self.variables))
+
+    def intern_variable(self, variable: str) -> int:
+        """
+        Returns the id of a variable, adding it to the table if it is seen for the first time.
+        """
+        variable_id = self.variable_ids.get(variable)
+        if variable_id is None:
+            variable_id = len(self.variables)
+            self.variable_ids[variable] = variable_id
+            self.variables.append(variable)
+        return variable_id
+
+    def intern_opname(self, name: str) -> int:
+        """
+        Returns the opcode of a gate name, adding it to the table if it is seen for the first time.
+        """
+        opcode = self.opcode_ids.get(name)
+        if opcode is None:
+            opcode = len(self.opnames)
+            self.opcode_ids[name] = opcode
+            self.opnames.append(name)
+        return opcode
+
+    def append(self, name: str, variables: List[str]):
+        """
+        Appends a gate to the end of the array.
+
+        Parameters:
+        name (str): Name of the gate.
+        variables (List[str]): Variables the gate acts on.
+
+        Returns:
+        None
+        """
+        self.opcodes.append(self.intern_opname(name))
+        for variable in variables:
+            self.operands.append(self.intern_variable(variable))
+        self.offsets.append(len(self.operands))
+
+    def gate_operands(self, index: int):
+        """
+        Returns the variable ids of the gate at the index as a zero-copy memoryview.
+        """
+        return memoryview(self.operands)[self.offsets[index]:self.offsets[index + 1]]
+
+    def gate_variables(self, index: int) -> List[str]:
+        """
+        Returns the variable names of the gate at the index.
+        """
+        return [self.variables[v] for v in self.operands[self.offsets[index]:self.offsets[index + 1]]]
+
+    def iter_ops(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        Iterates over the gates without creating any objects per operand.
+
+        Returns:
+        Iterator[(opcode, start, end)]: Opcode and the operand range of every gate.
+        """
+        offsets = self.offsets
+        for i, opcode in enumerate(self.opcodes):
+            yield opcode, offsets[i], offsets[i + 1]
+
+    def iter_gates(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Iterates over the gates as (name, variables) pairs.
+        """
+        opnames = self.opnames
+        variables = self.variables
+        operands = self.operands
+        for opcode, start, end in self.iter_ops():
+            yield opnames[opcode], [variables[v] for v in operands[start:end]]
+
+
+class RealFile:
+    """
+    Contents of a parsed .real file.
+
+    Attributes:
+    variables_num (int): Value of .numvars.
+    variables (List[str]): Value of .variables.
+    inputs (List[str]): Value of .inputs.
+    outputs (List[str]): Value of .outputs.
+    constants (str): Value of .constants.
+    garbage (str): Value of .garbage.
+    gates (GateArray): Gates between .begin and .end.
+    """
+
+    def __init__(self):
+        self.variables_num = 0
+        self.variables: List[str] = []
+        self.inputs: List[str] = []
+        self.outputs: List[str] = []
+        self.constants: Optional[str] = None
+        self.garbage: Optional[str] = None
+        self.gates = GateArray()
+
+
+def parse(input_file: str) -> RealFile:
+    """
+    Parses a .real file line by line, the file is never loaded into memory at once.
+
+    Parameters:
+    input_file (str): Path to the .real file.
+
+    Returns:
+    RealFile: Header information and the gates of the circuit.
+    """
+    real = RealFile()
+    gates = real.gates
+    is_gate = False
+    with open(input_file, 'r') as file:
+        for line in file:
+            if line.startswith('.'):
+                parts = line.split()
+                if line.startswith('.numvars'):
+                    real.variables_num = int(parts[1])
+                elif line.startswith('.variables'):
+                    real.variables = parts[1:]
+                    # interned ids of the declared variables follow their order
+                    for variable in real.variables:
+                        gates.intern_variable(variable)
+                elif line.startswith('.inputs'):
+                    real.inputs = parts[1:]
+                elif line.startswith('.outputs'):
+                    real.outputs = parts[1:]
+                elif line.startswith('.constants'):
+                    real.constants = parts[1]
+                elif line.startswith('.garbage'):
+                    real.garbage = parts[1]
+                elif line.startswith('.begin') or line.startswith('.end'):
+                    is_gate = line.startswith('.begin')
+            elif is_gate:
+                parts = line.split()
+                # skip empty lines and comments inside of the gates section
+                if len(parts) == 0 or parts[0].startswith('#'):
+                    continue
+                gates.append(parts[0], parts[1:])
+    return real
@@ -0,0 +1,149 @@
+"""refinement.py: Implements simulated annealing refinement of the logical to physical qubit mapping"""
+
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Default number of moves of a refinement
+MOVES = 20000
+# Final temperature relative to the initial one
+FINAL_TEMPERATURE = 0.01
+
+
+class Annealer:
+    """
+    Local search over a mapping: a move exchanges the contents of two physical nodes, i.e. swaps two logical nodes or
+    relocates a logical node to an unused physical node. The cost is sum(W * S[perm][:, perm]) (see mapping_cost.py),
+    a move changes only the terms of the moved nodes, so its delta is computed over their neighbours, O(degree).
+
+    Attributes:
+    permutation (np.ndarray): Physical node of every logical node.
+    occupant (np.ndarray): Logical node on every physical node, -1 if it is unused.
+    cost (int): Cost of the permutation.
+    """
+
+    def __init__(self, permutation: np.ndarray, weights: np.ndarray, swaps: np.ndarray, physical_nodes: List[int],
+                 physical_neighbours: Dict[int, List[int]], seed: Optional[int] = None):
+        self.permutation = np.array(permutation, dtype=np.int64)
+        self.swaps = swaps
+        self.physical_nodes = physical_nodes
+        self.physical_neighbours = physical_neighbours
+        self.random = random.Random(seed)
+        self.occupant = np.full(len(swaps), -1, dtype=np.int64)
+        self.occupant[self.permutation] = np.arange(len(self.permutation))
+        # neighbours and weights of every logical node, the diagonal does not cost anything
+        self.neighbours = []
+        self.neighbour_weights = []
+        for i in range(len(weights)):
+            row = weights[i].copy()
+            row[i] = 0
+            neighbours = np.nonzero(row)[0]
+            self.neighbours.append(neighbours)
+            self.neighbour_weights.append(row[neighbours])
+        self.movable = [i for i in range(len(weights)) if len(self.neighbours[i]) > 0]
+        self.cost = int((weights * swaps[np.ix_(self.permutation, self.permutation)]).sum())
+
+    def __node_delta(self, node: int, source: int, target: int, other: int) -> int:
+        # change of the cost when node moves from source to target, the other moved node keeps its distance to it
+        neighbours = self.neighbours[node]
+        weights = self.neighbour_weights[node]
+        if other >= 0:
+            keep = neighbours != other
+            neighbours = neighbours[keep]
+            weights = weights[keep]
+        positions = self.permutation[neighbours]
+        return int((weights * (self.swaps[target, positions] - self.swaps[source, positions])).sum())
+
+    def delta(self, x: int, y: int) -> int:
+        """
+        Returns the change of the cost when the contents of the physical nodes x and y are exchanged.
+        """
+        a = self.occupant[x]
+        b = self.occupant[y]
+        change = 0
+        if a >= 0:
+            change += self.__node_delta(a, x, y, b)
+        if b >= 0:
+            change += self.__node_delta(b, y, x, a)
+        # the weight matrix is symmetric, every pair is counted twice
+        return 2 * change
+
+    def apply(self, x: int, y: int, change: int):
+        """
+        Exchanges the contents of the physical nodes x and y.
+        """
+        a = self.occupant[x]
+        b = self.occupant[y]
+        if a >= 0:
+            self.permutation[a] = y
+        if b >= 0:
+            self.permutation[b] = x
+        self.occupant[x] = b
+        self.occupant[y] = a
+        self.cost += change
+
+    def propose(self):
+        """
+        Returns a random move (x, y): a logical node goes next to the physical node of one of its neighbours,
+        or, now and then, anywhere.
+        """
+        node = self.random.choice(self.movable)
+        x = int(self.permutation[node])
+        if self.random.random() < 0.8:
+            neighbour = self.neighbours[node][self.random.randrange(len(self.neighbours[node]))]
+            candidates = self.physical_neighbours[int(self.permutation[neighbour])]
+            y = candidates[self.random.randrange(len(candidates))]
+        else:
+            y = self.physical_nodes[self.random.randrange(len(self.physical_nodes))]
+        return x, y
+
+
+def anneal(permutation: np.ndarray, weights: np.ndarray, swaps: np.ndarray, physical_nodes: List[int],
+           physical_neighbours: Dict[int, List[int]], moves: int = MOVES, time_budget: Optional[float] = None,
+           seed: Optional[int] = None):
+    """
+    Improves a mapping with simulated annealing, the temperature falls geometrically with the moves.
+
+    Parameters:
+    permutation (np.ndarray): Physical node of every logical node.
+    weights (np.ndarray): Weight matrix of the logical graph.
+    swaps (np.ndarray): Swaps between all pairs of physical nodes.
+    physical_nodes (List[int]): Physical nodes a logical node may go to.
+    physical_neighbours (Dict[int, List[int]]): Neighbours of every physical node.
+    moves (int): Number of proposed moves.
+    time_budget (float): Seconds of the search, None for no limit.
+    seed (int): Seed of the moves, the result is reproducible unless the time budget runs out.
+
+    Returns:
+    (np.ndarray, int, int): The best permutation found, its cost and the cost of the given permutation.
+    """
+    annealer = Annealer(permutation, weights, swaps, physical_nodes, physical_neighbours, seed)
+    initial = annealer.cost
+    best = annealer.permutation.copy()
+    best_cost = initial
+    if len(annealer.movable) == 0 or moves <= 0:
+        return best, best_cost, initial
+
+    # the initial temperature accepts an average worsening move with the probability 1/2
+    samples = [abs(annealer.delta(*annealer.propose())) for _ in range(min(100, moves))]
+    worsening = [change for change in samples if change > 0]
+    temperature = (sum(worsening) / len(worsening)) / math.log(2) if len(worsening) > 0 else 1.0
+    cooling = FINAL_TEMPERATURE ** (1.0 / moves)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+    for move in range(moves):
+        if deadline is not None and move & 255 == 0 and time.perf_counter() > deadline:
+            break
+        x, y = annealer.propose()
+        if x != y:
+            change = annealer.delta(x, y)
+            if change <= 0 or annealer.random.random() < math.exp(-change / temperature):
+                annealer.apply(x, y, change)
+                if annealer.cost < best_cost:
+                    best_cost = annealer.cost
+                    best = annealer.permutation.copy()
+        temperature *= cooling
+    return best, best_cost, initial
@@ -0,0 +1,121 @@
+"""shortest_paths.py: Implements all-pairs shortest paths over the physical coupling graph"""
+
+from typing import List, Optional
+
+import numpy as np
+
+
+class ShortestPaths:
+    """
+    All-pairs shortest paths of an unweighted coupling graph.
+
+    Distances are stored in a dense int16 matrix and paths are kept implicitly in a next-hop matrix,
+    a path is only reconstructed when it is asked for.
+
+    Attributes:
+    qubits_num (int): Number of physical qubits, qubits are indexed from 0 to qubits_num - 1.
+    distances (np.ndarray): distances[a][b] is the number of edges between a and b, -1 if b is unreachable.
+    next_hops (np.ndarray): next_hops[a][b] is the qubit following a on a shortest path to b, -1 if there is none.
+    """
+
+    def __init__(self, distances: np.ndarray, next_hops: np.ndarray):
+        self.qubits_num = len(distances)
+        self.distances = distances
+        self.next_hops = next_hops
+        self._rings: Optional[List[List[int]]] = None
+
+    @classmethod
+    def from_couples(cls, couples: List[List[int]], qubits_num: int = 0):
+        """
+        Computes the tables with a level synchronous BFS from all of the qubits at once.
+
+        Parameters:
+        couples (List[List[int]]): Coupling map, couple [a, b] means a qubit a can interact with the qubit b.
+        qubits_num (int): Number of physical qubits, extended if the coupling map refers to bigger indices.
+
+        Returns:
+        ShortestPaths: The computed tables.
+        """
+        size = max([qubits_num] + [max(couple) + 1 for couple in couples])
+        adjacency = np.zeros((size, size), dtype=np.int32)
+        for first, second in couples:
+            adjacency[first, second] = 1
+
+        distances = np.full((size, size), -1, dtype=np.int16)
+        np.fill_diagonal(distances, 0)
+        # row s of the frontier holds the qubits reached from s at the current level
+        frontier = np.eye(size, dtype=np.int32)
+        visited = np.eye(size, dtype=bool)
+        level = 0
+        while frontier.any():
+            level += 1
+            reached = ((frontier @ adjacency) > 0) & ~visited
+            distances[reached] = level
+            visited |= reached
+            frontier = reached.astype(np.int32)
+
+        # the next hop from a to b is the neighbour of a which is one step closer to b
+        next_hops = np.full((size, size), -1, dtype=np.int16)
+        for vertex in range(size):
+            neighbours = np.flatnonzero(adjacency[vertex])
+            if len(neighbours) == 0:
+                continue
+            neighbour_distances = distances[neighbours].astype(np.int32)
+            # unreachable targets must never be chosen
+            neighbour_distances[neighbour_distances < 0] = np.iinfo(np.int32).max
+            next_hops[vertex] = neighbours[np.argmin(neighbour_distances, axis=0)]
+            next_hops[vertex, distances[vertex] <= 0] = -1
+        return cls(distances, next_hops)
+
+    def distance(self, a: int, b: int) -> int:
+        """
+        Returns the number of edges on a shortest path from a to b, -1 if b is unreachable.
+        """
+        return int(self.distances[a, b])
+
+    def connected(self, a: int, b: int) -> bool:
+        """
+        Returns whether there is a path from a to b.
+        """
+        return 0 <= a < self.qubits_num and 0 <= b < self.qubits_num and self.distances[a, b] >= 0
+
+    def path(self, a: int, b: int) -> List[int]:
+        """
+        Reconstructs a shortest path from a to b.
+
+        Returns:
+        List[int]: The qubits strictly between a and b, path(0, 5) = [2, 4, 3] means 0->2->4->3->5.
+        """
+        path = []
+        if self.distances[a, b] <= 0:
+            return path
+        vertex = int(self.next_hops[a, b])
+        while vertex != b:
+            path.append(vertex)
+            vertex = int(self.next_hops[vertex, b])
+        return path
+
+    def swaps_num(self, a: int, b: int) -> int:
+        """
+        Returns the number of swaps needed to bring a qubit from a next to b.
+        """
+        return max(int(self.distances[a, b]) - 1, 0)
+
+    def swaps_matrix(self) -> np.ndarray:
+        """
+        Returns the number of swaps between all pairs of qubits, swaps_num for the whole table at once.
+        """
+        return np.maximum(self.distances.astype(np.int64) - 1, 0)
+
+    def rings(self) -> List[List[int]]:
+        """
+        Returns the qubits reachable from every qubit ring by ring: by distance (the BFS levels), then by index.
+        The rings are computed once, on the first call.
+        """
+        if self._rings is None:
+            self._rings = []
+            for vertex in range(self.qubits_num):
+                row = self.distances[vertex]
+                reachable = np.flatnonzero(row >= 0)
+                self._rings.append(reachable[np.argsort(row[reachable], kind='stable')].tolist())
+        return self._rings
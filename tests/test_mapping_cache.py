@@ -0,0 +1,107 @@
+"""test_mapping_cache.py: Tests that isomorph reuses cached mappings of the same and of renamed circuits"""
+
+import json
+import os
+from collections import Counter
+
+import pytest
+
+import mapping_cache
+import misc
+import realfile
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+CATALOG = os.path.join(os.path.dirname(TESTS), 'backends', 'catalog.json')
+
+
+def toronto_couples():
+    with open(CATALOG, 'r') as catalog_file:
+        return json.load(catalog_file)['backends']['ibmq_toronto']['coupling_map']
+
+
+def load_circuit(circuit, rename=None):
+    """
+    Returns the variables and gates of a circuit, with the variables renamed and declared in reverse order.
+    """
+    real = realfile.parse(os.path.join(TESTS, circuit + '.real'))
+    if rename is None:
+        return real.variables, real.gates
+    gates = realfile.GateArray()
+    for name, variables in real.gates.iter_gates():
+        gates.append(name, [rename(variable) for variable in variables])
+    return [rename(variable) for variable in reversed(real.variables)], gates
+
+
+def run_isomorph(cache, variables, gates, node_budget=None):
+    mapping = misc.Mapping()
+    mapping.set_nodes_physical(toronto_couples())
+    mapping.physical_add_edges(toronto_couples())
+    mapping.cache = cache
+    mapping.node_budget = node_budget
+    mapping.construct_ctg(variables, gates)
+    original = list(mapping.logical_graph.edges(data='weight'))
+    mapping.isomorph('unused')
+    return mapping, original
+
+
+def interactions(mapping, edges):
+    """
+    The weight and the physical distance of every edge, it does not depend on the node names.
+    """
+    placement = dict(mapping.map)
+    paths = mapping.physical_paths()
+    return Counter((weight, paths.distance(placement[u], placement[v])) for u, v, weight in edges)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return mapping_cache.MappingCache(str(tmp_path / 'mappings'))
+
+
+@pytest.mark.parametrize('circuit', ['4gt10-v1_81', 'rd53_135', 'ham7_104'])
+def test_renamed_circuit_hits_the_cache(cache, circuit):
+    first, first_edges = run_isomorph(cache, *load_circuit(circuit))
+    assert first.tracer.counters.get('mapping_cache_hits', 0) == 0
+    assert len(os.listdir(cache.directory)) == 1
+
+    # the same circuit takes the identical mapping
+    same, _ = run_isomorph(cache, *load_circuit(circuit))
+    assert same.tracer.counters.get('mapping_cache_hits') == 1
+    assert same.map == first.map
+    assert same.weights.tolist() == first.weights.tolist()
+
+    # renamed variables match through the node correspondence, from a fresh in-memory cache as well
+    for renamed_cache in (cache, mapping_cache.MappingCache(cache.directory)):
+        renamed, renamed_edges = run_isomorph(renamed_cache, *load_circuit(circuit, lambda name: 'z_' + name))
+        assert renamed.tracer.counters.get('mapping_cache_hits') == 1
+        placement = dict(renamed.map)
+        assert sorted(placement) == sorted('z_' + node for node in dict(first.map))
+        assert len(set(placement.values())) == len(placement)
+        assert interactions(renamed, renamed_edges) == interactions(first, first_edges)
+        assert renamed.swap_cost(placement, renamed.weights) == first.swap_cost(dict(first.map), first.weights)
+        # the reduced graph is relabeled the same way
+        assert sorted(w for u, v, w in renamed.logical_graph.edges(data='weight')) == \
+            sorted(w for u, v, w in first.logical_graph.edges(data='weight'))
+
+
+def test_other_circuits_and_settings_miss(cache):
+    run_isomorph(cache, *load_circuit('4gt10-v1_81'))
+    other, _ = run_isomorph(cache, *load_circuit('rd53_135'))
+    assert other.tracer.counters.get('mapping_cache_hits', 0) == 0
+    # other budgets are another mapping problem
+    budgeted, _ = run_isomorph(cache, *load_circuit('4gt10-v1_81'), node_budget=10 ** 6)
+    assert budgeted.tracer.counters.get('mapping_cache_hits', 0) == 0
+
+
+def test_mappings_cut_short_are_not_stored(cache):
+    mapping, _ = run_isomorph(cache, *load_circuit('urf3_279'), node_budget=5)
+    assert mapping.budget_exhausted or mapping.tracer.counters.get('anytime_fallbacks', 0) > 0
+    assert not os.path.isdir(cache.directory) or os.listdir(cache.directory) == []
+
+
+def test_correspondence_rejects_graphs_with_other_weights():
+    graph = mapping_cache.to_graph(['a', 'b', 'c'], [[0, 1, 2], [1, 2, 3]])
+    entry = mapping_cache.MappingEntry('key', ['x', 'y', 'z'], [[0, 1, 3], [1, 2, 2]], [], [])
+    assert entry.correspondence(graph) == {'a': 'z', 'b': 'y', 'c': 'x'}
+    entry = mapping_cache.MappingEntry('key', ['x', 'y', 'z'], [[0, 1, 3], [1, 2, 3]], [], [])
+    assert entry.correspondence(graph) is None
@@ -0,0 +1,80 @@
+"""test_mapping_cost.py: Tests the vectorized swap costs against the per-edge loops they replaced"""
+
+import json
+import os
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import mapping_cost
+import misc
+import realfile
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+CATALOG = os.path.join(os.path.dirname(TESTS), 'backends', 'catalog.json')
+CIRCUITS = ['4gt10-v1_81', 'alu-bdd_288', 'mod5adder_127', 'rd53_135', 'ham7_104']
+ARCHITECTURES = ['ibmq_16_melbourne', 'ibmq_toronto']
+
+
+def build_mapping(circuit, architecture):
+    with open(CATALOG, 'r') as catalog_file:
+        couples = json.load(catalog_file)['backends'][architecture]['coupling_map']
+    real = realfile.parse(os.path.join(TESTS, circuit + '.real'))
+    mapping = misc.Mapping()
+    mapping.set_nodes_physical(couples)
+    mapping.physical_add_edges(couples)
+    mapping.construct_ctg(real.variables, real.gates)
+    return mapping
+
+
+def count_swap_baseline(mapping, distances, ctg):
+    # count_swap before mapping_cost.py: two times the qubits strictly between the ends of every edge
+    swaps = 0
+    for edge in ctg:
+        node1 = mapping[edge[0]]
+        node2 = mapping[edge[1]]
+        swaps += max(distances[node1][node2] - 1, 0) * 2
+    return swaps
+
+
+def swap_cost_baseline(mapping, distances, weighted_edges):
+    # the same loop, every swap weighted by the interactions of the pair
+    swaps = 0
+    for node1, node2, weight in weighted_edges:
+        swaps += weight * max(distances[mapping[node1]][mapping[node2]] - 1, 0) * 2
+    return swaps
+
+
+def random_mappings(mapping, count, seed):
+    generator = random.Random(seed)
+    physical_nodes = sorted(mapping.physical_graph.nodes())
+    for _ in range(count):
+        physical = generator.sample(physical_nodes, len(mapping.logical_nodes))
+        yield dict(zip(mapping.logical_nodes, physical))
+
+
+@pytest.mark.parametrize('architecture', ARCHITECTURES)
+@pytest.mark.parametrize('circuit', CIRCUITS)
+def test_costs_match_baseline(circuit, architecture):
+    mapping = build_mapping(circuit, architecture)
+    distances = dict(nx.all_pairs_shortest_path_length(mapping.physical_graph))
+    ctg = mapping.logical_edges()
+    weighted_edges = list(mapping.logical_graph.edges(data='weight'))
+    permutations = []
+    for placement in random_mappings(mapping, 25, seed=len(circuit)):
+        assert mapping.count_swap(placement, mapping.physical_paths(), ctg) == \
+            count_swap_baseline(placement, distances, ctg)
+        assert mapping.swap_cost(placement) == swap_cost_baseline(placement, distances, weighted_edges)
+        permutations.append(mapping_cost.mapping_array(placement, mapping.logical_nodes))
+    swaps = mapping.physical_paths().swaps_matrix()
+    expected = [mapping_cost.cost(permutation, mapping.weights, swaps) for permutation in permutations]
+    assert mapping_cost.batch_cost(np.array(permutations), mapping.weights, swaps).tolist() == expected
+    assert mapping_cost.batch_cost(np.array(permutations), mapping.weights, swaps, batch_size=4).tolist() == expected
+
+
+def test_edge_matrix_counts_repeated_edges():
+    index = {'a': 0, 'b': 1, 'c': 2}
+    matrix = mapping_cost.edge_matrix([('a', 'b'), ('b', 'a'), ('b', 'c')], index, 3)
+    assert matrix.tolist() == [[0, 2, 0], [2, 0, 1], [0, 1, 0]]
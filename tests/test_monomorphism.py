@@ -0,0 +1,45 @@
+"""test_monomorphism.py: Tests the bitset monomorphism search against the networkx GraphMatcher"""
+
+import json
+import os
+import random
+
+import networkx as nx
+import pytest
+from networkx.algorithms import isomorphism
+
+from monomorphism import MonomorphismMatcher
+
+CATALOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backends', 'catalog.json')
+
+
+def architecture(name):
+    with open(CATALOG, 'r') as catalog_file:
+        couples = json.load(catalog_file)['backends'][name]['coupling_map']
+    graph = nx.Graph()
+    graph.add_edges_from(couples)
+    return graph
+
+
+def random_pattern(generator, nodes_num, edge_probability):
+    pattern = nx.gnp_random_graph(nodes_num, edge_probability, seed=generator.randint(0, 10 ** 6))
+    return nx.relabel_nodes(pattern, {node: 'q{}'.format(node) for node in pattern.nodes()})
+
+
+@pytest.mark.parametrize('name', ['ibmqx2', 'ibmq_16_melbourne', 'ibmq_toronto'])
+@pytest.mark.parametrize('seed', range(15))
+def test_find_agrees_with_graph_matcher(name, seed):
+    target = architecture(name)
+    generator = random.Random(seed)
+    pattern = random_pattern(generator, generator.randint(2, min(8, target.number_of_nodes())),
+                             generator.choice([0.2, 0.35, 0.5]))
+    matcher = MonomorphismMatcher(target)
+    placement = matcher.find(pattern)
+    expected = isomorphism.GraphMatcher(target, pattern).subgraph_is_monomorphic()
+    assert not matcher.exhausted
+    assert (placement is not None) == expected
+    if placement is not None:
+        assert sorted(placement) == sorted(pattern.nodes())
+        assert len(set(placement.values())) == len(placement)
+        assert all(target.has_edge(placement[u], placement[v]) for u, v in pattern.edges())
+
@@ -0,0 +1,91 @@
+"""test_qubit_layout.py: Tests the moves, permutations and displaced qubits of QubitLayout"""
+
+import random
+
+import pytest
+
+from qubit_layout import QubitLayout
+
+
+def build_layout(variables_num, physical_qubits=32):
+    layout = QubitLayout(physical_qubits)
+    for variable in range(variables_num):
+        # logical qubit i is placed on a physical qubit out of order
+        layout.add('v{}'.format(variable), (variable * 7) % physical_qubits)
+    return layout
+
+
+def placement(layout):
+    return {name: layout.logical(name) for name in layout.names}
+
+
+def random_swaps(layout, generator, count):
+    for _ in range(count):
+        a, b = generator.sample(layout.names, 2)
+        layout.swap(a, b)
+
+
+def test_swap_returns_the_logical_qubits_before_the_swap():
+    layout = build_layout(4)
+    assert layout.swap('v1', 'v3') == (1, 3)
+    assert layout.logical('v1') == 3 and layout.logical('v3') == 1
+    assert layout.variable(1) == 'v3'
+    # the physical qubit belongs to the logical qubit, not to the variable
+    assert layout.physical('v1') == layout.logical_to_physical[3]
+    assert layout.variable_at(layout.logical_to_physical[3]) == 'v1'
+    assert layout.variable_at(31) is None and layout.variable_at(100) is None
+
+
+def test_add_rejects_used_names_and_qubits():
+    layout = build_layout(2)
+    with pytest.raises(Exception):
+        layout.add('v0', 20)
+    with pytest.raises(Exception):
+        layout.add('w', 7)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_moves_and_permute_round_trip(seed):
+    generator = random.Random(seed)
+    layout = build_layout(generator.randint(2, 12))
+    random_swaps(layout, generator, generator.randint(0, 5))
+    replay = build_layout(len(layout))
+    replay.permute([(i, layout.logical(name)) for i, name in enumerate(replay.names)])
+    assert placement(replay) == placement(layout)
+
+    before = placement(layout)
+    mark = layout.mark()
+    random_swaps(layout, generator, generator.randint(0, 20))
+    # a qubit added after the mark holds its variable since the mark
+    layout.add('extra', 40)
+    moves = layout.moves(mark)
+    after = placement(layout)
+    assert all(source != target for source, target in moves)
+
+    # the moves replayed on the placement of the mark give the current one
+    replay.permute(moves)
+    replay.add('extra', 40)
+    assert placement(replay) == after
+
+    # the inverse moves return to the placement of the mark
+    layout.permute([(target, source) for source, target in moves])
+    restored = placement(layout)
+    assert restored['extra'] == after['extra']
+    del restored['extra']
+    assert restored == before
+    layout.release(mark)
+    assert layout.trail == []
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_displaced_yields_the_changed_qubits_in_order(seed):
+    generator = random.Random(seed)
+    layout = build_layout(generator.randint(2, 12))
+    random_swaps(layout, generator, 3)
+    at_mark = list(layout.logical_to_variable)
+    mark = layout.mark()
+    random_swaps(layout, generator, generator.randint(0, 15))
+    expected = [(logical, layout.names[at_mark[logical]]) for logical in range(len(at_mark))
+                if layout.logical_to_variable[logical] != at_mark[logical]]
+    assert list(layout.displaced(mark)) == expected
+    layout.release(mark)
@@ -0,0 +1,72 @@
+"""test_realfile.py: Tests the streaming .real parser against the line based parser it replaced"""
+
+import glob
+import os
+
+import pytest
+
+import realfile
+
+REAL_FILES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.real')))
+
+
+def parse_baseline(input_file):
+    """
+    The parser of SimpleCTG before realfile.py (SimpleCTG.__parse_input__), gates as (name, variables).
+    """
+    header = {'variables_num': 0, 'variables': [], 'inputs': [], 'outputs': [], 'constants': None, 'garbage': None}
+    gates = []
+    with open(input_file, 'r') as file:
+        is_gate = False
+        for line in file.readlines():
+            parts = line.replace('\t', ' ').split(' ')
+            variables = list(filter(lambda item: len(item) > 0, [var.strip() for var in parts[1:]]))
+            if line.startswith('.numvars'):
+                header['variables_num'] = int(parts[1].strip())
+            elif line.startswith('.variables'):
+                header['variables'] = variables
+            elif line.startswith('.inputs'):
+                header['inputs'] = variables
+            elif line.startswith('.outputs'):
+                header['outputs'] = variables
+            elif line.startswith('.constants'):
+                header['constants'] = parts[1].strip()
+            elif line.startswith('.garbage'):
+                header['garbage'] = parts[1].strip()
+            elif line.startswith('.begin') or line.startswith('.end'):
+                is_gate = line.startswith('.begin')
+            elif is_gate:
+                gates.append((parts[0].strip(), variables))
+    return header, gates
+
+
+def test_corpus_is_present():
+    assert len(REAL_FILES) > 0
+
+
+@pytest.mark.parametrize('input_file', REAL_FILES, ids=os.path.basename)
+def test_parse_matches_baseline(input_file):
+    header, gates = parse_baseline(input_file)
+    real = realfile.parse(input_file)
+    assert real.variables_num == header['variables_num']
+    assert real.variables == header['variables']
+    assert real.inputs == header['inputs']
+    assert real.outputs == header['outputs']
+    assert real.constants == header['constants']
+    assert real.garbage == header['garbage']
+    assert list(real.gates.iter_gates()) == gates
+    assert [(gate.name, gate.variables) for gate in real.gates] == gates
+
+
+def test_gate_array_interns_names():
+    gates = realfile.GateArray(['a', 'b'])
+    gates.append('t2', ['a', 'b'])
+    gates.append('t3', ['c', 'a', 'b'])
+    gates.append('t2', ['b', 'c'])
+    assert len(gates) == 3
+    assert gates.variables == ['a', 'b', 'c']
+    assert gates.opnames == ['t2', 't3']
+    assert list(gates.opcodes) == [0, 1, 0]
+    assert list(gates.offsets) == [0, 2, 5, 7]
+    assert gates.gate_variables(1) == ['c', 'a', 'b']
+    assert gates[-1].name == 't2' and gates[-1].variables == ['b', 'c']
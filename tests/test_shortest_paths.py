@@ -0,0 +1,73 @@
+"""test_shortest_paths.py: Tests the path tables of ShortestPaths against networkx Dijkstra"""
+
+import json
+import os
+import random
+
+import networkx as nx
+import pytest
+
+from shortest_paths import ShortestPaths
+
+CATALOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backends', 'catalog.json')
+
+
+def catalog_couplings():
+    with open(CATALOG, 'r') as catalog_file:
+        backends = json.load(catalog_file)['backends']
+    return [(name, backends[name]['coupling_map'], backends[name]['n_qubits']) for name in sorted(backends)]
+
+
+def random_couplings(count=20, seed=7):
+    """
+    Random directed coupling maps, some of them not connected and with qubits without couples.
+    """
+    generator = random.Random(seed)
+    couplings = []
+    for number in range(count):
+        qubits_num = generator.randint(2, 30)
+        couples = [[a, b] for a in range(qubits_num) for b in range(qubits_num)
+                   if a != b and generator.random() < 2.5 / qubits_num]
+        couplings.append(('random{}'.format(number), couples, qubits_num))
+    return couplings
+
+
+COUPLINGS = catalog_couplings() + random_couplings()
+
+
+def check_against_dijkstra(couples, qubits_num):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(qubits_num))
+    graph.add_edges_from(couples, weight=1)
+    paths = ShortestPaths.from_couples(couples, qubits_num)
+    assert paths.qubits_num == qubits_num
+    for source in range(qubits_num):
+        lengths = nx.single_source_dijkstra_path_length(graph, source, weight='weight')
+        for target in range(qubits_num):
+            expected = lengths.get(target, -1)
+            assert paths.distance(source, target) == expected
+            assert paths.connected(source, target) == (expected >= 0)
+            assert paths.swaps_num(source, target) == max(expected - 1, 0)
+            path = paths.path(source, target)
+            if expected <= 0:
+                assert path == []
+                continue
+            # a shortest path made of couples
+            hops = [source] + path + [target]
+            assert len(hops) == expected + 1
+            assert all(graph.has_edge(hops[i], hops[i + 1]) for i in range(len(hops) - 1))
+    assert (paths.swaps_matrix() == [[paths.swaps_num(a, b) for b in range(qubits_num)]
+                                     for a in range(qubits_num)]).all()
+
+
+@pytest.mark.parametrize('name, couples, qubits_num', COUPLINGS, ids=[coupling[0] for coupling in COUPLINGS])
+def test_distances_match_dijkstra(name, couples, qubits_num):
+    check_against_dijkstra(couples, qubits_num)
+
+
+def test_qubits_num_is_extended_by_the_couples():
+    paths = ShortestPaths.from_couples([[0, 4], [4, 0]], 2)
+    assert paths.qubits_num == 5
+    assert paths.distance(0, 4) == 1
+    assert not paths.connected(0, 2)
+    assert not paths.connected(0, 5)
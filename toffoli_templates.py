@@ -0,0 +1,71 @@
+"""toffoli_templates.py: Implements the cache of routed Toffoli gates replayed by SimpleCTG"""
+
+from array import array
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+
+class RoutedToffoli:
+    """
+    A routed Toffoli gate: the gates emitted for it and how it moved the variables.
+
+    Attributes:
+    opcodes (array('B')): Opcodes of the emitted gates, the swaps included.
+    operands (array('h')): Logical qubits of the emitted gates, three slots per gate (see circuit_ir.py).
+    moves (List[(int, int)]): The variable on the first logical qubit ends on the second one.
+    swaps (int): Number of inserted swaps.
+    """
+
+    def __init__(self, opcodes: array, operands: array, moves: List[Tuple[int, int]], swaps: int):
+        self.opcodes = opcodes
+        self.operands = operands
+        self.moves = moves
+        self.swaps = swaps
+
+
+class TemplateCache:
+    """
+    Cache of routed Toffoli gates.
+
+    The routing of a Toffoli gate depends only on the physical qubits of its operands (the paths and the qubits
+    displaced on them), the decomposition and the builtin gates, not on the variables, so the same gate on the same
+    qubits is replayed. The gates are stored on logical qubits, which stay on their physical qubits only within
+    one circuit, so the cache is cleared for every circuit. The least recently used entry is dropped above
+    max_entries.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[Hashable, RoutedToffoli]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[RoutedToffoli]:
+        """
+        Returns the routed gate, None on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: RoutedToffoli):
+        """
+        Stores a routed gate.
+        """
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all routed gates, the counters are kept.
+        """
+        self.entries.clear()
@@ -0,0 +1,138 @@
+"""tracer.py: Implements stage-level timing, memory and counter instrumentation"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# tracemalloc.reset_peak is new in Python 3.9, without it the peak of a stage is estimated (see Tracer.stage)
+_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+
+class Tracer:
+    """
+    Records wall time, CPU time, peak memory and counters of the pipeline stages.
+
+    Stages can be nested, every stage is recorded under its own name and as a Chrome trace event
+    (chrome://tracing or https://ui.perfetto.dev can open the file written by save_chrome_trace).
+
+    Attributes:
+    trace_memory (bool): Measure the peak of Python allocations of every stage with tracemalloc (slow).
+    stages (OrderedDict[str, dict]): wall, cpu (seconds), calls and peak_kb of every stage.
+    counters (Dict[str, int]): Named counters, e.g. gates parsed or swaps inserted.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages: 'OrderedDict[str, dict]' = OrderedDict()
+        self.counters: Dict[str, int] = {}
+        self.events: List[dict] = []
+        self.__stack: List[dict] = []
+        self.__origin = time.perf_counter()
+        self.__started_tracemalloc = False
+
+    def count(self, name: str, value: int = 1):
+        """
+        Adds the value to the counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager measuring a stage.
+
+        Example:
+        with tracer.stage('transpile'):
+            compiled = qiskit_transpile(...)
+        """
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.__started_tracemalloc = True
+            if _RESET_PEAK:
+                # the peak of the enclosing stage must survive the reset
+                if len(self.__stack) > 0:
+                    parent = self.__stack[-1]
+                    parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+        frame = {'peak': 0, 'entry': tracemalloc.get_traced_memory() if self.trace_memory else None}
+        self.__stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield self
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self.__stack.pop()
+            record = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'peak_kb': 0})
+            record['wall'] += wall
+            record['cpu'] += cpu
+            record['calls'] += 1
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                if not _RESET_PEAK and peak <= frame['entry'][1]:
+                    # the peak since tracing started was reached before the stage, so the stage is only known to
+                    # hold what it held at its start and at its end
+                    peak = max(frame['entry'][0], current)
+                peak = max(frame['peak'], peak)
+                record['peak_kb'] = max(record['peak_kb'], peak // 1024)
+                if len(self.__stack) > 0:
+                    self.__stack[-1]['peak'] = max(self.__stack[-1]['peak'], peak)
+                elif self.__started_tracemalloc:
+                    tracemalloc.stop()
+                    self.__started_tracemalloc = False
+            self.events.append({
+                'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                'ts': (wall_start - self.__origin) * 1e6, 'dur': wall * 1e6,
+                'args': {'cpu_ms': cpu * 1000},
+            })
+
+    def traced(self, name: Optional[str] = None):
+        """
+        Decorator measuring every call of the function as a stage.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self) -> dict:
+        """
+        Returns all measurements.
+
+        Returns:
+        dict: {'stages': {name: {wall, cpu, calls, peak_kb}}, 'counters': {name: value}, 'peak_rss_kb': int}
+        """
+        peak_rss = None
+        if resource is not None:
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {
+            'stages': {name: dict(record) for name, record in self.stages.items()},
+            'counters': dict(self.counters),
+            'peak_rss_kb': peak_rss,
+        }
+
+    def chrome_trace(self) -> dict:
+        """
+        Returns the stages in the Chrome trace event format, counters are attached as metadata.
+        """
+        return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms', 'otherData': dict(self.counters)}
+
+    def save_chrome_trace(self, file_name: str):
+        with open(file_name, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)